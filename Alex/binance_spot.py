@@ -1,4 +1,4 @@
-import requests
+import http_client
 import pyodbc
 import logging
 import json
@@ -24,7 +24,7 @@ def get_binance_spot_data():
     # Если файл отсутствует или старше 1 часа, запрашиваем данные с Binance
     url = "https://api.binance.com/api/v3/ticker/24hr"
     logging.info("Запрос данных с Binance (спотовый рынок)...")
-    response = requests.get(url)
+    response = http_client.get(url)
     response.raise_for_status()
     data = response.json()
 
@@ -11,3 +11,9 @@ CLICKHOUSE_PORT = 8123
 CLICKHOUSE_DATABASE = "test"
 CLICKHOUSE_USERNAME = "default"
 CLICKHOUSE_PASSWORD = "sasa"
+# Запись снимков из Main.py и binance_module.py в ClickHouse (clickhouse_sink.py)
+CLICKHOUSE_ENABLED = False
+CLICKHOUSE_TABLE = "market_snapshots"
+CLICKHOUSE_BATCH_ROWS = 50000  # сброс буфера по числу строк
+CLICKHOUSE_FLUSH_INTERVAL = 10  # и по времени, секунды
+CLICKHOUSE_MAX_BUFFER_ROWS = 500000  # потолок буфера, пока ClickHouse недоступен
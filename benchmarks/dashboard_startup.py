@@ -0,0 +1,100 @@
+"""
+Запуск дашборда check_data: время до ответа сервера (layout) и до первой страницы таблицы (update_table).
+
+Для каждого размера генерируется market_data.db (--instruments инструментов, --snapshots снимков), дашборд
+запускается отдельным процессом в каталоге с этой базой. Время считается от старта процесса.
+
+Запуск из корня проекта:
+    python -m benchmarks.dashboard_startup [--instruments 50000] [--snapshots 100000 1000000] [--repeat 3]
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+
+import requests
+
+from benchmarks.dashboard_table import build
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TABLE_INPUTS = [
+    ('exchange-filter', 'value', None), ('market-type-filter', 'value', None), ('price-filter', 'value', None),
+    ('volume-filter', 'value', None), ('search-input', 'value', None), ('history-switch', 'value', 'latest'),
+    ('market_data_table', 'page_current', 0), ('market_data_table', 'page_size', 20),
+    ('market_data_table', 'sort_by', []), ('market_data_table', 'filter_query', ''),
+]
+TABLE_OUTPUTS = [('market_data_table', 'data'), ('market_data_table', 'page_count'),
+                 ('market_data_table', 'page_current')]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def table_request():
+    # Тело запроса, которое браузер отправляет для первого вызова update_table
+    return {
+        'output': '..' + '...'.join(f'{i}.{p}' for i, p in TABLE_OUTPUTS) + '..',
+        'outputs': [{'id': i, 'property': p} for i, p in TABLE_OUTPUTS],
+        'inputs': [{'id': i, 'property': p, 'value': v} for i, p, v in TABLE_INPUTS],
+        'changedPropIds': [],
+        'state': [],
+    }
+
+
+def wait_for(session, url, started, timeout=60):
+    while time.perf_counter() - started < timeout:
+        try:
+            if session.get(url, timeout=(1, timeout)).ok:
+                return time.perf_counter() - started
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def start_once(directory):
+    port = free_port()
+    code = f"import sys; sys.path.insert(0, {ROOT!r}); import check_data; check_data.app.run(port={port})"
+    session = requests.Session()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, '-c', code], cwd=directory,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        url = f'http://127.0.0.1:{port}'
+        layout = wait_for(session, f'{url}/_dash-layout', started)
+        response = session.post(f'{url}/_dash-update-component', json=table_request(), timeout=60)
+        response.raise_for_status()
+        first_page = time.perf_counter() - started
+        rows = len(response.json()['response']['market_data_table']['data'])
+        return layout, first_page, rows
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--instruments', type=int, default=50000)
+    parser.add_argument('--snapshots', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for snapshots in args.snapshots:
+        with tempfile.TemporaryDirectory() as directory:
+            build(f'{directory}/market_data.db', args.instruments, snapshots)
+            size = os.path.getsize(f'{directory}/market_data.db') / 2 ** 20
+            runs = [start_once(directory) for _ in range(args.repeat)]
+            layout = min(run[0] for run in runs)
+            first_page = min(run[1] for run in runs)
+            print(f"Снимков {snapshots} ({size:.0f} МБ): layout {layout * 1000:.0f} мс, "
+                  f"первая страница ({runs[0][2]} строк) {first_page * 1000:.0f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Ответ коллбэка таблицы дашборда: вся выборка в to_dict('records') (прежний update_table)
+против одной страницы db_queries.query_page (page_action/sort_action/filter_action="custom").
+
+База генерируется синтетически: --instruments инструментов в market_data_latest и --snapshots снимков истории.
+
+Запуск из корня проекта:
+    python -m benchmarks.dashboard_table [--instruments 50000] [--snapshots 500000] [--repeat 3]
+"""
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from db_writer import SNAPSHOT_COLUMNS, connect, create_schema, fill_latest
+from db_queries import connect as connect_ro, query_market_data, query_page
+
+CASES = [
+    ('последние, без фильтров', {}, None, ''),
+    ('последние, Binance spot, сортировка по объему', {'exchange': 'Binance', 'market_type': 'spot'},
+     [{'column_id': 'volume_24h', 'direction': 'desc'}], ''),
+    ('последние, фильтр колонки цены', {}, None, '{last_price} > 10'),
+    ('история, без фильтров', {'history': True}, None, ''),
+    ('история, поиск BTC', {'history': True, 'search': 'BTC'}, None, ''),
+]
+
+
+def build(path, instruments, snapshots):
+    conn = connect(path)
+    create_schema(conn)
+    rng = np.random.default_rng(1)
+    exchanges = ['Binance', 'Bybit', 'OKX']
+    markets = ['spot', 'futures']
+    conn.execute('BEGIN')
+    conn.executemany(
+        "INSERT INTO instruments (id, exchange, market_type, symbol) VALUES (?, ?, ?, ?)",
+        [(i + 1, exchanges[i % 3], markets[i // 3 % 2], f'{"BTC" if i % 50 == 0 else "SYM"}{i}USDT')
+         for i in range(instruments)])
+    instrument = rng.integers(1, instruments + 1, snapshots)
+    price = rng.lognormal(0, 3, snapshots)
+    volume = rng.lognormal(10, 2, snapshots)
+    conn.executemany(
+        f"INSERT INTO snapshots (instrument_id, {', '.join(SNAPSHOT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, NULL)",
+        zip(instrument.tolist(), price.tolist(), volume.tolist(), (price * volume).tolist(),
+            (price * 1.1).tolist(), (price * 0.9).tolist(), (volume / price).astype(int).tolist()))
+    conn.execute('DELETE FROM market_data_latest')
+    fill_latest(conn)
+    conn.execute('COMMIT')
+    conn.close()
+
+
+def full_response(conn, filters, sort_by, filter_query):
+    # Прежний путь: вся выборка отправляется в браузер, сортировка и фильтр колонок - на клиенте
+    return query_market_data(conn, **filters).to_dict('records')
+
+
+def page_response(conn, filters, sort_by, filter_query):
+    df, total = query_page(conn, page=0, page_size=20, sort_by=sort_by, filter_query=filter_query, **filters)
+    return [df.to_dict('records'), max(1, -(-total // 20)), 0]
+
+
+def measure(repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        # Сериализация в JSON входит в время ответа коллбэка
+        payload = json.dumps(fn(*args), default=str)
+        times.append(time.perf_counter() - started)
+    return len(payload), min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--instruments', type=int, default=50000)
+    parser.add_argument('--snapshots', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = f'{directory}/market_data.db'
+        build(path, args.instruments, args.snapshots)
+        conn = connect_ro(path)
+        print(f"Инструментов {args.instruments}, снимков {args.snapshots}")
+        for name, filters, sort_by, filter_query in CASES:
+            full_size, full_time = measure(args.repeat, full_response, conn, filters, sort_by, filter_query)
+            page_size, page_time = measure(args.repeat, page_response, conn, filters, sort_by, filter_query)
+            print(f"  {name:45} вся выборка {full_size / 2 ** 20:7.2f} МБ / {full_time * 1000:7.1f} мс, "
+                  f"страница {page_size / 1024:5.1f} КБ / {page_time * 1000:6.1f} мс")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Загрузка ряда цен одного инструмента: SQLite (pd.read_sql_query) против колоночного хранилища history_store.
+
+История генерируется синтетически (--points точек на --symbols инструментов) и пишется в три места:
+плоскую таблицу market_data с TEXT-колонками (исходная схема), нормализованную схему db_writer
+и history_store. Прошедшие дни хранилище запечатывает само по ходу записи, последний день читается из .bin.
+
+Запуск из корня проекта:
+    python -m benchmarks.history_store [--points 1200000] [--symbols 1 400] [--repeat 3]
+"""
+import time
+import sqlite3
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from db_writer import MARKET_DATA_COLUMNS, SNAPSHOT_COLUMNS, connect, create_schema
+from history_store import HistoryStore
+
+START = 1704067200  # 2024-01-01 00:00:00 UTC
+CHUNK = 100000
+
+LEGACY_SCHEMA = f'''
+    CREATE TABLE market_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        {', '.join(f'{c} TEXT' for c in MARKET_DATA_COLUMNS)},
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def generate(points, symbols):
+    # Цикл опроса по всем инструментам, шаг по времени подобран так, чтобы история заняла несколько дней
+    cycles = points // symbols
+    step = max(1, 14 * 86400 // cycles)
+    ts = START + np.repeat(np.arange(cycles) * step, symbols)
+    instrument = np.tile(np.arange(symbols), cycles)
+    price = 100 + np.cumsum(np.random.default_rng(1).normal(0, 0.1, len(ts)))
+    return ts, instrument, price
+
+
+def chunks(ts, instrument, price):
+    for lo in range(0, len(ts), CHUNK):
+        hi = lo + CHUNK
+        stamps = pd.to_datetime(ts[lo:hi], unit='s').strftime('%Y-%m-%d %H:%M:%S')
+        yield ts[lo:hi], instrument[lo:hi], price[lo:hi], stamps
+
+
+def build(directory, ts, instrument, price, symbols):
+    legacy = sqlite3.connect(f'{directory}/legacy.db')
+    legacy.execute(LEGACY_SCHEMA)
+    typed = connect(f'{directory}/typed.db')
+    create_schema(typed)
+    typed.executemany("INSERT INTO instruments (id, exchange, market_type, symbol) VALUES (?, 'Binance', 'spot', ?)",
+                      [(i + 1, f'SYM{i}') for i in range(symbols)])
+    store = HistoryStore(f'{directory}/history', MARKET_DATA_COLUMNS)
+
+    typed.execute('BEGIN')
+    for part_ts, part_instrument, part_price, stamps in chunks(ts, instrument, price):
+        symbol = [f'SYM{i}' for i in part_instrument]
+        price_text = [f'{p:.8f}' for p in part_price]
+        legacy.executemany(
+            'INSERT INTO market_data (symbol, exchange, market_type, last_price, volume_24h, timestamp) '
+            "VALUES (?, 'Binance', 'spot', ?, '1000', ?)", zip(symbol, price_text, stamps))
+        typed.executemany(
+            f"INSERT INTO snapshots (instrument_id, timestamp, {', '.join(SNAPSHOT_COLUMNS)}) "
+            f"VALUES (?, ?, ?, 1000, NULL, NULL, NULL, NULL, NULL)",
+            zip((part_instrument + 1).tolist(), stamps, part_price.tolist()))
+        rows = [(s, 'Binance', 'spot', p, 1000.0, s, None, None, None, None, None, None, None, None)
+                for s, p in zip(symbol, part_price.tolist())]
+        store.append(rows, ts=part_ts)
+    typed.execute('COMMIT')
+    legacy.commit()
+    legacy.close()
+    typed.close()
+
+
+def read_sqlite(path, symbol):
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    df = pd.read_sql_query(
+        "SELECT timestamp, last_price FROM market_data WHERE exchange = 'Binance' AND market_type = 'spot' "
+        "AND symbol = ? ORDER BY timestamp", conn, params=(symbol,))
+    conn.close()
+    x = pd.to_datetime(df['timestamp'])
+    y = df['last_price'].astype(float)
+    return len(y)
+
+
+def read_store(root, symbol):
+    # Новый экземпляр на каждый замер: открытие файлов входит во время загрузки
+    series = HistoryStore(root).series('Binance', 'spot', symbol)
+    x = pd.to_datetime(series['ts'], unit='ms')
+    y = series['last_price']
+    return len(y)
+
+
+def best(repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        count = fn(*args)
+        times.append(time.perf_counter() - started)
+    return count, min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--points', type=int, default=1200000)
+    parser.add_argument('--symbols', type=int, nargs='+', default=[1, 400])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for symbols in args.symbols:
+        with tempfile.TemporaryDirectory() as directory:
+            ts, instrument, price = generate(args.points, symbols)
+            started = time.perf_counter()
+            build(directory, ts, instrument, price, symbols)
+            print(f"{len(ts)} точек, инструментов: {symbols}, подготовка {time.perf_counter() - started:.1f} с")
+
+            results = [
+                ('SQLite TEXT (плоская таблица)', best(args.repeat, read_sqlite, f'{directory}/legacy.db', 'SYM0')),
+                ('SQLite REAL (instruments + snapshots)',
+                 best(args.repeat, read_sqlite, f'{directory}/typed.db', 'SYM0')),
+                ('history_store (memory-mapped)', best(args.repeat, read_store, f'{directory}/history', 'SYM0')),
+            ]
+            for name, (count, elapsed) in results:
+                print(f"  {name:40} {count:8} точек ряда: {elapsed * 1000:8.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
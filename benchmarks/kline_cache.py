@@ -0,0 +1,118 @@
+"""
+Обновление графика свечей каждые 5 секунд: полная загрузка 120 свечей в DataFrame (прежний get_data_binance)
+против kline_cache.KlineCache, который догружает только свечи с последней сохраненной.
+
+Свечи Binance /api/v3/klines (параметры symbol, interval, startTime, limit) отдает локальный HTTP-сервер.
+
+Запуск из корня проекта:
+    python -m benchmarks.kline_cache [--ticks 60]
+"""
+import json
+import time
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+import http_client
+import exchange_data
+from kline_cache import KLINE_REFRESH, KlineCache
+
+MINUTE = 60000
+
+
+def candle(open_time):
+    price = 60000 + open_time / MINUTE % 500
+    return [open_time, f'{price:.2f}', f'{price + 5:.2f}', f'{price - 5:.2f}', f'{price + 1:.2f}', '12.345',
+            open_time + MINUTE - 1, '740700.0', 100, '6.1', '366000.0', '0']
+
+
+def serve(sent):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            query = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+            limit = int(query.get('limit', 500))
+            now = int(time.time() * 1000) // MINUTE * MINUTE
+            if 'startTime' in query:
+                first = -(-int(query['startTime']) // MINUTE) * MINUTE
+                times = range(first, min(now, first + (limit - 1) * MINUTE) + 1, MINUTE)
+            else:
+                times = range(now - (limit - 1) * MINUTE, now + 1, MINUTE)
+            body = json.dumps([candle(t) for t in times]).encode()
+            sent.append(len(body))
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_tick(symbol):
+    # Прежний путь: 120 свечей на каждый тик и DataFrame с приведением типов
+    data = http_client.get(exchange_data.BINANCE_KLINES_URL,
+                           params={'symbol': symbol, 'interval': '1m', 'limit': 120}).json()
+    df = pd.DataFrame(data, columns=[
+        'Open time', 'Open', 'High', 'Low', 'Close', 'Volume', 'Close time', 'Quote asset volume',
+        'Number of trades', 'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'])
+    df['Open time'] = pd.to_datetime(df['Open time'], unit='ms')
+    for column in ('Open', 'High', 'Low', 'Close'):
+        df[column] = df[column].astype(float)
+    return len(df)
+
+
+def run(ticks, fn, *args):
+    times = []
+    for _ in range(ticks):
+        started = time.perf_counter()
+        count = fn(*args)
+        times.append(time.perf_counter() - started)
+    times.sort()
+    return count, times[len(times) // 2], times[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--ticks', type=int, default=60)
+    args = parser.parse_args()
+
+    sent = []
+    server = serve(sent)
+    exchange_data.BINANCE_KLINES_URL = f'http://127.0.0.1:{server.server_address[1]}/api/v3/klines'
+    # Прогрев соединения пула
+    legacy_tick('BTCUSDT')
+
+    sent.clear()
+    count, median, worst = run(args.ticks, legacy_tick, 'BTCUSDT')
+    print(f"Полная загрузка: {count} свечей, {len(sent)} запросов, {sum(sent) / 1024:.1f} КБ, "
+          f"тик медиана {median * 1000:.2f} мс, макс. {worst * 1000:.2f} мс")
+
+    # refresh=0: каждый тик идет на биржу, экономия только за счет догрузки новых свечей
+    sent.clear()
+    cache = KlineCache(refresh=0)
+    count, median, worst = run(args.ticks, lambda: len(cache.get('Binance', 'BTCUSDT')))
+    print(f"KlineCache:      {count} свечей, {len(sent)} запросов, {sum(sent) / 1024:.1f} КБ "
+          f"(первый {sent[0] / 1024:.1f} КБ), тик медиана {median * 1000:.2f} мс, макс. {worst * 1000:.2f} мс")
+
+    # Несколько вкладок в пределах KLINE_REFRESH: на биржу идет только первая, остальные читают память
+    sent.clear()
+    cache.refresh = KLINE_REFRESH
+    count, median, worst = run(args.ticks, lambda: len(cache.get('Binance', 'BTCUSDT')))
+    print(f"Из памяти:       {count} свечей, {len(sent)} запросов, тик медиана {median * 1000:.3f} мс, "
+          f"макс. {worst * 1000:.2f} мс")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
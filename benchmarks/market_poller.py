@@ -0,0 +1,84 @@
+"""
+Запросы к бирже от вкладок дашборда: прямой вызов в каждом коллбэке против общего фонового опроса market_poller.
+
+--viewers вкладок раз в --interval секунд запрашивают свечи и стакан одного символа в течение --seconds секунд.
+Биржа заменена счетчиком вызовов с задержкой ответа --latency. После ухода зрителей проверяется,
+что потоки опроса останавливаются через --idle секунд.
+
+Запуск из корня проекта:
+    python -m benchmarks.market_poller [--viewers 1 10 50] [--seconds 10] [--interval 1] [--latency 0.1]
+"""
+import time
+import argparse
+import threading
+
+from market_poller import MarketPoller
+
+KINDS = ('klines', 'order_book')
+
+
+class FakeExchange:
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def fetch(self, exchange, market_type, symbol):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        return self.calls
+
+
+def viewers(count, seconds, interval, read):
+    # Вкладки стартуют вразнобой, как и их dcc.Interval; возвращается максимальное время ответа коллбэка
+    slowest = []
+
+    def tab(offset):
+        worst = 0
+        time.sleep(offset)
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            for kind in KINDS:
+                read(kind)
+            worst = max(worst, time.perf_counter() - started)
+            time.sleep(interval)
+        slowest.append(worst)
+
+    threads = [threading.Thread(target=tab, args=(interval * i / count,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return max(slowest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--viewers', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--interval', type=float, default=1)
+    parser.add_argument('--period', type=float, default=1)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--idle', type=float, default=2)
+    args = parser.parse_args()
+
+    for count in args.viewers:
+        direct = FakeExchange(args.latency)
+        slowest = viewers(count, args.seconds, args.interval, lambda kind: direct.fetch('Binance', 'spot', 'BTCUSDT'))
+        print(f"{count:3d} вкладок, прямые запросы: {direct.calls / args.seconds:6.1f} запросов/с, "
+              f"ответ коллбэка до {slowest * 1000:.0f} мс")
+
+        shared = FakeExchange(args.latency)
+        poller = MarketPoller(period=args.period, idle_timeout=args.idle,
+                              fetchers={kind: shared.fetch for kind in KINDS}, releasers={})
+        slowest = viewers(count, args.seconds, args.interval, lambda kind: poller.get(kind, 'Binance', 'spot', 'BTCUSDT'))
+        rate = shared.calls / args.seconds
+        time.sleep(args.idle + args.period * 2)
+        print(f"{count:3d} вкладок, общий опрос:   {rate:6.1f} запросов/с, "
+              f"ответ коллбэка до {slowest * 1000:.0f} мс, потоков после ухода зрителей: {poller.stats()['pollers']}")
+
+
+if __name__ == '__main__':
+    main()
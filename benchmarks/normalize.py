@@ -0,0 +1,114 @@
+"""
+Микробенчмарк нормализации тикеров Binance /api/v3/ticker/24hr:
+построчные float()/Decimal (как было в Main.py) против векторного normalize.to_columns.
+
+Запуск из корня проекта:
+    python -m benchmarks.normalize [--payload ticker_24hr.json] [--record ticker_24hr.json] [--repeat 5]
+
+--payload - записанный ответ биржи; без него ответ собирается из Binance spot строк market_data.db
+в формате /api/v3/ticker/24hr. --record - запросить живой ответ и сохранить его в файл.
+"""
+import json
+import time
+import sqlite3
+import argparse
+from decimal import Decimal, InvalidOperation
+
+from db_writer import adapt_row
+from normalize import to_columns, to_rows
+
+
+def payload_from_db(db_path):
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    rows = conn.execute(
+        "SELECT symbol, last_price, volume_24h, high_price_24h, low_price_24h, trades_24h FROM market_data "
+        "WHERE exchange = 'Binance' AND market_type = 'spot'"
+    ).fetchall()
+    conn.close()
+    payload = []
+    for symbol, last, volume, high, low, trades in rows:
+        last, volume, high, low = (f"{float(v or 0):.8f}" for v in (last, volume, high, low))
+        payload.append({
+            'symbol': symbol, 'priceChange': '0.00000000', 'priceChangePercent': '0.000',
+            'weightedAvgPrice': last, 'prevClosePrice': last, 'lastPrice': last, 'lastQty': '1.00000000',
+            'bidPrice': last, 'bidQty': '1.00000000', 'askPrice': last, 'askQty': '1.00000000',
+            'openPrice': last, 'highPrice': high, 'lowPrice': low, 'volume': volume,
+            'quoteVolume': f"{float(volume) * float(last):.8f}", 'openTime': 1728500000000,
+            'closeTime': 1728586399999, 'firstId': 1, 'lastId': 2, 'count': int(float(trades or 0)),
+        })
+    return payload
+
+
+def legacy_normalize(data, exchange, market_type):
+    # Прежний путь: float() в get_binance_spot_data и Decimal в save_to_db
+    for item in data:
+        item['highPrice24h'] = float(item.get('highPrice', 0) or 0)
+        item['lowPrice24h'] = float(item.get('lowPrice', 0) or 0)
+        item['volume24h'] = float(item.get('volume', 0) or 0)
+        item['lastPrice'] = float(item.get('lastPrice', 0) or 0)
+        item['count'] = int(float(item.get('count', 0)) or 0)
+    rows = []
+    for item in data:
+        try:
+            symbol = item.get('symbol')
+            last_price = Decimal(str(item.get('lastPrice') or item.get('last') or 0))
+            volume_24h = Decimal(str(item.get('volume24h') or item.get('turnover24h') or item.get('vol24h') or 0))
+            high_price_24h = Decimal(str(item.get('highPrice24h') or item.get('high24h') or 0))
+            low_price_24h = Decimal(str(item.get('lowPrice24h') or item.get('low24h') or 0))
+            trades_24h = Decimal(str(item.get('trades_24h') or (volume_24h / last_price if last_price > 0 else 0)))
+            price_usdt = volume_24h * last_price
+            rows.append(adapt_row((symbol, exchange, market_type, last_price, volume_24h, symbol, price_usdt,
+                                   high_price_24h, low_price_24h, trades_24h, None, None, None, None)))
+        except (InvalidOperation, TypeError, ValueError):
+            continue
+    return rows
+
+
+def vectorized_normalize(data, exchange, market_type):
+    return to_rows(to_columns(data, exchange, market_type))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', default='market_data.db')
+    parser.add_argument('--payload')
+    parser.add_argument('--record')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.record:
+        import http_client
+        data = http_client.get('https://api.binance.com/api/v3/ticker/24hr').json()
+        with open(args.record, 'w') as file:
+            json.dump(data, file)
+        args.payload = args.record
+    if args.payload:
+        with open(args.payload) as file:
+            raw = file.read()
+        source = args.payload
+    else:
+        raw = json.dumps(payload_from_db(args.db))
+        source = f'{args.db} (Binance spot)'
+    print(f"{len(json.loads(raw))} тикеров из {source}")
+
+    results = {}
+    for name, method in (('построчно (как раньше)', legacy_normalize), ('векторно', vectorized_normalize)):
+        best = None
+        for _ in range(args.repeat):
+            data = json.loads(raw)  # прежний путь меняет словари, поэтому каждый раз свежая копия
+            started = time.perf_counter()
+            rows = method(data, 'Binance', 'spot')
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = rows
+        print(f"{name:24} {best * 1000:8.2f} мс  {len(rows) / best:12,.0f} тикеров/с")
+
+    legacy, vectorized = results.values()
+    mismatched = sum(1 for a, b in zip(legacy, vectorized)
+                     if a[:3] != b[:3] or any(abs((x or 0) - (y or 0)) > 1e-6 * max(abs(x or 0), 1)
+                                              for x, y in zip(a[3:10:], b[3:10:]) if not isinstance(x, str)))
+    print(f"Расхождений в значениях: {mismatched}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Отрисовка стакана в дашборде: прежний цикл по iterrows с html.Div на уровень против order_book_view
+(группировка и накопленный объем на NumPy, таблица уровней и Patch графика глубины).
+
+Стакан генерируется синтетически: --levels уровней на каждую сторону.
+
+Запуск из корня проекта:
+    python -m benchmarks.order_book [--levels 20 500 5000] [--repeat 20]
+"""
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from dash import html, Patch
+from plotly.io.json import to_json_plotly
+
+from order_book_view import depth, depth_patch, table_rows
+
+
+def make_book(count):
+    rng = np.random.default_rng(1)
+    mid = 60000.0
+    bids = np.column_stack((mid - 0.01 * np.arange(1, count + 1), rng.lognormal(-2, 1.5, count)))
+    asks = np.column_stack((mid + 0.01 * np.arange(1, count + 1), rng.lognormal(-2, 1.5, count)))
+    return bids, asks
+
+
+def legacy_render(bids, asks):
+    # Прежний update_order_book_div на DataFrame из прежних get_order_book_*
+    bids = pd.DataFrame(bids, columns=['Price', 'Quantity'])
+    asks = pd.DataFrame(asks, columns=['Price', 'Quantity'])
+    bids['Side'] = 'Bids'
+    asks['Side'] = 'Asks'
+    order_book = pd.concat([bids, asks], ignore_index=True)
+    order_book = order_book.sort_values(by='Price', ascending=False)
+
+    rows = []
+    for _, row in order_book.iterrows():
+        color = '#00cc96' if row['Side'] == 'Bids' else '#ef553b'
+        rows.append(
+            html.Div([
+                html.Span(f"{row['Price']:.2f}", style={'width': '33%', 'display': 'inline-block', 'color': color, 'fontWeight': 'bold'}),
+                html.Span(f"{row['Quantity']:.6f}", style={'width': '33%', 'display': 'inline-block', 'color': color}),
+                html.Span(f"{row['Side']}", style={'width': '33%', 'display': 'inline-block', 'color': color})
+            ], style={'padding': '4px 0'})
+        )
+    return rows
+
+
+def render(bids, asks, tick):
+    bids, asks = depth(bids, asks, tick)
+    return [table_rows(bids, asks), depth_patch(Patch(), bids, asks).to_plotly_json()]
+
+
+def measure(repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        book = [frame.copy() for frame in args[:2]]
+        started = time.perf_counter()
+        # Сериализация ответа коллбэка входит во время
+        payload = to_json_plotly(fn(*book, *args[2:]))
+        times.append(time.perf_counter() - started)
+    return len(payload), min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--levels', type=int, nargs='+', default=[20, 500, 5000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    for count in args.levels:
+        bids, asks = make_book(count)
+        legacy_size, legacy_time = measure(args.repeat, legacy_render, bids, asks)
+        print(f"{count} уровней на сторону: html.Div {legacy_size / 1024:8.1f} КБ / {legacy_time * 1000:7.2f} мс")
+        for tick in (0, 1):
+            size, elapsed = measure(args.repeat, render, bids, asks, tick)
+            print(f"  order_book_view, шаг {tick:g}: {size / 1024:8.1f} КБ / {elapsed * 1000:7.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Воспроизведение записанного потока стакана через order_book_engine.OrderBookFeed вместо WebSocket.
+
+Поток в формате Binance depthUpdate (U, u, b, a) генерируется по эталонному стакану: --updates обновлений
+по --levels уровней, в середине выбрасывается одно сообщение (пропуск номера). Локальная копия должна
+заметить пропуск, загрузить снимок заново и совпасть с эталоном после воспроизведения.
+
+Запуск из корня проекта:
+    python -m benchmarks.order_book_feed [--updates 20000] [--levels 10] [--depth 5000]
+"""
+import json
+import time
+import argparse
+
+import numpy as np
+
+from order_book_engine import OrderBookFeed
+
+MID = 60000.0
+
+
+def record(updates, levels, depth):
+    # Эталонный стакан и поток обновлений к нему; snapshots - копии эталона по номеру обновления для REST
+    rng = np.random.default_rng(1)
+    book = {'bids': {}, 'asks': {}}
+    for side, sign in (('bids', -1), ('asks', 1)):
+        for price in np.round(MID + sign * 0.01 * np.arange(1, depth + 1), 2).tolist():
+            book[side][price] = 1.0
+    snapshots = {0: {side: dict(levels) for side, levels in book.items()}}
+    frames = []
+    sequence = 0
+    for _ in range(updates):
+        first = sequence + 1
+        sequence += int(rng.integers(1, 4))
+        message = {'e': 'depthUpdate', 's': 'BTCUSDT', 'U': first, 'u': sequence, 'b': [], 'a': []}
+        for side, key, sign in (('bids', 'b', -1), ('asks', 'a', 1)):
+            prices = np.round(MID + sign * 0.01 * rng.integers(1, depth + 1, levels), 2)
+            quantities = np.where(rng.random(levels) < 0.2, 0, np.round(rng.lognormal(-2, 1, levels), 6))
+            for price, quantity in zip(prices.tolist(), quantities.tolist()):
+                message[key].append([f'{price:.2f}', f'{quantity:.6f}'])
+                if quantity:
+                    book[side][price] = quantity
+                else:
+                    book[side].pop(price, None)
+        frames.append(json.dumps(message))
+        if len(frames) == updates // 2 + 1:
+            snapshots[sequence] = {side: dict(levels) for side, levels in book.items()}
+    return frames, snapshots, book
+
+
+def replay(frames, snapshots):
+    # Первое подключение теряет сообщение frames[gap], после пересинхронизации поток идет со следующего
+    gap = len(frames) // 2
+    connections = []
+
+    def transport(url, subscribe):
+        connections.append(url)
+        if len(connections) == 1:
+            yield from frames[:gap]
+            yield from frames[gap + 1:]
+        else:
+            yield from frames[gap + 1:]
+            feed.stop()
+
+    def snapshot(symbol):
+        sequence = 0 if len(connections) == 1 else json.loads(frames[gap])['u']
+        book = snapshots[sequence]
+        return list(book['bids'].items()), list(book['asks'].items()), sequence
+
+    feed = OrderBookFeed('Binance', 'BTCUSDT', transport=transport, snapshot=snapshot)
+    started = time.perf_counter()
+    feed.run()
+    return feed, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--updates', type=int, default=20000)
+    parser.add_argument('--levels', type=int, default=10)
+    parser.add_argument('--depth', type=int, default=5000)
+    args = parser.parse_args()
+
+    frames, snapshots, book = record(args.updates, args.levels, args.depth)
+    feed, elapsed = replay(frames, snapshots)
+    bids, asks = feed.book.top()
+    expected_bids = sorted(book['bids'].items(), reverse=True)
+    expected_asks = sorted(book['asks'].items())
+    matches = (np.allclose(bids, expected_bids) and np.allclose(asks, expected_asks))
+    print(f"Сообщений {len(frames)}, применено {feed.applied}, пересинхронизаций {feed.resyncs}, "
+          f"{feed.applied / elapsed:,.0f} обновлений/с ({elapsed / feed.applied * 1e6:.1f} мкс на обновление)")
+    print(f"Уровней {len(bids)}/{len(asks)}, совпадает с эталоном: {'да' if matches else 'НЕТ'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Бенчмарк записи снимков в market_data: построчные INSERT против пакетной записи.
+
+Строки берутся из существующей market_data.db и записываются двумя циклами опроса подряд: первый -
+в пустую базу, второй - те же строки повторно (инструменты уже известны, снимки не изменились).
+Построчная запись и executemany в плоскую таблицу идут в схему исходной базы и показывают чистый
+выигрыш от пакетной записи. BulkWriter пишет в нормализованную схему db_writer (instruments + snapshots
++ market_data_latest): сначала без фильтра изменений и хранилища истории, затем с каждым из них отдельно.
+Исходная база не изменяется.
+
+Запуск из корня проекта:
+    python -m benchmarks.save_to_db [--db market_data.db] [--repeat 3]
+"""
+import os
+import time
+import sqlite3
+import argparse
+import tempfile
+from itertools import groupby
+
+from db_writer import BulkWriter, INSERT_MARKET_DATA, MARKET_DATA_COLUMNS, adapt_row
+
+CYCLES = 2
+
+
+def load_batches(db_path):
+    # Пачки как в одном цикле опроса: по одной на биржу и тип рынка
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    schema = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'market_data'").fetchone()[0]
+    rows = conn.execute(f"SELECT {', '.join(MARKET_DATA_COLUMNS)} FROM market_data ORDER BY exchange, market_type").fetchall()
+    conn.close()
+    batches = [list(group) for _, group in groupby(rows, key=lambda r: (r[1], r[2]))]
+    return schema, batches
+
+
+def new_db(schema, directory, name):
+    # Своя папка на запуск: хранилище истории BulkWriter создается рядом с файлом базы
+    os.makedirs(directory)
+    path = os.path.join(directory, name)
+    if schema:
+        conn = sqlite3.connect(path)
+        conn.execute(schema)
+        conn.commit()
+        conn.close()
+    return path
+
+
+def timed_cycles(write, batches):
+    times = []
+    for _ in range(CYCLES):
+        started = time.perf_counter()
+        write(batches)
+        times.append(time.perf_counter() - started)
+    return times
+
+
+def write_per_row(path, batches):
+    # Прежняя схема save_to_db: новое соединение на пачку и execute на каждую строку
+    def write(batches):
+        for rows in batches:
+            conn = sqlite3.connect(path)
+            cursor = conn.cursor()
+            for row in rows:
+                cursor.execute(INSERT_MARKET_DATA, row)
+            conn.commit()
+            conn.close()
+    return timed_cycles(write, batches)
+
+
+def write_flat_executemany(path, batches):
+    # Та же плоская таблица, одно соединение и executemany на цикл
+    conn = sqlite3.connect(path)
+
+    def write(batches):
+        with conn:
+            for rows in batches:
+                conn.executemany(INSERT_MARKET_DATA, rows)
+    times = timed_cycles(write, batches)
+    conn.close()
+    return times
+
+
+def write_bulk(path, batches, change_filter=False, history=False):
+    writer = BulkWriter(path, change_filter=change_filter, history=history)
+    times = timed_cycles(writer.write_batches, batches)
+    writer.close()
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', default='market_data.db')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    schema, batches = load_batches(args.db)
+    adapted = [[adapt_row(row) for row in rows] for rows in batches]
+    total = sum(len(b) for b in batches)
+    print(f"{total} строк, {len(batches)} пачек; строк/с в первом и повторном цикле")
+
+    methods = [
+        ('построчно (как раньше)', write_per_row, schema, batches, {}),
+        ('executemany, плоская таблица', write_flat_executemany, schema, adapted, {}),
+        ('BulkWriter, нормализованная', write_bulk, None, adapted, {}),
+        ('  + фильтр изменений', write_bulk, None, adapted, {'change_filter': True}),
+        ('  + хранилище истории', write_bulk, None, adapted, {'history': True}),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        for n, (name, method, method_schema, method_batches, options) in enumerate(methods):
+            best = [None] * CYCLES
+            for i in range(args.repeat):
+                path = new_db(method_schema, os.path.join(directory, f'{n}_{i}'), 'market_data.db')
+                times = method(path, method_batches, **options)
+                best = [t if b is None else min(b, t) for b, t in zip(best, times)]
+            print(f"{name:30} " + ''.join(f"{total / t:12,.0f}" for t in best))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Пиковая память (tracemalloc) при получении тикеров: response.json() + нормализация
+против потокового разбора ticker_stream.stream_tickers.
+
+Ответы бирж в форматах Binance /ticker/24hr, Bybit /v5/market/tickers и OKX /api/v5/market/tickers
+собираются из строк market_data.db (--scale размножает их) и отдаются локальным HTTP-сервером.
+
+Запуск из корня проекта:
+    python -m benchmarks.stream_decode [--db market_data.db] [--scale 1 4]
+"""
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import http_client
+from Main import prepare_rows
+from ticker_stream import stream_tickers
+
+
+def load_tickers(db_path):
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    rows = conn.execute(
+        "SELECT symbol, last_price, volume_24h, high_price_24h, low_price_24h FROM market_data "
+        "WHERE market_type IN ('spot', 'futures')"
+    ).fetchall()
+    conn.close()
+    return [(s, *(f"{float(v or 0):.8f}" for v in values)) for s, *values in rows]
+
+
+def make_payloads(tickers, scale):
+    tickers = [(f"{s}{i or ''}", *v) for i in range(scale) for s, *v in tickers]
+    binance = [{
+        'symbol': s, 'priceChange': '0.0', 'priceChangePercent': '0.0', 'weightedAvgPrice': last,
+        'prevClosePrice': last, 'lastPrice': last, 'lastQty': '1.0', 'bidPrice': last, 'bidQty': '1.0',
+        'askPrice': last, 'askQty': '1.0', 'openPrice': last, 'highPrice': high, 'lowPrice': low,
+        'volume': volume, 'quoteVolume': volume, 'openTime': 1728500000000, 'closeTime': 1728586399999,
+        'firstId': 1, 'lastId': 2, 'count': 100,
+    } for s, last, volume, high, low in tickers]
+    bybit = {'retCode': 0, 'retMsg': 'OK', 'result': {'category': 'linear', 'list': [{
+        'symbol': s, 'lastPrice': last, 'indexPrice': last, 'markPrice': last, 'prevPrice24h': last,
+        'price24hPcnt': '0.0', 'highPrice24h': high, 'lowPrice24h': low, 'prevPrice1h': last,
+        'openInterest': volume, 'openInterestValue': volume, 'turnover24h': volume, 'volume24h': volume,
+        'fundingRate': '0.0001', 'nextFundingTime': '1728590400000', 'bid1Price': last, 'bid1Size': '1',
+        'ask1Price': last, 'ask1Size': '1',
+    } for s, last, volume, high, low in tickers]}, 'time': 1728586399999}
+    okx = {'code': '0', 'msg': '', 'data': [{
+        'instType': 'SWAP', 'instId': s, 'last': last, 'lastSz': '1', 'askPx': last, 'askSz': '1',
+        'bidPx': last, 'bidSz': '1', 'open24h': last, 'high24h': high, 'low24h': low, 'volCcy24h': volume,
+        'vol24h': volume, 'ts': '1728586399999', 'sodUtc0': last, 'sodUtc8': last,
+    } for s, last, volume, high, low in tickers]}
+    return {
+        '/binance': (json.dumps(binance).encode(), 'Binance', 'spot', None),
+        '/bybit': (json.dumps(bybit).encode(), 'Bybit', 'futures', 'list'),
+        '/okx': (json.dumps(okx).encode(), 'OKX', 'futures', 'data'),
+    }
+
+
+def serve(payloads):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            body = payloads[self.path][0]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def legacy_fetch(url, exchange, market_type, key):
+    # Прежний путь: весь ответ в словари через response.json(), затем нормализация
+    payload = http_client.get(url).json()
+    data = payload if key is None else (payload.get('result', {}).get(key) if key == 'list' else payload[key])
+    return prepare_rows(data, exchange, market_type)
+
+
+def measure(fetch, *args):
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = fetch(*args)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(rows), peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--db', default='market_data.db')
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 4])
+    args = parser.parse_args()
+
+    tickers = load_tickers(args.db)
+    for scale in args.scale:
+        payloads = make_payloads(tickers, scale)
+        server = serve(payloads)
+        base = f'http://127.0.0.1:{server.server_address[1]}'
+        print(f"Масштаб x{scale}:")
+        for path, (body, exchange, market_type, key) in payloads.items():
+            url = base + path
+            count, legacy_peak, legacy_time = measure(legacy_fetch, url, exchange, market_type, key)
+            _, stream_peak, stream_time = measure(stream_tickers, url, exchange, market_type, key)
+            print(f"  {exchange:8} {count:7} тикеров, ответ {len(body) / 2 ** 20:6.1f} МБ: "
+                  f"json() {legacy_peak / 2 ** 20:6.1f} МБ / {legacy_time * 1000:5.0f} мс, "
+                  f"поток {stream_peak / 2 ** 20:6.1f} МБ / {stream_time * 1000:5.0f} мс")
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Потоковый сбор тикеров stream_ingest против опроса REST: объем данных и задержка до записи.
+
+Записанный поток Bybit linear (снимок тикера на символ, затем дельты изменившихся полей) воспроизводится
+через TickerStream вместо WebSocket в реальном времени: --symbols символов, --rate сообщений в секунду,
+--seconds секунд. Строки попадают в конвейер-заглушку, который считает пачки и строки.
+Для сравнения - размер полного ответа /v5/market/tickers и задержка опроса с периодом --poll.
+
+Запуск из корня проекта:
+    python -m benchmarks.ticker_ws [--symbols 500] [--rate 200] [--seconds 10] [--poll 30]
+"""
+import json
+import time
+import argparse
+import threading
+
+import numpy as np
+
+from stream_ingest import StreamIngest, TickerStream, _bybit_subscribe, _parse_bybit
+
+
+def ticker(symbol, price):
+    return {'symbol': symbol, 'lastPrice': f'{price:.4f}', 'highPrice24h': f'{price * 1.05:.4f}',
+            'lowPrice24h': f'{price * 0.95:.4f}', 'turnover24h': '123456789.1234', 'volume24h': '98765.43',
+            'prevPrice24h': f'{price:.4f}', 'price24hPcnt': '0.0123', 'markPrice': f'{price:.4f}',
+            'indexPrice': f'{price:.4f}', 'openInterest': '1000', 'fundingRate': '0.0001',
+            'bid1Price': f'{price:.4f}', 'bid1Size': '1', 'ask1Price': f'{price:.4f}', 'ask1Size': '1'}
+
+
+def record(symbols, count):
+    rng = np.random.default_rng(1)
+    prices = rng.lognormal(2, 2, len(symbols))
+    snapshot = [ticker(s, p) for s, p in zip(symbols, prices)]
+    frames = [json.dumps({'topic': f'tickers.{t["symbol"]}', 'type': 'snapshot', 'data': t}) for t in snapshot]
+    for i in rng.integers(0, len(symbols), count).tolist():
+        prices[i] *= 1 + rng.normal(0, 0.001)
+        delta = {'symbol': symbols[i], 'lastPrice': f'{prices[i]:.4f}', 'bid1Price': f'{prices[i]:.4f}'}
+        frames.append(json.dumps({'topic': f'tickers.{symbols[i]}', 'type': 'delta', 'data': delta}))
+    return snapshot, frames
+
+
+class CountingPipeline:
+    # Заглушка WritePipeline: только размеры пачек
+    def __init__(self):
+        self.batches = []
+
+    def put(self, name, rows, fetch_time=None):
+        self.batches.append(len(rows))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--symbols', type=int, default=500)
+    parser.add_argument('--rate', type=int, default=200)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--poll', type=float, default=30)
+    args = parser.parse_args()
+
+    symbols = [f'SYM{i}USDT' for i in range(args.symbols)]
+    snapshot, frames = record(symbols, int(args.rate * args.seconds))
+    done = threading.Event()
+
+    def transport(url, subscribe):
+        started = time.perf_counter()
+        for n, frame in enumerate(frames[len(symbols):]):
+            # Темп записанного потока: сообщение n уходит через n / rate секунд
+            delay = started + n / args.rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            yield frame
+        done.set()
+        stream.stop()
+
+    pipeline = CountingPipeline()
+    stream = TickerStream('Bybit', 'futures', 'ws://replay', _bybit_subscribe, _parse_bybit,
+                          lambda: snapshot, transport)
+    ingest = StreamIngest([stream], pipeline).start()
+    done.wait()
+    ingest.stop()
+
+    stream_bytes = sum(len(f) for f in frames[len(symbols):])
+    rest_bytes = len(json.dumps({'retCode': 0, 'result': {'category': 'linear', 'list': snapshot}}))
+    rows = sum(pipeline.batches)
+    print(f"Поток: {len(frames) - len(symbols)} сообщений, {stream_bytes / 1024:.0f} КБ за {args.seconds:g} с, "
+          f"{len(pipeline.batches)} пачек, {rows} строк (из них {len(symbols)} - синхронизация REST), "
+          f"задержка до записи <= {ingest.flush_interval:g} с")
+    polls = args.seconds / args.poll
+    print(f"Опрос REST раз в {args.poll:g} с: ответ {rest_bytes / 1024:.0f} КБ, за {args.seconds:g} с "
+          f"{rest_bytes * polls / 1024:.0f} КБ и {int(args.symbols * polls)} строк, "
+          f"задержка до записи до {args.poll:g} с")
+    expected = {t['symbol']: t['lastPrice'] for t in snapshot}
+    for frame in frames[len(symbols):]:
+        data = json.loads(frame)['data']
+        expected[data['symbol']] = data['lastPrice']
+    matches = all(stream.latest[s]['lastPrice'] == price for s, price in expected.items())
+    print(f"Итоговые цены совпадают с записанным потоком: {'да' if matches else 'НЕТ'}")
+
+
+if __name__ == '__main__':
+    main()
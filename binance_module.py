@@ -1,42 +1,19 @@
-import sqlite3
 import logging
 import requests
+import http_client
 from decimal import Decimal, InvalidOperation
 from datetime import datetime
 
+from db_writer import adapt_row, get_writer
+
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
 
 
 # Создание базы данных
 def create_db():
-    conn = sqlite3.connect('market_data.db')
-    cursor = conn.cursor()
-
-
-    # Создаем таблицу для хранения данных
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS market_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            symbol TEXT NOT NULL,
-            exchange TEXT NOT NULL,
-            market_type TEXT NOT NULL,  -- 'spot', 'futures' или 'options'
-            last_price TEXT,
-            volume_24h TEXT,
-            options TEXT,
-            price_usdt TEXT,
-            high_price_24h TEXT,
-            low_price_24h TEXT,
-            trades_24h TEXT,
-            strike_price TEXT,
-            option_type TEXT,  -- 'Call' или 'Put'
-            expiry_date TEXT,
-            exercise_price TEXT,  -- Цена исполнения опциона
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        );
-    ''')
-    conn.commit()
-    conn.close()
+    # Схема таблицы общая для всех сборщиков и описана в db_writer
+    get_writer().conn
 
 
 # Получение данных с Binance об опционах
@@ -47,7 +24,7 @@ def get_binance_options_data():
     logging.info(f"Запрос данных обо всех опционах с Binance по адресу {url}...")
 
     try:
-        response = requests.get(url)
+        response = http_client.get(url)
 
         # Проверяем успешность запроса
         if response.status_code != 200:
@@ -93,7 +70,7 @@ def get_bybit_options_data():
         logging.info(f"Запрос данных об опционах {base_coin} с Bybit по адресу {url} с параметрами {params}...")
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
 
             # Проверяем успешность запроса
             if response.status_code != 200:
@@ -136,7 +113,7 @@ def get_okex_options_data():
         logging.info(f"Запрос данных об опционах {uly} с OKEx по адресу {url} с параметрами {params}...")
 
         try:
-            response = requests.get(url, params=params)
+            response = http_client.get(url, params=params)
 
             # Проверяем успешность запроса
             if response.status_code != 200:
@@ -165,15 +142,9 @@ def get_okex_options_data():
     return all_results
 
 
-# Сохранение данных в базу данных
-def save_to_db(data, exchange, market_type):
-    conn = sqlite3.connect('market_data.db')
-    cursor = conn.cursor()
-
-    # Логирование получения данных
-    logging.info(f"Сохранение данных для {exchange} ({market_type}): {data[:5]}...")  # Логируем первые 5 записей
-
-    # Вставляем данные
+# Преобразование опционных тикеров в строки для market_data
+def prepare_rows(data, exchange, market_type):
+    rows = []
     for item in data:
         try:
             if exchange == 'Binance':
@@ -243,46 +214,40 @@ def save_to_db(data, exchange, market_type):
             # Расчет price_usdt как объем * последняя цена
             price_usdt = volume_24h * last_price
 
-            # Форматируем числа без научной нотации
-            last_price_str = format(last_price, 'f')
-            volume_24h_str = format(volume_24h, 'f')
-            price_usdt_str = format(price_usdt, 'f')
-            high_price_24h_str = format(high_price_24h, 'f')
-            low_price_24h_str = format(low_price_24h, 'f')
-            trades_24h_str = str(trades_24h)
-
-            cursor.execute('''
-                INSERT INTO market_data (symbol, exchange, market_type, last_price, volume_24h, options, price_usdt,
-                                         high_price_24h, low_price_24h, trades_24h, strike_price, option_type, expiry_date, exercise_price)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (symbol, exchange, market_type, last_price_str, volume_24h_str, symbol, price_usdt_str,
-                  high_price_24h_str, low_price_24h_str, trades_24h_str, strike_price, option_type, expiry_date,
-                  exercise_price))
+            # Приводим числа к типам колонок (REAL/INTEGER или точная строка)
+            rows.append(adapt_row((symbol, exchange, market_type, last_price, volume_24h, symbol, price_usdt,
+                                   high_price_24h, low_price_24h, trades_24h, strike_price, option_type,
+                                   expiry_date, exercise_price)))
 
         except (InvalidOperation, TypeError, ValueError, KeyError) as e:
             logging.error(f"Ошибка при обработке данных: {e}")
             continue
 
-    conn.commit()
-    conn.close()
-    logging.info(f"Данные успешно сохранены для {market_type} с биржи {exchange}.")
+    return rows
+
+
+# Сохранение данных в базу данных
+def save_to_db(data, exchange, market_type):
+    # Логирование получения данных
+    # Первые 5 записей форматируются, только если включен уровень DEBUG
+    logging.debug("Сохранение данных для %s (%s): %s...", exchange, market_type, data[:5])
+
+    # Вставляем все строки одной транзакцией
+    count = get_writer().write(prepare_rows(data, exchange, market_type))
+    logging.info(f"Данные успешно сохранены для {market_type} с биржи {exchange} ({count} строк).")
 
 
 # Основной процесс: получение и сохранение данных
 if __name__ == "__main__":
     create_db()  # Создаем базу данных (выполните один раз)
 
-    # Получаем данные об опционах с Binance
-    binance_options_data = get_binance_options_data()
-    # Сохраняем данные в базу данных
-    save_to_db(binance_options_data, exchange='Binance', market_type='options')
-
-    # Получаем данные об опционах с Bybit
-    bybit_options_data = get_bybit_options_data()
-    # Сохраняем данные в базу данных
-    save_to_db(bybit_options_data, exchange='Bybit', market_type='options')
+    # Получаем данные об опционах с Binance, Bybit и OKEx
+    batches = [
+        prepare_rows(get_binance_options_data(), exchange='Binance', market_type='options'),
+        prepare_rows(get_bybit_options_data(), exchange='Bybit', market_type='options'),
+        prepare_rows(get_okex_options_data(), exchange='OKEx', market_type='options'),
+    ]
 
-    # Получаем данные об опционах с OKEx
-    okex_options_data = get_okex_options_data()
-    # Сохраняем данные в базу данных
-    save_to_db(okex_options_data, exchange='OKEx', market_type='options')
+    # Сохраняем все опционы одним коммитом
+    count = get_writer().write_batches(batches)
+    logging.info(f"Сохранено {count} опционных контрактов.")
@@ -0,0 +1,69 @@
+import time
+
+# Относительный допуск: поле считается изменившимся, если |new - old| > TOLERANCE * max(|new|, |old|)
+TOLERANCE = 1e-9
+# Полная запись каждого инструмента не реже, чем раз в KEYFRAME_INTERVAL секунд
+KEYFRAME_INTERVAL = 15 * 60
+
+
+def _changed(old, new, tolerance):
+    if old is None or new is None:
+        return old is not new
+    if isinstance(old, str) or isinstance(new, str):
+        return old != new
+    return abs(new - old) > tolerance * max(abs(new), abs(old))
+
+
+class ChangeFilter:
+    """
+    кэш последнего записанного состояния инструментов
+    Пропускает к записи только новые инструменты, строки с изменившимися полями
+    и периодические опорные (keyframe) строки, по которым восстанавливается история.
+    :param key_indexes: индексы полей ключа (биржа, тип рынка, символ) в строке
+    :param value_indexes: индексы сравниваемых полей в строке
+    :param tolerance: относительный допуск изменения
+    :param keyframe_interval: период полной записи в секундах
+    """
+
+    def __init__(self, key_indexes, value_indexes, tolerance=TOLERANCE, keyframe_interval=KEYFRAME_INTERVAL):
+        self.key_indexes = key_indexes
+        self.value_indexes = value_indexes
+        self.tolerance = tolerance
+        self.keyframe_interval = keyframe_interval
+        # ключ -> (значения полей, время последней записи)
+        self._state = {}
+
+    def select(self, rows, now=None):
+        """
+        отбирает строки для записи, кэш не меняет
+        :param rows: строки одной пачки
+        :param now: текущее время (time.monotonic)
+        :return: (строки для записи, обновления кэша для commit)
+        """
+        now = time.monotonic() if now is None else now
+        selected, updates = [], {}
+        for row in rows:
+            key = tuple(row[i] for i in self.key_indexes)
+            values = tuple(row[i] for i in self.value_indexes)
+            last = self._state.get(key)
+            if (last is None or now - last[1] >= self.keyframe_interval
+                    or any(_changed(old, new, self.tolerance) for old, new in zip(last[0], values))):
+                selected.append(row)
+                updates[key] = (values, now)
+        return selected, updates
+
+    def commit(self, updates):
+        """
+        запоминает записанное состояние после успешного коммита в базу
+        """
+        self._state.update(updates)
+
+    def clear(self):
+        self._state.clear()
+
+
+def write_ratio(written, received):
+    """
+    коэффициент записи: доля полученных строк, которые действительно записаны
+    """
+    return written / received if received else 0.0
@@ -1,130 +1,52 @@
+import logging
 import dash
 import dash_bootstrap_components as dbc
-from dash import dash_table, dcc, html, Input, Output, State
-import plotly.graph_objs as go
-import pandas as pd
-import sqlite3
-import requests
-from datetime import datetime, timedelta
+from dash import dash_table, dcc, html, Input, Output, State, Patch
+from db_queries import get_cache
+from order_book_view import ASK_COLOR, BID_COLOR, TICK_SIZES, depth, depth_figure, depth_patch, table_rows
+from datetime import timedelta
 
-# Функция для получения данных из базы данных
-def fetch_data_from_db():
-    conn = sqlite3.connect('market_data.db')
-    query = "SELECT * FROM market_data"
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
+# pandas, plotly.graph_objs, запросы к биржам (exchange_data) и history_store импортируются в коллбэках:
+# сервер поднимается и отдает layout без них, таблица заполняется первым вызовом update_table
 
-# Функции для получения данных с различных бирж (Binance, Bybit, OKX)
-def get_data_binance(symbol):
-    url = 'https://api.binance.com/api/v3/klines'
-    params = {
-        'symbol': symbol,
-        'interval': '1m',  # Интервал 1 минута
-        'limit': 120  # Получаем данные за последние 2 часа
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    if len(data) == 0:
-        return pd.DataFrame()  # Возвращаем пустой DataFrame, если данные отсутствуют
-    df = pd.DataFrame(data, columns=[
-        'Open time', 'Open', 'High', 'Low', 'Close', 'Volume',
-        'Close time', 'Quote asset volume', 'Number of trades',
-        'Taker buy base asset volume', 'Taker buy quote asset volume', 'Ignore'
-    ])
-    df['Open time'] = pd.to_datetime(df['Open time'], unit='ms') + timedelta(hours=3)  # Поправка на MSK
-    df['Open'] = df['Open'].astype(float)
-    df['High'] = df['High'].astype(float)
-    df['Low'] = df['Low'].astype(float)
-    df['Close'] = df['Close'].astype(float)
-    return df
+# Размер страницы таблицы: в браузер передается только видимая страница
+PAGE_SIZE = 20
+# Инструмент графика и стакана, пока в таблице не выбрана строка
+DEFAULT_SYMBOL = 'BTCUSDT'
+# Для скольких первых строк видимой страницы свечи и стакан загружаются заранее
+PREFETCH_ROWS = 5
 
-def get_data_bybit(symbol):
-    url = f'https://api.bybit.com/v2/public/kline/list'
-    params = {
-        'symbol': symbol,
-        'interval': 1,
-        'limit': 120
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    if data['ret_code'] != 0:
-        return pd.DataFrame()  # Возвращаем пустой DataFrame, если данные отсутствуют
-    df = pd.DataFrame(data['result'])
-    df['open_time'] = pd.to_datetime(df['open_time'], unit='s') + timedelta(hours=3)
-    df.rename(columns={'open_time': 'Open time', 'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close'}, inplace=True)
-    df['Open'] = df['Open'].astype(float)
-    df['High'] = df['High'].astype(float)
-    df['Low'] = df['Low'].astype(float)
-    df['Close'] = df['Close'].astype(float)
-    return df
+# Инициализация приложения Dash
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG])
+# Локальная история снимков, которую дописывают сборщики (чтение без копирования из memory-mapped файлов)
+_history = None
 
-def get_data_okx(symbol):
-    url = f'https://www.okx.com/api/v5/market/candles'
-    params = {
-        'instId': symbol,
-        'bar': '1m',
-        'limit': 120
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    if data['code'] != '0':
-        return pd.DataFrame()  # Возвращаем пустой DataFrame, если данные отсутствуют
-    df = pd.DataFrame(data['data'], columns=['ts', 'o', 'h', 'l', 'c', 'volume'])
-    df['Open time'] = pd.to_datetime(df['ts'], unit='ms') + timedelta(hours=3)
-    df.rename(columns={'o': 'Open', 'h': 'High', 'l': 'Low', 'c': 'Close'}, inplace=True)
-    df['Open'] = df['Open'].astype(float)
-    df['High'] = df['High'].astype(float)
-    df['Low'] = df['Low'].astype(float)
-    df['Close'] = df['Close'].astype(float)
-    return df
 
-# Функции для получения ордербуков с различных бирж (Binance, Bybit, OKX)
-def get_order_book_binance(symbol):
-    url = 'https://api.binance.com/api/v3/depth'
-    params = {
-        'symbol': symbol,
-        'limit': 20  # Лимит до 20 уровней на каждую сторону
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    if 'bids' in data and 'asks' in data:
-        bids = pd.DataFrame(data['bids'], columns=['Price', 'Quantity'], dtype=float)
-        asks = pd.DataFrame(data['asks'], columns=['Price', 'Quantity'], dtype=float)
-        return bids, asks
-    else:
-        return pd.DataFrame(columns=['Price', 'Quantity']), pd.DataFrame(columns=['Price', 'Quantity'])
+def get_history():
+    global _history
+    if _history is None:
+        from history_store import HistoryStore
+        _history = HistoryStore()
+    return _history
 
-def get_order_book_bybit(symbol):
-    url = f'https://api.bybit.com/v2/public/orderBook/L2'
-    params = {'symbol': symbol}
-    response = requests.get(url, params=params)
-    data = response.json()
-    if data['ret_code'] != 0:
-        return pd.DataFrame(columns=['Price', 'Quantity']), pd.DataFrame(columns=['Price', 'Quantity'])
-    bids = pd.DataFrame([x for x in data['result'] if x['side'] == 'Buy'], columns=['price', 'size'], dtype=float)
-    asks = pd.DataFrame([x for x in data['result'] if x['side'] == 'Sell'], columns=['price', 'size'], dtype=float)
-    bids.rename(columns={'price': 'Price', 'size': 'Quantity'}, inplace=True)
-    asks.rename(columns={'price': 'Price', 'size': 'Quantity'}, inplace=True)
-    return bids, asks
 
-def get_order_book_okx(symbol):
-    url = f'https://www.okx.com/api/v5/market/books'
-    params = {
-        'instId': symbol,
-        'sz': 20
-    }
-    response = requests.get(url, params=params)
-    data = response.json()
-    if data['code'] != '0':
-        return pd.DataFrame(columns=['Price', 'Quantity']), pd.DataFrame(columns=['Price', 'Quantity'])
-    bids = pd.DataFrame(data['data'][0]['bids'], columns=['Price', 'Quantity'], dtype=float)
-    asks = pd.DataFrame(data['data'][0]['asks'], columns=['Price', 'Quantity'], dtype=float)
-    return bids, asks
+def selected_instrument(selected, exchange, market_type):
+    """
+    инструмент графика и стакана: выбранная строка таблицы, без выбора - DEFAULT_SYMBOL на бирже
+    и рынке из фильтров (без фильтра рынка - спот)
+    :return: (биржа, тип рынка, символ из базы, символ в формате биржи или None, если свечей и стакана у нее нет)
+    """
+    from exchange_data import venue_symbol
+
+    if selected:
+        exchange, market_type, symbol = selected['exchange'], selected['market_type'], selected['symbol']
+    else:
+        symbol = DEFAULT_SYMBOL
+    market_type = market_type or 'spot'
+    # Свечи и стакан запрашиваются только для спота и фьючерсов, опционы строятся по локальной истории
+    tradable = exchange and market_type != 'options'
+    return exchange, market_type, symbol, venue_symbol(exchange, symbol, market_type) if tradable else None
 
-# Инициализация приложения Dash
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CYBORG])
-df = fetch_data_from_db()
 
 # Layout приложения
 app.layout = dbc.Container([
@@ -204,10 +126,53 @@ app.layout = dbc.Container([
             ),
             width=4
         ),
+        dbc.Col(
+            dcc.RadioItems(
+                id='history-switch',
+                options=[
+                    {'label': 'Последние данные', 'value': 'latest'},
+                    {'label': 'История', 'value': 'history'}
+                ],
+                value='latest',
+                labelStyle={'display': 'inline-block', 'margin-right': '10px'}
+            ),
+            width=4
+        ),
     ]),
     dbc.Row([
         dbc.Col(
-            html.Div(id='order-book-div', style={'height': '600px', 'overflowY': 'scroll', 'backgroundColor': '#1e1e1e', 'color': '#FFFFFF', 'padding': '10px', 'border': '1px solid #444444'}),
+            html.Div([
+                dcc.Dropdown(
+                    id='order-book-tick',
+                    options=[{'label': 'Без группировки' if tick == 0 else f'Шаг {tick:g}', 'value': tick}
+                             for tick in TICK_SIZES],
+                    value=0,
+                    clearable=False,
+                    style={'margin-bottom': '10px'}
+                ),
+                dash_table.DataTable(
+                    id='order-book-table',
+                    columns=[
+                        {"name": "Price", "id": "price", "type": "numeric", "format": {"specifier": ".2f"}},
+                        {"name": "Quantity", "id": "quantity", "type": "numeric", "format": {"specifier": ".6f"}},
+                        {"name": "Total", "id": "total", "type": "numeric", "format": {"specifier": ".6f"}},
+                        {"name": "Side", "id": "side"}
+                    ],
+                    data=[],
+                    fixed_rows={'headers': True},
+                    style_table={'height': '330px', 'overflowY': 'auto'},
+                    style_cell={'textAlign': 'center', 'padding': '4px', 'backgroundColor': '#1e1e1e',
+                                'border': 'none'},
+                    style_header={'fontWeight': 'bold', 'backgroundColor': '#1e1e1e', 'color': '#FFFFFF'},
+                    style_data_conditional=[
+                        {'if': {'filter_query': '{side} = "Bids"'}, 'color': BID_COLOR},
+                        {'if': {'filter_query': '{side} = "Asks"'}, 'color': ASK_COLOR},
+                        {'if': {'column_id': 'price'}, 'fontWeight': 'bold'},
+                    ],
+                ),
+                dcc.Graph(id='depth-chart', figure=depth_figure(), style={'height': '200px'},
+                          config={'displayModeBar': False}),
+            ], id='order-book-div', style={'height': '600px', 'backgroundColor': '#1e1e1e', 'color': '#FFFFFF', 'padding': '10px', 'border': '1px solid #444444'}),
             width=4
         ),
         dbc.Col(
@@ -233,11 +198,18 @@ app.layout = dbc.Container([
                     {"name": "Trades 24h", "id": "trades_24h", "type": "numeric", "format": {"specifier": ".0f"}},
                     {"name": "Timestamp", "id": "timestamp"}
                 ],
-                data=df.to_dict('records'),
-                sort_action="native",
+                # Таблица стартует пустой: первую страницу загружает update_table при открытии страницы.
+                # Страницы, сортировка и фильтры колонок выполняются в SQL (db_queries.query_page)
+                data=[],
+                page_action="custom",
+                page_current=0,
+                page_size=PAGE_SIZE,
+                page_count=1,
+                sort_action="custom",
                 sort_mode="multi",
-                filter_action="native",
-                page_size=20,
+                sort_by=[],
+                filter_action="custom",
+                filter_query='',
                 style_table={'overflowX': 'auto'},
                 style_cell={
                     'textAlign': 'center',
@@ -257,6 +229,8 @@ app.layout = dbc.Container([
             width=12
         )
     ]),
+    # Инструмент выбранной строки таблицы: биржа, тип рынка, символ
+    dcc.Store(id='selected-instrument'),
     dcc.Interval(
         id='interval-component',
         interval=5*1000,  # Обновление каждые 5 секунд
@@ -266,69 +240,104 @@ app.layout = dbc.Container([
 
 # Коллбэк для обновления таблицы данных в зависимости от фильтров и поиска
 @app.callback(
-    Output('market_data_table', 'data'),
+    [Output('market_data_table', 'data'),
+     Output('market_data_table', 'page_count'),
+     Output('market_data_table', 'page_current')],
     [Input('exchange-filter', 'value'),
      Input('market-type-filter', 'value'),
      Input('price-filter', 'value'),
      Input('volume-filter', 'value'),
-     Input('search-input', 'value')]
+     Input('search-input', 'value'),
+     Input('history-switch', 'value'),
+     Input('market_data_table', 'page_current'),
+     Input('market_data_table', 'page_size'),
+     Input('market_data_table', 'sort_by'),
+     Input('market_data_table', 'filter_query')]
 )
-def update_table(exchange, market_type, price, volume, search_value):
-    df = fetch_data_from_db()
-
-    # Фильтрация по выбранной бирже
-    if exchange:
-        df = df[(df['exchange'].str.lower().replace({'okex': 'okx'}) == exchange.lower())]
+def update_table(exchange, market_type, price, volume, search_value, mode, page_current, page_size, sort_by,
+                 filter_query):
+    # Фильтрация по бирже, типу рынка, цене, объему и символу, фильтры колонок, сортировка и страница
+    # выполняются в SQL; история всех снимков читается только по явному выбору.
+    # При смене фильтров или сортировки возвращаемся на первую страницу
+    page = page_current or 0 if 'market_data_table.page_current' in dash.ctx.triggered_prop_ids else 0
+    # Повторные запросы до следующей записи в базу отдаются из кэша
+    cache = get_cache()
+    df, total = cache.query_page(page=page, page_size=page_size, sort_by=sort_by,
+                                 filter_query=filter_query, exchange=exchange, market_type=market_type,
+                                 price=price, volume=volume, search=search_value, history=mode == 'history')
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Кэш запросов таблицы: %s", cache.stats())
+    return df.to_dict('records'), max(1, -(-total // page_size)), page
 
-    # Фильтрация по типу рынка
-    if market_type:
-        df = df[df['market_type'].str.lower() == market_type.lower()]
-
-    # Фильтрация по цене
-    if price is not None:
-        df = df[df['last_price'] >= price]
-
-    # Фильтрация по объему
-    if volume is not None:
-        df = df[df['volume_24h'] >= volume]
+# Выбор строки таблицы: график и стакан переключаются на ее инструмент
+@app.callback(
+    Output('selected-instrument', 'data'),
+    Input('market_data_table', 'active_cell'),
+    State('market_data_table', 'data'),
+    prevent_initial_call=True
+)
+def select_instrument(active_cell, rows):
+    if not active_cell or not rows or active_cell['row'] >= len(rows):
+        return dash.no_update
+    row = rows[active_cell['row']]
+    return {'exchange': row['exchange'], 'market_type': row['market_type'], 'symbol': row['symbol']}
 
-    # Фильтрация по символу актива
-    if search_value:
-        df = df[df['symbol'].str.contains(search_value, case=False, na=False)]
+# Фоновая загрузка свечей и стакана первых строк страницы: переключение на них не ждет ответа биржи
+@app.callback(
+    Input('market_data_table', 'data'),
+    prevent_initial_call=True
+)
+def prefetch_visible(rows):
+    from market_poller import get_poller
 
-    return df.to_dict('records')
+    poller = get_poller()
+    for row in (rows or [])[:PREFETCH_ROWS]:
+        exchange, market_type, _, symbol = selected_instrument(row, None, None)
+        if symbol is None:
+            continue
+        for kind in ('klines', 'order_book'):
+            poller.get(kind, exchange, market_type, symbol, wait=0)
 
 # Коллбэк для обновления графика актива
 @app.callback(
     Output('candlestick-chart', 'figure'),
     [Input('interval-component', 'n_intervals'),
+     Input('selected-instrument', 'data'),
      Input('exchange-filter', 'value'),
      Input('market-type-filter', 'value')]
 )
-def update_chart(n, exchange, market_type):
-    symbol = 'BTCUSDT'  # Заглушка для символа
-    if exchange == 'Binance':
-        df = get_data_binance(symbol)
-    elif exchange == 'Bybit':
-        df = get_data_bybit(symbol)
-    elif exchange.lower() in ['okx', 'okex']:
-        df = get_data_okx(symbol)
-    else:
-        df = pd.DataFrame()
+def update_chart(n, selected, exchange, market_type):
+    import pandas as pd
+    import plotly.graph_objs as go
+    from market_poller import get_poller
 
-    if df.empty:
-        return go.Figure()  # Возвращаем пустой график, если данные отсутствуют
+    exchange, market_type, symbol, exchange_symbol = selected_instrument(selected, exchange, market_type)
+    # Свечи обновляет общий фоновый поток (с биржи догружаются только новые), коллбэк читает кэш
+    klines = get_poller().get('klines', exchange, market_type, exchange_symbol) if exchange_symbol else None
 
-    candle = go.Candlestick(
-        x=df['Open time'],
-        open=df['Open'],
-        high=df['High'],
-        low=df['Low'],
-        close=df['Close'],
-        increasing_line_color='#00cc96',
-        decreasing_line_color='#ef553b',
-        name=f'{symbol} Price'
-    )
+    if klines is not None and len(klines):
+        trace = go.Candlestick(
+            x=pd.to_datetime(klines[:, 0], unit='ms') + timedelta(hours=3),  # Поправка на MSK
+            open=klines[:, 1],
+            high=klines[:, 2],
+            low=klines[:, 3],
+            close=klines[:, 4],
+            increasing_line_color='#00cc96',
+            decreasing_line_color='#ef553b',
+            name=f'{symbol} Price'
+        )
+    else:
+        # Свечей с биржи нет - строим линию по локальной истории снимков
+        series = get_history().series(exchange, market_type, symbol) if exchange else None
+        if series is None or not len(series['ts']):
+            return go.Figure()  # Возвращаем пустой график, если данные отсутствуют
+        trace = go.Scatter(
+            x=pd.to_datetime(series['ts'], unit='ms') + timedelta(hours=3),
+            y=series['last_price'],
+            mode='lines',
+            line_color='#00cc96',
+            name=f'{symbol} Price'
+        )
 
     layout = go.Layout(
         xaxis=dict(
@@ -347,44 +356,33 @@ def update_chart(n, exchange, market_type):
         margin=dict(l=50, r=50, t=50, b=50),
     )
 
-    fig = go.Figure(data=[candle], layout=layout)
+    fig = go.Figure(data=[trace], layout=layout)
 
     return fig
 
-# Callback to update the order book div
+# Коллбэк стакана: таблица уровней и график глубины обновляются как свойства, без пересборки компонентов
 @app.callback(
-    Output('order-book-div', 'children'),
+    [Output('order-book-table', 'data'),
+     Output('depth-chart', 'figure')],
     [Input('interval-component', 'n_intervals'),
-     Input('exchange-filter', 'value')]
+     Input('selected-instrument', 'data'),
+     Input('exchange-filter', 'value'),
+     Input('market-type-filter', 'value'),
+     Input('order-book-tick', 'value')]
 )
-def update_order_book_div(n, exchange):
-    symbol = 'BTCUSDT'  # Заглушка для символа
-    if exchange == 'Binance':
-        bids, asks = get_order_book_binance(symbol)
-    elif exchange == 'Bybit':
-        bids, asks = get_order_book_bybit(symbol)
-    elif exchange == 'OKX':
-        bids, asks = get_order_book_okx(symbol)
-    else:
-        bids, asks = pd.DataFrame(columns=['Price', 'Quantity']), pd.DataFrame(columns=['Price', 'Quantity'])
-
-    bids['Side'] = 'Bids'
-    asks['Side'] = 'Asks'
-    order_book = pd.concat([bids, asks], ignore_index=True)
-    order_book = order_book.sort_values(by='Price', ascending=False)
+def update_order_book_div(n, selected, exchange, market_type, tick):
+    import numpy as np
+    from market_poller import get_poller
 
-    rows = []
-    for _, row in order_book.iterrows():
-        color = '#00cc96' if row['Side'] == 'Bids' else '#ef553b'
-        rows.append(
-            html.Div([
-                html.Span(f"{row['Price']:.2f}", style={'width': '33%', 'display': 'inline-block', 'color': color, 'fontWeight': 'bold'}),
-                html.Span(f"{row['Quantity']:.6f}", style={'width': '33%', 'display': 'inline-block', 'color': color}),
-                html.Span(f"{row['Side']}", style={'width': '33%', 'display': 'inline-block', 'color': color})
-            ], style={'padding': '4px 0'})
-        )
+    exchange, market_type, _, symbol = selected_instrument(selected, exchange, market_type)
+    # Стакан из локальной копии (order_book_engine) читает общий фоновый поток, коллбэк - только кэш
+    book = get_poller().get('order_book', exchange, market_type, symbol) if symbol else None
+    bids, asks = book if book is not None else (np.empty((0, 2)), np.empty((0, 2)))
 
-    return rows
+    # Группировка по шагу цены и накопленный объем считаются на массивах NumPy
+    bids, asks = depth(bids, asks, tick or 0)
+    # На график уходят только новые координаты следов, оформление остается в браузере
+    return table_rows(bids, asks), depth_patch(Patch(), bids, asks)
 
 if __name__ == '__main__':
     app.run_server(debug=True)
\ No newline at end of file
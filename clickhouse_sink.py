@@ -0,0 +1,222 @@
+import time
+import atexit
+import random
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from Alex import env
+
+# Колонки таблицы ClickHouse: время снимка и поля market_data (кроме options, он совпадает с symbol)
+CLICKHOUSE_COLUMNS = (
+    'ts', 'exchange', 'market_type', 'symbol', 'last_price', 'volume_24h', 'price_usdt', 'high_price_24h',
+    'low_price_24h', 'trades_24h', 'strike_price', 'option_type', 'expiry_date', 'exercise_price',
+)
+
+# Сброс буфера: по числу строк или по времени с первой строки в буфере
+BATCH_ROWS = getattr(env, 'CLICKHOUSE_BATCH_ROWS', 50000)
+FLUSH_INTERVAL = getattr(env, 'CLICKHOUSE_FLUSH_INTERVAL', 10)
+# Потолок буфера: пока ClickHouse недоступен, старые строки вытесняются новыми
+MAX_BUFFER_ROWS = getattr(env, 'CLICKHOUSE_MAX_BUFFER_ROWS', 500000)
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 8.0
+
+
+def table_ddl(table):
+    """
+    DDL таблицы снимков: MergeTree с партициями по дням и сортировкой (exchange, symbol, ts)
+    """
+    return f'''
+    CREATE TABLE IF NOT EXISTS {table} (
+        ts DateTime64(3, 'UTC'),
+        exchange LowCardinality(String),
+        market_type LowCardinality(String),
+        symbol String,
+        last_price Nullable(Float64),
+        volume_24h Nullable(Float64),
+        price_usdt Nullable(Float64),
+        high_price_24h Nullable(Float64),
+        low_price_24h Nullable(Float64),
+        trades_24h Nullable(Float64),
+        strike_price Nullable(Float64),
+        option_type LowCardinality(Nullable(String)),
+        expiry_date Nullable(String),
+        exercise_price Nullable(Float64)
+    )
+    ENGINE = MergeTree
+    PARTITION BY toDate(ts)
+    ORDER BY (exchange, symbol, ts)
+    '''
+
+
+def _float(value):
+    return None if value is None or value == '' else float(value)
+
+
+class ClickHouseSink:
+    """
+    буферизованная запись снимков в ClickHouse крупными колоночными вставками
+    Буфер сбрасывает фоновый поток при BATCH_ROWS строках или через FLUSH_INTERVAL секунд,
+    поэтому add не ждет сети и не задерживает запись в SQLite.
+    Неудачная вставка повторяется с задержкой; если ClickHouse недоступен дольше,
+    строки остаются в буфере, но не больше MAX_BUFFER_ROWS - самые старые вытесняются.
+    :param client: клиент clickhouse_connect (или объект с методами command и insert)
+    :param row_columns: порядок колонок в строках для add (db_writer.MARKET_DATA_COLUMNS)
+    :param table: имя таблицы
+    """
+
+    def __init__(self, client, row_columns, table='market_snapshots', batch_rows=BATCH_ROWS,
+                 flush_interval=FLUSH_INTERVAL, max_buffer_rows=MAX_BUFFER_ROWS, retries=MAX_RETRIES):
+        self.client = client
+        self.table = table
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self._indexes = [row_columns.index(c) for c in CLICKHOUSE_COLUMNS[1:]]
+        self._buffer = deque(maxlen=max_buffer_rows)
+        self._first_added = None
+        self._lock = threading.Lock()
+        # Вставки идут по одной, чтобы при повторе не нарушался порядок строк
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self.inserted = 0
+        self.dropped = 0
+        self.client.command(table_ddl(table))
+        self._thread = threading.Thread(target=self._run, name='clickhouse-flush', daemon=True)
+        self._thread.start()
+
+    def add(self, rows, ts=None):
+        """
+        добавляет строки в буфер, при наборе batch_rows строк будит поток сброса
+        :param rows: кортежи в порядке row_columns
+        :param ts: время снимка (datetime UTC), по умолчанию текущее
+        """
+        if not rows:
+            return
+        ts = ts or datetime.now(timezone.utc)
+        with self._lock:
+            overflow = len(self._buffer) + len(rows) - self._buffer.maxlen
+            if overflow > 0:
+                self.dropped += overflow
+                logging.warning(f"Буфер ClickHouse переполнен, вытеснено {overflow} старых строк.")
+            self._buffer.extend((ts, *(row[i] for i in self._indexes)) for row in rows)
+            if self._first_added is None:
+                self._first_added = time.monotonic()
+            if len(self._buffer) >= self.batch_rows:
+                self._wake.set()
+
+    def _take(self):
+        with self._lock:
+            rows = list(self._buffer)
+            self._buffer.clear()
+            self._first_added = None
+        return rows
+
+    def _put_back(self, rows):
+        # Непереданные строки возвращаем в начало буфера, не превышая его потолок
+        with self._lock:
+            room = self._buffer.maxlen - len(self._buffer)
+            if room < len(rows):
+                self.dropped += len(rows) - room
+                logging.warning(f"Буфер ClickHouse переполнен, потеряно {len(rows) - room} строк.")
+                rows = rows[len(rows) - room:] if room else []
+            self._buffer.extendleft(reversed(rows))
+            if rows and self._first_added is None:
+                self._first_added = time.monotonic()
+
+    def _columns(self, rows):
+        columns = [list(column) for column in zip(*rows)]
+        for n, name in enumerate(CLICKHOUSE_COLUMNS):
+            if name not in ('ts', 'exchange', 'market_type', 'symbol', 'option_type', 'expiry_date'):
+                columns[n] = [_float(value) for value in columns[n]]
+        return columns
+
+    def flush(self):
+        """
+        отправляет весь буфер одной колоночной вставкой
+        :return: количество вставленных строк
+        """
+        with self._flush_lock:
+            rows = self._take()
+            if not rows:
+                return 0
+            columns = self._columns(rows)
+            for attempt in range(self.retries + 1):
+                try:
+                    self.client.insert(self.table, columns, column_names=CLICKHOUSE_COLUMNS, column_oriented=True)
+                    break
+                except Exception as e:
+                    if attempt == self.retries:
+                        logging.error(f"Вставка {len(rows)} строк в ClickHouse не удалась: {e}. "
+                                      f"Строки оставлены в буфере.")
+                        self._put_back(rows)
+                        return 0
+                    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                    logging.warning(f"Ошибка вставки в ClickHouse: {e}. Повтор через {delay:.2f} с.")
+                    # При остановке повторы идут без задержки
+                    self._stop.wait(delay)
+            self.inserted += len(rows)
+            logging.debug(f"В ClickHouse вставлено {len(rows)} строк.")
+            return len(rows)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(min(1.0, self.flush_interval))
+            self._wake.clear()
+            with self._lock:
+                due = self._first_added is not None and (
+                    len(self._buffer) >= self.batch_rows
+                    or time.monotonic() - self._first_added >= self.flush_interval)
+            if due:
+                self.flush()
+
+    def close(self):
+        """
+        останавливает фоновый сброс и отправляет остаток буфера
+        """
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+        logging.info(f"ClickHouse: вставлено {self.inserted} строк, потеряно {self.dropped}, "
+                     f"в буфере {len(self._buffer)}.")
+
+
+_sink = None
+_sink_lock = threading.Lock()
+
+
+def get_sink(row_columns):
+    """
+    общий приемник ClickHouse процесса или None, если он выключен (CLICKHOUSE_ENABLED в Alex/env.py)
+    либо не установлен clickhouse_connect
+    """
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            if not getattr(env, 'CLICKHOUSE_ENABLED', False):
+                return None
+            # Драйвер загружается только при включенном приемнике
+            try:
+                import clickhouse_connect
+            except ImportError:  # Необязательная зависимость: без нее снимки пишутся только в SQLite
+                logging.warning("CLICKHOUSE_ENABLED включен, но clickhouse_connect не установлен: "
+                                "снимки пишутся только в SQLite.")
+                return None
+            try:
+                client = clickhouse_connect.get_client(host=env.CLICKHOUSE_HOST,
+                                                       port=env.CLICKHOUSE_PORT,
+                                                       database=env.CLICKHOUSE_DATABASE,
+                                                       username=env.CLICKHOUSE_USERNAME,
+                                                       password=env.CLICKHOUSE_PASSWORD)
+                _sink = ClickHouseSink(client, row_columns,
+                                       table=getattr(env, 'CLICKHOUSE_TABLE', 'market_snapshots'))
+            except Exception as e:
+                logging.error(f"Не удалось подключиться к ClickHouse {env.CLICKHOUSE_HOST}: {e}")
+                return None
+            # Остаток буфера отправляется при завершении процесса (Main.py, binance_module.py)
+            atexit.register(_sink.close)
+        return _sink
@@ -0,0 +1,420 @@
+import re
+import sys
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from db_writer import DB_PATH, LATEST_TABLE, NUMERIC_COLUMNS, schema_is_typed
+
+# Колонки таблицы дашборда
+DASHBOARD_COLUMNS = (
+    'symbol', 'exchange', 'market_type', 'strike_price', 'expiry_date', 'last_price', 'volume_24h',
+    'price_usdt', 'high_price_24h', 'low_price_24h', 'trades_24h', 'timestamp',
+)
+
+# Биржа в фильтре дашборда -> названия, под которыми она хранится в базе
+EXCHANGE_ALIASES = {
+    'binance': ('Binance',),
+    'bybit': ('Bybit',),
+    'okx': ('OKX', 'OKEx'),
+    'okex': ('OKX', 'OKEx'),
+}
+
+
+def _like_pattern(value):
+    # Экранируем спецсимволы LIKE, чтобы поиск шел по подстроке буквально
+    escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+# Операторы filter_query таблицы Dash (filter_action='custom') -> SQL
+_FILTER_OPERATORS = {
+    '>=': '>=', 'ge': '>=',
+    '<=': '<=', 'le': '<=',
+    '<': '<', 'lt': '<',
+    '>': '>', 'gt': '>',
+    '!=': '!=', 'ne': '!=',
+    '=': '=', 'eq': '=',
+    'contains': 'contains',
+    'datestartswith': 'datestartswith',
+}
+_FILTER_CLAUSE = re.compile(
+    r'^\{(?P<column>[^}]+)\}\s+(?P<case>[is]?)(?P<operator>>=|<=|!=|<|>|=|ge|le|lt|gt|ne|eq|contains|datestartswith)'
+    r'\s*(?P<value>.*)$'
+)
+
+
+def _unquote(value):
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'`':
+        quote = value[0]
+        return value[1:-1].replace('\\' + quote, quote)
+    return value
+
+
+def parse_filter_query(filter_query, columns=DASHBOARD_COLUMNS):
+    """
+    разбирает filter_query таблицы Dash ('{last_price} > 100 && {symbol} contains BTC')
+    Колонки вне columns и непонятные условия пропускаются.
+    :return: список (колонка, оператор SQL или 'contains'/'datestartswith', без учета регистра, значение)
+    """
+    conditions = []
+    for clause in (filter_query or '').split(' && '):
+        clause = clause.strip()
+        if not clause:
+            continue
+        match = _FILTER_CLAUSE.match(clause)
+        if not match or match['column'] not in columns:
+            logging.warning(f"Условие фильтра таблицы не распознано: {clause}")
+            continue
+        column, value = match['column'], _unquote(match['value'])
+        operator = _FILTER_OPERATORS[match['operator']]
+        if column in NUMERIC_COLUMNS and operator not in ('contains', 'datestartswith'):
+            try:
+                value = float(value)
+            except ValueError:
+                logging.warning(f"Условие фильтра таблицы не распознано: {clause}")
+                continue
+        conditions.append((column, operator, match['case'] == 'i', value))
+    return conditions
+
+
+def _column_expr(column, typed):
+    # В немигрированной базе числа хранятся как TEXT: сравниваем и сортируем их как числа
+    return column if typed or column not in NUMERIC_COLUMNS else f"CAST({column} AS REAL)"
+
+
+def _condition_sql(column, operator, insensitive, value, typed):
+    expr = _column_expr(column, typed)
+    if operator == 'contains':
+        if insensitive:
+            return f"{column} LIKE ? ESCAPE '\\'", _like_pattern(str(value))
+        return f"instr({column}, ?) > 0", str(value)
+    if operator == 'datestartswith':
+        return f"{column} LIKE ? ESCAPE '\\'", _like_pattern(str(value))[1:]
+    if insensitive and isinstance(value, str):
+        return f"{expr} {operator} ? COLLATE NOCASE", value
+    return f"{expr} {operator} ?", value
+
+
+def order_clause(sort_by, columns=DASHBOARD_COLUMNS, typed=True):
+    """
+    ORDER BY по sort_by таблицы Dash ([{'column_id': 'last_price', 'direction': 'desc'}, ...])
+    """
+    terms = [f"{_column_expr(item['column_id'], typed)} {'DESC' if item.get('direction') == 'desc' else 'ASC'}"
+             for item in sort_by or [] if item.get('column_id') in columns]
+    return " ORDER BY " + ", ".join(terms) if terms else ""
+
+
+def build_query(exchange=None, market_type=None, price=None, volume=None, search=None,
+                table='market_data', columns=DASHBOARD_COLUMNS, typed=True, conditions=(),
+                sort_by=None, limit=None, offset=None):
+    """
+    строит параметризованный запрос по фильтрам дашборда
+    Равенства по бирже, типу рынка и символу идут первыми, чтобы использовать индексы.
+    :param typed: False для немигрированной базы, где числа хранятся как TEXT
+    :param conditions: условия фильтра таблицы из parse_filter_query
+    :param sort_by: сортировка таблицы, см. order_clause
+    :param limit: размер страницы
+    :param offset: смещение страницы
+    :return: (sql, params)
+    """
+    sql, params = _where(exchange, market_type, price, volume, search, typed, conditions)
+    sql = f"SELECT {', '.join(columns)} FROM {table}" + sql + order_clause(sort_by, columns, typed)
+    if limit is not None:
+        sql += " LIMIT ? OFFSET ?"
+        params += [limit, offset or 0]
+    return sql, params
+
+
+def build_count_query(exchange=None, market_type=None, price=None, volume=None, search=None,
+                      table='market_data', typed=True, conditions=()):
+    """
+    запрос количества строк по тем же фильтрам, что и build_query
+    """
+    sql, params = _where(exchange, market_type, price, volume, search, typed, conditions)
+    return f"SELECT COUNT(*) FROM {table}" + sql, params
+
+
+def _where(exchange, market_type, price, volume, search, typed, conditions):
+    where, params = [], []
+    if exchange:
+        names = EXCHANGE_ALIASES.get(exchange.lower(), (exchange,))
+        where.append(f"exchange IN ({', '.join('?' for _ in names)})")
+        params.extend(names)
+    if market_type:
+        where.append("market_type = ?")
+        params.append(market_type.lower())
+    if price is not None:
+        where.append("last_price >= ?" if typed else "CAST(last_price AS REAL) >= ?")
+        params.append(price)
+    if volume is not None:
+        where.append("volume_24h >= ?" if typed else "CAST(volume_24h AS REAL) >= ?")
+        params.append(volume)
+    if search:
+        where.append("symbol LIKE ? ESCAPE '\\'")
+        params.append(_like_pattern(search))
+    for condition in conditions:
+        sql, value = _condition_sql(*condition, typed)
+        where.append(sql)
+        params.append(value)
+    return (" WHERE " + " AND ".join(where) if where else ""), params
+
+
+def connect(path=DB_PATH):
+    """
+    соединение только для чтения
+    """
+    return sqlite3.connect(f'file:{path}?mode=ro', uri=True, check_same_thread=False)
+
+
+def source_table(conn, history=False):
+    """
+    таблица для чтения: market_data_latest (по строке на инструмент) или вся история market_data
+    Пока сборщик не создал market_data_latest в старой базе, читается история.
+    """
+    if not history and conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (LATEST_TABLE,)).fetchone():
+        return LATEST_TABLE
+    return 'market_data'
+
+
+def _read(conn, history, filters):
+    # pandas грузится при первом запросе: дашборд поднимается без него
+    import pandas as pd
+
+    table = source_table(conn, history)
+    sql, params = build_query(table=table, typed=schema_is_typed(conn, table), **filters)
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+def query_market_data(conn=None, history=False, **filters):
+    """
+    строки таблицы дашборда по фильтрам build_query
+    :param conn: соединение sqlite3, по умолчанию открывается на время запроса
+    :param history: True - все снимки из market_data, False - последний снимок каждого инструмента
+    :return: DataFrame
+    """
+    if conn is not None:
+        return _read(conn, history, filters)
+    conn = connect()
+    try:
+        return _read(conn, history, filters)
+    finally:
+        conn.close()
+
+
+def _read_page(conn, history, page, page_size, sort_by, filter_query, filters):
+    import pandas as pd
+
+    table = source_table(conn, history)
+    typed = schema_is_typed(conn, table)
+    conditions = parse_filter_query(filter_query)
+    sql, params = build_count_query(table=table, typed=typed, conditions=conditions, **filters)
+    total = conn.execute(sql, params).fetchone()[0]
+    sql, params = build_query(table=table, typed=typed, conditions=conditions, sort_by=sort_by,
+                              limit=page_size, offset=page * page_size, **filters)
+    return pd.read_sql_query(sql, conn, params=params), total
+
+
+def query_page(conn=None, page=0, page_size=20, sort_by=None, filter_query='', history=False, **filters):
+    """
+    одна страница таблицы дашборда: фильтры, filter_query и sort_by таблицы Dash выполняются в SQL
+    :param page: номер страницы с нуля (page_current)
+    :param page_size: строк на странице
+    :param sort_by: sort_by таблицы Dash
+    :param filter_query: filter_query таблицы Dash
+    :param history: True - все снимки из market_data, False - последний снимок каждого инструмента
+    :param filters: фильтры build_query (exchange, market_type, price, volume, search)
+    :return: (DataFrame страницы, всего строк по фильтрам)
+    """
+    if conn is not None:
+        return _read_page(conn, history, page, page_size, sort_by, filter_query, filters)
+    conn = connect()
+    try:
+        return _read_page(conn, history, page, page_size, sort_by, filter_query, filters)
+    finally:
+        conn.close()
+
+
+# Сколько разных запросов держит кэш результатов
+CACHE_SIZE = 256
+
+
+def _freeze(value):
+    # Параметры запроса -> хешируемый ключ; пустая строка равна отсутствию фильтра
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, dict):
+        items = ((k, _freeze(v)) for k, v in value.items())
+        return tuple(sorted(item for item in items if item[1] is not None))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value) or None
+    return value
+
+
+class QueryCache:
+    """
+    общий кэш результатов запросов дашборда с вытеснением давно не использованных (LRU)
+    Кэш сбрасывается, когда меняется PRAGMA data_version его соединения, то есть после
+    любого коммита в базу из другого соединения (сборщиков данных). Пока записей не было,
+    повторные запросы с теми же параметрами из любых сессий браузера не обращаются к базе.
+    Возвращаемые DataFrame общие для всех вызовов - изменять их нельзя.
+    :param path: путь к файлу базы
+    :param max_entries: максимум запросов в кэше
+    """
+
+    def __init__(self, path=DB_PATH, max_entries=CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self._conn = None
+        self._lock = threading.Lock()
+        # Запросы при промахе идут через соединение своего потока, без общей блокировки
+        self._local = threading.local()
+        self._readers = []
+        self._entries = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _current_version(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+        return self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+            with self._lock:
+                self._readers.append(conn)
+        return conn
+
+    def _cached(self, key, read):
+        with self._lock:
+            version = self._current_version()
+            if version != self._version:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._version = version
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Чтение начинается после проверки версии, поэтому не старее ее
+        result = read(self._reader())
+        with self._lock:
+            # Пока шел запрос, кэш мог сброситься новой записью: результат тогда не сохраняем
+            if self._version == version:
+                self._entries[key] = result
+                self._entries.move_to_end(key)
+                if len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return result
+
+    def query_page(self, page=0, page_size=20, sort_by=None, filter_query='', history=False, **filters):
+        """
+        db_queries.query_page через кэш
+        """
+        key = ('page', page, page_size, _freeze(sort_by), _freeze(filter_query), bool(history), _freeze(filters))
+        return self._cached(key, lambda conn: _read_page(conn, history, page, page_size, sort_by, filter_query,
+                                                         filters))
+
+    def query_market_data(self, history=False, **filters):
+        """
+        db_queries.query_market_data через кэш
+        """
+        key = ('rows', bool(history), _freeze(filters))
+        return self._cached(key, lambda conn: _read(conn, history, filters))
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._local = threading.local()
+            self._entries.clear()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache(path=DB_PATH):
+    """
+    общий кэш запросов процесса для указанного файла базы
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None or _cache.path != path:
+            if _cache is not None:
+                _cache.close()
+            _cache = QueryCache(path)
+        return _cache
+
+
+def explain(conn, sql, params=()):
+    """
+    план запроса (EXPLAIN QUERY PLAN) в виде списка строк
+    """
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+# Комбинации фильтров, для которых план обязан идти по индексам
+INDEXED_FILTERS = [
+    {'exchange': 'Binance'},
+    {'exchange': 'OKX', 'market_type': 'spot'},
+    {'exchange': 'Bybit', 'market_type': 'futures', 'price': 1, 'volume': 1},
+    {'market_type': 'options'},
+    {'exchange': 'Binance', 'market_type': 'spot', 'search': 'BTC'},
+]
+
+
+def check_plans(conn):
+    """
+    проверяет, что запросы страницы и количества строк (как в query_page) с фильтрами из INDEXED_FILTERS
+    не сканируют таблицу целиком ни в истории market_data, ни в market_data_latest
+    Сканирование небольшого справочника instruments (псевдоним i в представлении) допустимо.
+    :return: список (таблица, фильтры, план) для запросов с полным сканированием
+    """
+    failures = []
+    for table in dict.fromkeys((source_table(conn, history=False), source_table(conn, history=True))):
+        typed = schema_is_typed(conn, table)
+        for filters in INDEXED_FILTERS:
+            for sql, params in (build_count_query(table=table, typed=typed, **filters),
+                                build_query(table=table, typed=typed, limit=20, offset=0, **filters)):
+                plan = explain(conn, sql, params)
+                if any(step.startswith('SCAN') and step != 'SCAN i' for step in plan):
+                    failures.append((table, filters, plan))
+    return failures
+
+
+if __name__ == "__main__":
+    # python db_queries.py [путь к базе] - печатает планы и завершается с кодом 1 при полном сканировании
+    conn = connect(sys.argv[1] if len(sys.argv) > 1 else DB_PATH)
+    failures = check_plans(conn)
+    conn.close()
+    for table, filters, plan in failures:
+        print(table, filters)
+        for step in plan:
+            print('   ', step)
+    if failures:
+        print(f"Полное сканирование в {len(failures)} запросах")
+        sys.exit(1)
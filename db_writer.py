@@ -0,0 +1,412 @@
+import os
+import sqlite3
+import logging
+import threading
+from decimal import Decimal
+
+from change_filter import ChangeFilter, write_ratio
+
+DB_PATH = 'market_data.db'
+
+# Колонки, которые заполняют сборщики данных (id и timestamp проставляет база)
+MARKET_DATA_COLUMNS = (
+    'symbol', 'exchange', 'market_type', 'last_price', 'volume_24h', 'options', 'price_usdt',
+    'high_price_24h', 'low_price_24h', 'trades_24h', 'strike_price', 'option_type', 'expiry_date',
+    'exercise_price',
+)
+
+INSERT_MARKET_DATA = (
+    f"INSERT INTO market_data ({', '.join(MARKET_DATA_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in MARKET_DATA_COLUMNS)})"
+)
+
+
+# Типы числовых колонок market_data
+NUMERIC_COLUMNS = {
+    'last_price': 'REAL',
+    'volume_24h': 'REAL',
+    'price_usdt': 'REAL',
+    'high_price_24h': 'REAL',
+    'low_price_24h': 'REAL',
+    'trades_24h': 'INTEGER',
+    'strike_price': 'REAL',
+    'exercise_price': 'REAL',
+}
+
+# Колонки, которые нужно хранить точной десятичной строкой (TEXT) вместо REAL,
+# например {'last_price'} для инструментов с ценой меньше 1e-8
+EXACT_DECIMAL_COLUMNS = set()
+
+
+def column_type(column):
+    """
+    тип колонки в схеме с учетом EXACT_DECIMAL_COLUMNS
+    """
+    if column in EXACT_DECIMAL_COLUMNS:
+        return 'TEXT'
+    return NUMERIC_COLUMNS.get(column, 'TEXT')
+
+
+def _to_real(value):
+    if value is None or value == '':
+        return None
+    return float(value)
+
+
+def _to_integer(value):
+    if value is None or value == '':
+        return None
+    value = int(Decimal(str(value)).to_integral_value())
+    # Значения вне диапазона INTEGER SQLite (например, trades_24h при цене около нуля) храним как REAL
+    return value if -2 ** 63 <= value < 2 ** 63 else float(value)
+
+
+def _to_decimal_text(value):
+    if value is None or value == '':
+        return None
+    if not isinstance(value, Decimal):
+        value = Decimal(str(value))
+    # Форматируем числа без научной нотации
+    return format(value, 'f')
+
+
+def _converter(column):
+    if column not in NUMERIC_COLUMNS:
+        return None
+    kind = column_type(column)
+    if kind == 'REAL':
+        return _to_real
+    if kind == 'INTEGER':
+        return _to_integer
+    return _to_decimal_text
+
+
+_CONVERTERS = [_converter(column) for column in MARKET_DATA_COLUMNS]
+
+
+def adapt_row(row):
+    """
+    приводит значения строки к типам колонок market_data
+    Числа можно передавать как Decimal, float, int или строку.
+    :param row: кортеж в порядке MARKET_DATA_COLUMNS
+    :return: кортеж для INSERT_MARKET_DATA
+    """
+    return tuple(value if convert is None else convert(value) for value, convert in zip(row, _CONVERTERS))
+
+
+# Статические атрибуты инструмента, хранятся один раз в таблице instruments
+INSTRUMENT_COLUMNS = ('exchange', 'market_type', 'symbol', 'strike_price', 'option_type', 'expiry_date')
+
+# Изменяющиеся поля снимка, хранятся в snapshots вместе с id инструмента
+SNAPSHOT_COLUMNS = ('last_price', 'volume_24h', 'price_usdt', 'high_price_24h', 'low_price_24h', 'trades_24h',
+                    'exercise_price')
+
+_INSTRUMENT_INDEXES = [MARKET_DATA_COLUMNS.index(c) for c in INSTRUMENT_COLUMNS]
+_KEY_INDEXES = [MARKET_DATA_COLUMNS.index(c) for c in ('exchange', 'market_type', 'symbol')]
+_SNAPSHOT_INDEXES = [MARKET_DATA_COLUMNS.index(c) for c in SNAPSHOT_COLUMNS]
+
+INSERT_INSTRUMENT = (
+    f"INSERT OR IGNORE INTO instruments ({', '.join(INSTRUMENT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in INSTRUMENT_COLUMNS)})"
+)
+SELECT_INSTRUMENT_ID = "SELECT id FROM instruments WHERE exchange = ? AND market_type = ? AND symbol = ?"
+INSERT_SNAPSHOT = (
+    f"INSERT INTO snapshots (instrument_id, {', '.join(SNAPSHOT_COLUMNS)}) "
+    f"VALUES (?, {', '.join('?' for _ in SNAPSHOT_COLUMNS)})"
+)
+
+# Последний снимок каждого инструмента: одна строка на (биржа, тип рынка, символ),
+# обновляется в той же транзакции, что и запись истории
+LATEST_TABLE = 'market_data_latest'
+_LATEST_KEY = ('exchange', 'market_type', 'symbol')
+
+LATEST_DDL = [
+    f'''
+    CREATE TABLE IF NOT EXISTS {LATEST_TABLE} (
+        {', '.join(f'{c} {column_type(c)}' for c in MARKET_DATA_COLUMNS)},
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY ({', '.join(_LATEST_KEY)})
+    )
+    ''',
+    f'CREATE INDEX IF NOT EXISTS {LATEST_TABLE}_market_type ON {LATEST_TABLE} (market_type, exchange)',
+]
+
+UPSERT_LATEST = (
+    f"INSERT INTO {LATEST_TABLE} ({', '.join(MARKET_DATA_COLUMNS)}, timestamp) "
+    f"VALUES ({', '.join('?' for _ in MARKET_DATA_COLUMNS)}, CURRENT_TIMESTAMP) "
+    f"ON CONFLICT ({', '.join(_LATEST_KEY)}) DO UPDATE SET "
+    + ', '.join(f'{c} = excluded.{c}' for c in MARKET_DATA_COLUMNS + ('timestamp',) if c not in _LATEST_KEY)
+)
+
+
+def fill_latest(conn, source='market_data'):
+    """
+    заполняет market_data_latest последними строками истории (для базы, где таблицы еще не было)
+    Уже записанные в market_data_latest инструменты не трогает.
+    :param conn: соединение sqlite3
+    :param source: таблица или представление с историей в формате market_data
+    :return: количество добавленных строк
+    """
+    columns = ', '.join(MARKET_DATA_COLUMNS + ('timestamp',))
+    cursor = conn.execute(
+        f"INSERT INTO {LATEST_TABLE} ({columns}) "
+        f"SELECT {columns} FROM {source} "
+        f"WHERE id IN (SELECT MAX(id) FROM {source} GROUP BY {', '.join(_LATEST_KEY)}) "
+        f"ON CONFLICT ({', '.join(_LATEST_KEY)}) DO NOTHING"
+    )
+    return cursor.rowcount
+
+
+def schema_ddl():
+    """
+    DDL нормализованной схемы: справочник инструментов, таблица снимков,
+    представление market_data с прежним набором колонок для чтения и таблица market_data_latest
+    """
+    return [
+        '''
+        CREATE TABLE IF NOT EXISTS instruments (
+            id INTEGER PRIMARY KEY,
+            exchange TEXT NOT NULL,
+            market_type TEXT NOT NULL,  -- 'spot', 'futures' или 'options'
+            symbol TEXT NOT NULL,
+            strike_price {strike_price},
+            option_type TEXT,  -- 'Call' или 'Put'
+            expiry_date TEXT,
+            UNIQUE (exchange, market_type, symbol)
+        )
+        '''.format(strike_price=column_type('strike_price')),
+        f'''
+        CREATE TABLE IF NOT EXISTS snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            instrument_id INTEGER NOT NULL REFERENCES instruments (id),
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            {', '.join(f'{c} {column_type(c)}' for c in SNAPSHOT_COLUMNS)}
+        )
+        ''',
+        '''
+        CREATE VIEW IF NOT EXISTS market_data AS
+        SELECT s.id, i.symbol, i.exchange, i.market_type, s.last_price, s.volume_24h, i.symbol AS options,
+               s.price_usdt, s.high_price_24h, s.low_price_24h, s.trades_24h, i.strike_price, i.option_type,
+               i.expiry_date, s.exercise_price, s.timestamp
+        FROM snapshots s
+        JOIN instruments i ON i.id = s.instrument_id
+        ''',
+        # Фильтры дашборда по бирже/рынку/символу идут по UNIQUE-индексу instruments,
+        # снимки инструмента и их время - по индексу (instrument_id, timestamp)
+        'CREATE INDEX IF NOT EXISTS instruments_market_type ON instruments (market_type, exchange)',
+        'CREATE INDEX IF NOT EXISTS snapshots_instrument_ts ON snapshots (instrument_id, timestamp)',
+    ] + LATEST_DDL
+
+
+# Индекс для старой плоской таблицы market_data, пока она не мигрирована
+LEGACY_INDEX_DDL = (
+    'CREATE INDEX IF NOT EXISTS market_data_exchange_type_symbol_ts '
+    'ON market_data (exchange, market_type, symbol, timestamp)'
+)
+
+
+def is_legacy(conn):
+    """
+    True, если market_data - старая плоская таблица (до нормализации)
+    """
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'market_data'").fetchone()
+    return row is not None and row[0] == 'table'
+
+
+def schema_is_typed(conn, table='market_data'):
+    """
+    проверяет, что числовые колонки таблицы уже имеют типы из NUMERIC_COLUMNS
+    """
+    declared = {row[1]: row[2].upper() for row in conn.execute(f'PRAGMA table_info({table})')}
+    return all(declared.get(column) == column_type(column) for column in NUMERIC_COLUMNS)
+
+
+def create_schema(conn):
+    """
+    создает таблицы instruments, snapshots, market_data_latest и представление market_data, если их еще нет
+    Для старой базы с плоской таблицей market_data только добавляет составной индекс и market_data_latest,
+    нужна миграция. Новая market_data_latest сразу заполняется последними строками истории.
+    :param conn: соединение sqlite3
+    """
+    latest_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (LATEST_TABLE,)).fetchone()
+    if is_legacy(conn):
+        logging.warning("market_data - старая плоская таблица, выполните миграцию: python migrate_db.py")
+        for ddl in [LEGACY_INDEX_DDL] + LATEST_DDL:
+            conn.execute(ddl)
+    else:
+        for ddl in schema_ddl():
+            conn.execute(ddl)
+    if not latest_exists:
+        count = fill_latest(conn)
+        if count:
+            logging.info(f"{LATEST_TABLE} заполнена последними снимками {count} инструментов.")
+
+
+def connect(path=DB_PATH):
+    """
+    открывает соединение для записи с журналом WAL
+    :param path: путь к файлу базы
+    :return: соединение sqlite3
+    """
+    # isolation_level=None - транзакциями управляем сами через BEGIN/COMMIT
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    # В режиме WAL NORMAL не теряет целостность, но не делает fsync на каждый коммит
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+class BulkWriter:
+    """
+    пакетная запись снимков через одно долгоживущее соединение
+    Каждый вызов write/write_batches - одна транзакция с executemany.
+    id инструментов кэшируются в памяти, запрос к instruments нужен только для новых символов.
+    Строки, не изменившиеся с прошлой записи, отбрасывает ChangeFilter (кроме периодических опорных).
+    Записанные строки после коммита дописываются в колоночное хранилище истории history_store
+    и, если задан sink, передаются в него (например, clickhouse_sink.ClickHouseSink).
+    """
+
+    def __init__(self, path=DB_PATH, change_filter=True, history=True, sink=None):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+        self.legacy = False
+        # (exchange, market_type, symbol) -> instruments.id
+        self._instrument_ids = {}
+        # Запись только изменившихся строк; False - писать каждый снимок целиком
+        self.change_filter = None
+        if change_filter:
+            self.change_filter = ChangeFilter(_KEY_INDEXES, _SNAPSHOT_INDEXES)
+        self.received = 0
+        self.written = 0
+        # Хранилище истории рядом с файлом базы; False - не вести
+        self.history = None
+        if history:
+            # history_store тянет numpy: импорт только у писателя, не у читателей констант (db_queries)
+            from history_store import HISTORY_DIR, HistoryStore
+            self.history = HistoryStore(os.path.join(os.path.dirname(path), HISTORY_DIR), MARKET_DATA_COLUMNS)
+        self.sink = sink
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = connect(self.path)
+            create_schema(self._conn)
+            self.legacy = is_legacy(self._conn)
+            if not self.legacy:
+                self._instrument_ids = {
+                    (exchange, market_type, symbol): instrument_id
+                    for instrument_id, exchange, market_type, symbol
+                    in self._conn.execute('SELECT id, exchange, market_type, symbol FROM instruments')
+                }
+        return self._conn
+
+    def _instrument_id(self, conn, row, created):
+        key = (row[1], row[2], row[0])
+        instrument_id = self._instrument_ids.get(key)
+        if instrument_id is None:
+            conn.execute(INSERT_INSTRUMENT, [row[i] for i in _INSTRUMENT_INDEXES])
+            instrument_id = conn.execute(SELECT_INSTRUMENT_ID, key).fetchone()[0]
+            self._instrument_ids[key] = instrument_id
+            created.append(key)
+        return instrument_id
+
+    def _snapshot_rows(self, conn, rows, created):
+        return [(self._instrument_id(conn, row, created),) + tuple(row[i] for i in _SNAPSHOT_INDEXES)
+                for row in rows]
+
+    def write(self, rows):
+        """
+        записывает одну пачку строк одной транзакцией
+        :param rows: список кортежей в порядке MARKET_DATA_COLUMNS
+        :return: количество записанных строк
+        """
+        return self.write_batches([rows])
+
+    def write_batches(self, batches):
+        """
+        записывает несколько пачек (например, весь цикл опроса) одним коммитом
+        :param batches: список списков кортежей в порядке MARKET_DATA_COLUMNS
+        :return: количество записанных строк
+        """
+        total = received = 0
+        with self._lock:
+            conn = self.conn
+            created = []
+            updates = {}
+            written = []
+            try:
+                conn.execute('BEGIN')
+                for rows in batches:
+                    received += len(rows)
+                    if self.change_filter is not None:
+                        rows, batch_updates = self.change_filter.select(rows)
+                        updates.update(batch_updates)
+                    if not rows:
+                        continue
+                    if self.legacy:
+                        conn.executemany(INSERT_MARKET_DATA, rows)
+                    else:
+                        conn.executemany(INSERT_SNAPSHOT, self._snapshot_rows(conn, rows, created))
+                    # Строки, отсеянные фильтром изменений, совпадают с уже записанными в market_data_latest
+                    conn.executemany(UPSERT_LATEST, rows)
+                    written.extend(rows)
+                    total += len(rows)
+                conn.execute('COMMIT')
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                # Инструменты, созданные в откаченной транзакции, убираем из кэша
+                for key in created:
+                    self._instrument_ids.pop(key, None)
+                raise
+            if self.change_filter is not None:
+                self.change_filter.commit(updates)
+            self.received += received
+            self.written += total
+            if self.history is not None:
+                # База - основной источник данных: ошибка хранилища истории не отменяет записанное
+                try:
+                    self.history.append(written)
+                except (OSError, ValueError) as e:
+                    logging.error(f"Ошибка записи в хранилище истории {self.history.root}: {e}")
+            if self.sink is not None:
+                self.sink.add(written)
+        if self.change_filter is not None and received:
+            logging.info(f"Записано {total} из {received} строк, коэффициент записи {write_ratio(total, received):.1%} "
+                         f"(всего {write_ratio(self.written, self.received):.1%}).")
+        return total
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def _get_sink():
+    # clickhouse_sink и драйвер импортируются только при включенном CLICKHOUSE_ENABLED:
+    # модули, которым нужны лишь константы db_writer (дашборд через db_queries), их не загружают
+    from Alex import env
+    if not getattr(env, 'CLICKHOUSE_ENABLED', False):
+        return None
+    from clickhouse_sink import get_sink
+    return get_sink(MARKET_DATA_COLUMNS)
+
+
+def get_writer(path=DB_PATH):
+    """
+    общий писатель процесса для указанного файла базы
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.path != path:
+            if _writer is not None:
+                _writer.close()
+            _writer = BulkWriter(path, sink=_get_sink())
+        return _writer
+
@@ -0,0 +1,167 @@
+import re
+
+import numpy as np
+import http_client
+
+BINANCE_KLINES_URL = 'https://api.binance.com/api/v3/klines'
+BINANCE_FUTURES_KLINES_URL = 'https://fapi.binance.com/fapi/v1/klines'
+BYBIT_KLINES_URL = 'https://api.bybit.com/v5/market/kline'
+OKX_CANDLES_URL = 'https://www.okx.com/api/v5/market/candles'
+
+# Котируемые валюты для перевода символа между форматами BTCUSDT и BTC-USDT, длинные проверяются первыми
+QUOTE_ASSETS = ('FDUSD', 'USDT', 'USDC', 'TUSD', 'BUSD', 'USD', 'BTC', 'ETH', 'BNB', 'EUR', 'TRY', 'DAI')
+
+# Свечей за запрос: последние 2 часа минутных свечей
+KLINE_LIMIT = 120
+# Колонки массива свечей: время открытия (мс UTC), open, high, low, close, volume
+KLINE_FIELDS = ('open_time', 'open', 'high', 'low', 'close', 'volume')
+# Длительность интервала в мс и его обозначение у Bybit и OKX
+INTERVAL_MS = {'1m': 60000, '5m': 300000, '15m': 900000, '1h': 3600000, '4h': 14400000, '1d': 86400000}
+BYBIT_INTERVALS = {'1m': '1', '5m': '5', '15m': '15', '1h': '60', '4h': '240', '1d': 'D'}
+OKX_BARS = {'1m': '1m', '5m': '5m', '15m': '15m', '1h': '1H', '4h': '4H', '1d': '1D'}
+# Инверсные контракты Bybit: бессрочные BTCUSD и срочные BTCUSDH25 (месяц и год экспирации)
+BYBIT_INVERSE = re.compile(r'USD([FGHJKMNQUVXZ]\d{2})?$')
+
+
+def venue_symbol(exchange, symbol, market_type='spot'):
+    """
+    символ в формате биржи: у OKX базовая и котируемая валюты через дефис (BTC-USDT), у Binance и Bybit слитно
+    Символы с датой или типом контракта (BTC-USDT-SWAP, BTC-27DEC24) передаются как есть; пара без типа
+    контракта на фьючерсах OKX - бессрочный SWAP.
+    :param exchange: биржа ('Binance', 'Bybit', 'OKX')
+    :param symbol: символ в формате любой из бирж
+    :param market_type: тип рынка ('spot', 'futures')
+    """
+    if exchange in ('OKX', 'OKEx'):
+        if '-' not in symbol:
+            for quote in QUOTE_ASSETS:
+                if symbol.endswith(quote) and len(symbol) > len(quote):
+                    symbol = f'{symbol[:-len(quote)]}-{quote}'
+                    break
+        if market_type == 'futures' and symbol.count('-') == 1:
+            return f'{symbol}-SWAP'
+        return symbol
+    parts = symbol.split('-')
+    if len(parts) > 1 and parts[1] in QUOTE_ASSETS:
+        return parts[0] + parts[1]
+    return symbol
+
+
+def bybit_category(market_type, symbol):
+    """
+    категория Bybit v5 для типа рынка и символа: spot, linear (USDT/USDC) или inverse (расчеты в монете)
+    """
+    if market_type != 'futures':
+        return 'spot'
+    return 'inverse' if BYBIT_INVERSE.search(symbol) else 'linear'
+
+
+def _klines(rows):
+    # Первые шесть полей свечи у всех бирж совпадают с KLINE_FIELDS; сортировка по времени открытия
+    if not rows:
+        return np.empty((0, len(KLINE_FIELDS)))
+    klines = np.array([row[:len(KLINE_FIELDS)] for row in rows], dtype=float)
+    return klines[np.argsort(klines[:, 0], kind='stable')]
+
+
+# Функции для получения свечей с различных бирж (Binance, Bybit, OKX)
+# start - время открытия (мс UTC), начиная с которого нужны свечи; None - последние limit свечей
+# market_type - 'spot' или 'futures' (у OKX тип задан самим instId)
+def get_klines_binance(symbol, interval='1m', start=None, limit=KLINE_LIMIT, market_type='spot'):
+    params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+    if start is not None:
+        params['startTime'] = int(start)
+    url = BINANCE_FUTURES_KLINES_URL if market_type == 'futures' else BINANCE_KLINES_URL
+    data = http_client.get(url, params=params).json()
+    if not isinstance(data, list):
+        return _klines([])  # Ответ с ошибкой - свечей нет
+    return _klines(data)
+
+
+def get_klines_bybit(symbol, interval='1m', start=None, limit=KLINE_LIMIT, market_type='spot'):
+    params = {'category': bybit_category(market_type, symbol), 'symbol': symbol,
+              'interval': BYBIT_INTERVALS[interval], 'limit': limit}
+    if start is not None:
+        params['start'] = int(start)
+    data = http_client.get(BYBIT_KLINES_URL, params=params).json()
+    if data.get('retCode') != 0:
+        return _klines([])
+    return _klines(data['result']['list'])
+
+
+def get_klines_okx(symbol, interval='1m', start=None, limit=KLINE_LIMIT, market_type='spot'):
+    params = {'instId': symbol, 'bar': OKX_BARS[interval], 'limit': limit}
+    if start is not None:
+        # before возвращает свечи строго новее указанного времени
+        params['before'] = int(start) - 1
+    data = http_client.get(OKX_CANDLES_URL, params=params).json()
+    if data.get('code') != '0':
+        return _klines([])
+    return _klines(data['data'])
+
+
+KLINE_FETCHERS = {
+    'Binance': get_klines_binance,
+    'Bybit': get_klines_bybit,
+    'OKX': get_klines_okx,
+    'OKEx': get_klines_okx,
+}
+
+BINANCE_DEPTH_URL = 'https://api.binance.com/api/v3/depth'
+BINANCE_FUTURES_DEPTH_URL = 'https://fapi.binance.com/fapi/v1/depth'
+BYBIT_ORDER_BOOK_URL = 'https://api.bybit.com/v5/market/orderbook'
+OKX_BOOKS_URL = 'https://www.okx.com/api/v5/market/books'
+
+# Уровней на сторону в снимке стакана
+ORDER_BOOK_LIMIT = 100
+# Допустимые limit стакана фьючерсов Binance и наибольший limit Bybit по категориям
+BINANCE_FUTURES_DEPTH_LIMITS = (5, 10, 20, 50, 100, 500, 1000)
+BYBIT_ORDER_BOOK_LIMITS = {'spot': 200, 'linear': 500, 'inverse': 500}
+
+
+def _book_side(rows):
+    # Уровень стакана: цена и количество (у OKX дальше идут служебные поля)
+    if not rows:
+        return np.empty((0, 2))
+    return np.array([row[:2] for row in rows], dtype=float)
+
+
+# Функции для получения снимков стакана с различных бирж (Binance, Bybit, OKX)
+# Возвращают (bids, asks, sequence): массивы (n, 2) цена, количество и номер обновления снимка
+# (None, если биржа его не отдает) - с него локальный стакан order_book_engine применяет диффы
+def get_order_book_binance(symbol, limit=ORDER_BOOK_LIMIT, market_type='spot'):
+    url = BINANCE_DEPTH_URL
+    if market_type == 'futures':
+        url = BINANCE_FUTURES_DEPTH_URL
+        limit = min((n for n in BINANCE_FUTURES_DEPTH_LIMITS if n >= limit), default=BINANCE_FUTURES_DEPTH_LIMITS[-1])
+    data = http_client.get(url, params={'symbol': symbol, 'limit': limit}).json()
+    if 'bids' not in data or 'asks' not in data:
+        return _book_side([]), _book_side([]), None
+    return _book_side(data['bids']), _book_side(data['asks']), data.get('lastUpdateId')
+
+
+def get_order_book_bybit(symbol, limit=ORDER_BOOK_LIMIT, market_type='spot'):
+    # v2 orderBook/L2 отключен, стакан - v5 market/orderbook (до 200 уровней у спота, до 500 у фьючерсов)
+    category = bybit_category(market_type, symbol)
+    params = {'category': category, 'symbol': symbol, 'limit': min(limit, BYBIT_ORDER_BOOK_LIMITS[category])}
+    data = http_client.get(BYBIT_ORDER_BOOK_URL, params=params).json()
+    if data.get('retCode') != 0:
+        return _book_side([]), _book_side([]), None
+    result = data['result']
+    return _book_side(result['b']), _book_side(result['a']), result.get('u')
+
+
+def get_order_book_okx(symbol, limit=ORDER_BOOK_LIMIT, market_type='spot'):
+    data = http_client.get(OKX_BOOKS_URL, params={'instId': symbol, 'sz': limit}).json()
+    if data.get('code') != '0' or not data.get('data'):
+        return _book_side([]), _book_side([]), None
+    book = data['data'][0]
+    return _book_side(book['bids']), _book_side(book['asks']), book.get('seqId')
+
+
+ORDER_BOOK_FETCHERS = {
+    'Binance': get_order_book_binance,
+    'Bybit': get_order_book_bybit,
+    'OKX': get_order_book_okx,
+    'OKEx': get_order_book_okx,
+}
@@ -0,0 +1,121 @@
+import time
+import logging
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Таймауты по умолчанию для каждой биржи (секунды)
+VENUE_TIMEOUTS = {
+    'Binance': 15,
+    'Bybit': 15,
+    'OKX': 15,
+    'OKEx': 15,
+}
+DEFAULT_TIMEOUT = 20
+
+
+@dataclass
+class FetchTask:
+    """
+    задача на получение данных
+    :param exchange: биржа
+    :param market_type: тип рынка ('spot', 'futures', 'options')
+    :param fetcher: функция без аргументов, возвращающая список тикеров
+    :param timeout: таймаут задачи, по умолчанию берется из VENUE_TIMEOUTS
+    """
+    exchange: str
+    market_type: str
+    fetcher: object
+    timeout: float = None
+
+    def __post_init__(self):
+        if self.timeout is None:
+            self.timeout = VENUE_TIMEOUTS.get(self.exchange, DEFAULT_TIMEOUT)
+
+
+@dataclass
+class FetchResult:
+    """
+    результат выполнения задачи
+    error - None при успехе, иначе текст ошибки (в том числе 'timeout')
+    elapsed - время выполнения запроса в секундах
+    """
+    exchange: str
+    market_type: str
+    data: list = field(default_factory=list)
+    error: str = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _run_task(task):
+    # Замеряем время внутри потока, чтобы не учитывать ожидание в очереди пула
+    started = time.perf_counter()
+    data = task.fetcher()
+    return data, time.perf_counter() - started
+
+
+def fetch_all(tasks, max_workers=None):
+    """
+    параллельно выполняет все задачи и возвращает результаты в исходном порядке
+    Ошибка или таймаут одной биржи не влияет на остальные.
+    :param tasks: список FetchTask
+    :param max_workers: размер пула потоков, по умолчанию по числу задач
+    :return: список FetchResult
+    """
+    if not tasks:
+        return []
+
+    started = time.perf_counter()
+    results = [FetchResult(t.exchange, t.market_type) for t in tasks]
+    executor = ThreadPoolExecutor(max_workers=max_workers or len(tasks), thread_name_prefix='fetch')
+    futures = {executor.submit(_run_task, task): i for i, task in enumerate(tasks)}
+    deadlines = {i: started + task.timeout for i, task in enumerate(tasks)}
+    pending = set(futures)
+
+    try:
+        while pending:
+            now = time.perf_counter()
+            # Задачи, у которых истек собственный таймаут, помечаем и больше не ждем
+            for future in [f for f in pending if deadlines[futures[f]] <= now]:
+                i = futures[future]
+                future.cancel()
+                results[i].error = 'timeout'
+                results[i].elapsed = now - started
+                pending.discard(future)
+                logging.error(f"Таймаут запроса {tasks[i].exchange} ({tasks[i].market_type}) "
+                              f"после {tasks[i].timeout} с.")
+            if not pending:
+                break
+
+            next_deadline = min(deadlines[futures[f]] for f in pending)
+            done, pending = wait(pending, timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                i = futures[future]
+                try:
+                    results[i].data, results[i].elapsed = future.result()
+                except Exception as e:
+                    results[i].error = str(e) or e.__class__.__name__
+                    results[i].elapsed = time.perf_counter() - started
+                    logging.error(f"Ошибка получения данных {tasks[i].exchange} ({tasks[i].market_type}): {e}")
+    finally:
+        # Зависшие потоки не блокируют завершение цикла
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
+
+
+def log_timings(results, total=None):
+    """
+    выводит в лог время выполнения по каждой бирже
+    :param results: список FetchResult
+    :param total: общее время цикла
+    """
+    for r in sorted(results, key=lambda r: r.elapsed, reverse=True):
+        status = 'ok' if r.ok else r.error
+        logging.info(f"{r.exchange} ({r.market_type}): {r.elapsed:.3f} с, {len(r.data)} инструментов, {status}")
+    if total is not None and results:
+        slowest = max(r.elapsed for r in results)
+        logging.info(f"Цикл получения данных: {total:.3f} с (самый медленный запрос {slowest:.3f} с).")
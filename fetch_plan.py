@@ -0,0 +1,52 @@
+import logging
+from dataclasses import dataclass
+
+from fetch_engine import FetchTask
+
+
+@dataclass(frozen=True)
+class Endpoint:
+    """
+    один эндпоинт тикеров биржи
+    :param exchange: биржа
+    :param market_type: тип рынка, под которым сохраняются строки этого эндпоинта
+    :param fetch: функция без аргументов, возвращающая список тикеров
+    """
+    exchange: str
+    market_type: str
+    fetch: object
+
+
+def _fetch_group(endpoints):
+    def fetch():
+        data = []
+        for endpoint in endpoints:
+            data.extend(endpoint.fetch())
+        return data
+    return fetch
+
+
+def build_plan(endpoints, requested):
+    """
+    строит план цикла опроса: каждый эндпоинт запрашивается один раз,
+    эндпоинты одной биржи и одного типа рынка объединяются в одну задачу
+    :param endpoints: словарь {ключ: Endpoint}
+    :param requested: списки ключей эндпоинтов, которые нужны потребителям (могут пересекаться)
+    :return: список FetchTask для fetch_engine.fetch_all
+    """
+    unique = []
+    total = 0
+    for keys in requested:
+        total += len(keys)
+        for key in keys:
+            if key not in unique:
+                unique.append(key)
+
+    groups = {}
+    for key in unique:
+        endpoint = endpoints[key]
+        groups.setdefault((endpoint.exchange, endpoint.market_type), []).append(endpoint)
+
+    if total > len(unique):
+        logging.info(f"План опроса: {len(unique)} уникальных эндпоинтов вместо {total}.")
+    return [FetchTask(exchange, market_type, _fetch_group(group)) for (exchange, market_type), group in groups.items()]
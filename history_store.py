@@ -0,0 +1,315 @@
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+
+HISTORY_DIR = 'market_history'
+
+# Поля хранилища и их типы: время снимка (мс UTC), номер инструмента и числовые поля market_data
+KEY_COLUMNS = ('exchange', 'market_type', 'symbol')
+VALUE_FIELDS = ('last_price', 'volume_24h', 'price_usdt', 'high_price_24h', 'low_price_24h', 'trades_24h')
+DTYPES = {
+    'ts': np.dtype('<i8'),
+    'instrument': np.dtype('<i4'),
+    **{field: np.dtype('<f8') for field in VALUE_FIELDS},
+}
+
+_DAY_MS = 24 * 3600 * 1000
+_INSTRUMENTS_FILE = 'instruments.json'
+_LOCK_FILE = '.lock'
+# Блокировка старше этого срока (секунды) осталась от упавшего процесса
+LOCK_STALE = 30
+# Последний файл, записываемый при запечатывании сегмента: его наличие означает, что сегмент готов
+_SEALED_MARKER = 'bounds.npy'
+
+
+def _day_name(day):
+    return time.strftime('%Y-%m-%d', time.gmtime(day * 86400))
+
+
+class _FileLock:
+    # Межпроцессная блокировка через атомарное создание файла: Main.py и binance_module.py
+    # могут дописывать в одно хранилище одновременно. Пока блокировка взята, фоновый поток обновляет
+    # время изменения файла: долгая операция под ней (запечатывание большого сегмента) не выглядит
+    # как блокировка упавшего процесса
+    def __init__(self, path):
+        self.path = path
+        self._released = threading.Event()
+        self._heartbeat = None
+
+    def _touch(self):
+        while not self._released.wait(LOCK_STALE / 3):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        while True:
+            try:
+                os.close(os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+                break
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(self.path) > LOCK_STALE:
+                        os.remove(self.path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                time.sleep(0.01)
+        self._released.clear()
+        self._heartbeat = threading.Thread(target=self._touch, name='history-lock', daemon=True)
+        self._heartbeat.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._released.set()
+        self._heartbeat.join()
+        os.remove(self.path)
+
+
+class HistoryStore:
+    """
+    колоночное хранилище истории цен: по файлу фиксированной ширины на поле, сегменты по дням (UTC)
+    Текущий день дописывается в конец файлов <поле>.bin. Прошедший день запечатывается: поля
+    пересортировываются по (инструмент, время) в <поле>.npy, и ряд одного инструмента становится
+    непрерывным срезом memory-mapped массива без копирования.
+    :param root: каталог хранилища
+    :param row_columns: порядок колонок в строках для append (db_writer.MARKET_DATA_COLUMNS);
+                        не нужен, если хранилище только читается
+    """
+
+    def __init__(self, root=HISTORY_DIR, row_columns=None):
+        self.root = root
+        self._lock = threading.Lock()
+        self._instruments = None
+        self._instrument_ids = None
+        self._sealed = {}
+        self._day = None
+        if row_columns is not None:
+            self._key_indexes = [row_columns.index(c) for c in KEY_COLUMNS]
+            self._value_indexes = [row_columns.index(c) for c in VALUE_FIELDS]
+
+    # --- справочник инструментов ---
+
+    def _load_instruments(self):
+        path = os.path.join(self.root, _INSTRUMENTS_FILE)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                instruments = [tuple(key) for key in json.load(f)]
+        else:
+            instruments = []
+        if self._instruments is None or len(instruments) > len(self._instruments):
+            self._instruments = instruments
+            self._instrument_ids = {key: i for i, key in enumerate(instruments)}
+
+    def _save_instruments(self):
+        path = os.path.join(self.root, _INSTRUMENTS_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._instruments, f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    def instrument_id(self, exchange, market_type, symbol):
+        """
+        номер инструмента в хранилище или None, если его еще не было
+        """
+        key = (exchange, market_type, symbol)
+        if self._instrument_ids is None or key not in self._instrument_ids:
+            # Справочник мог пополнить писатель из другого процесса
+            self._load_instruments()
+        return self._instrument_ids.get(key)
+
+    # --- запись ---
+
+    def append(self, rows, ts=None):
+        """
+        дописывает строки в сегмент их дня
+        :param rows: кортежи в порядке row_columns
+        :param ts: время снимка в секундах (одно на все строки или по строке), по умолчанию текущее
+        :return: количество записанных строк
+        """
+        if not rows:
+            return 0
+        os.makedirs(self.root, exist_ok=True)
+        with self._lock, _FileLock(os.path.join(self.root, _LOCK_FILE)):
+            # Справочник перечитываем под блокировкой: другой процесс мог добавить инструменты
+            self._load_instruments()
+            count = len(self._instruments)
+            ids = np.empty(len(rows), dtype=DTYPES['instrument'])
+            for n, row in enumerate(rows):
+                key = tuple(row[i] for i in self._key_indexes)
+                instrument = self._instrument_ids.get(key)
+                if instrument is None:
+                    instrument = self._instrument_ids[key] = len(self._instruments)
+                    self._instruments.append(key)
+                ids[n] = instrument
+            if len(self._instruments) > count:
+                self._save_instruments()
+
+            ts = time.time() if ts is None else ts
+            columns = {
+                'ts': np.broadcast_to(np.asarray(np.asarray(ts) * 1000, dtype=DTYPES['ts']), ids.shape),
+                'instrument': ids,
+            }
+            for field, i in zip(VALUE_FIELDS, self._value_indexes):
+                # None превращается в NaN
+                columns[field] = np.array([row[i] for row in rows], dtype=DTYPES[field])
+
+            days = columns['ts'] // _DAY_MS
+            unique_days = np.unique(days)
+            for day in unique_days:
+                selected = days == day if len(unique_days) > 1 else slice(None)
+                self._append_segment(int(day), {field: values[selected] for field, values in columns.items()})
+        return len(rows)
+
+    def _append_segment(self, day, columns):
+        if self._day is None or day > self._day:
+            self._day = day
+            self.seal_before(day)
+        directory = os.path.join(self.root, _day_name(day))
+        if os.path.exists(os.path.join(directory, _SEALED_MARKER)):
+            logging.warning(f"Сегмент истории {_day_name(day)} уже запечатан, строки за этот день пропущены.")
+            return
+        os.makedirs(directory, exist_ok=True)
+        # После прерванной записи файлы полей могут быть разной длины: выравниваем перед дозаписью
+        paths = {field: os.path.join(directory, f'{field}.bin') for field in DTYPES}
+        lengths = {field: os.path.getsize(path) // DTYPES[field].itemsize if os.path.exists(path) else 0
+                   for field, path in paths.items()}
+        length = min(lengths.values())
+        for field, path in paths.items():
+            if os.path.exists(path) and os.path.getsize(path) != length * DTYPES[field].itemsize:
+                os.truncate(path, length * DTYPES[field].itemsize)
+        for field, values in columns.items():
+            with open(os.path.join(directory, f'{field}.bin'), 'ab') as f:
+                f.write(np.ascontiguousarray(values, dtype=DTYPES[field]).tobytes())
+
+    # --- сегменты ---
+
+    def days(self):
+        """
+        имена сегментов (YYYY-MM-DD) по возрастанию
+        """
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def _raw_columns(self, directory, fields):
+        # Поля дописываются по очереди: длина сегмента - по самому короткому файлу
+        sizes = {field: os.path.getsize(os.path.join(directory, f'{field}.bin')) // DTYPES[field].itemsize
+                 for field in DTYPES if os.path.exists(os.path.join(directory, f'{field}.bin'))}
+        length = min(sizes.values()) if len(sizes) == len(DTYPES) else 0
+        if length == 0:
+            return {field: np.empty(0, dtype=DTYPES[field]) for field in fields}
+        return {field: np.memmap(os.path.join(directory, f'{field}.bin'), dtype=DTYPES[field], mode='r',
+                                 shape=(length,))
+                for field in fields}
+
+    def seal(self, name):
+        """
+        запечатывает сегмент дня: сортирует по (инструмент, время) и строит индекс границ инструментов
+        :param name: имя сегмента YYYY-MM-DD
+        """
+        directory = os.path.join(self.root, name)
+        if not os.path.exists(os.path.join(directory, _SEALED_MARKER)):
+            columns = self._raw_columns(directory, DTYPES)
+            order = np.lexsort((columns['ts'], columns['instrument']))
+            instruments = columns['instrument'][order]
+            ids, starts = np.unique(instruments, return_index=True)
+            for field, values in columns.items():
+                np.save(os.path.join(directory, f'{field}.npy'), values[order])
+            np.save(os.path.join(directory, 'ids.npy'), ids)
+            np.save(os.path.join(directory, _SEALED_MARKER), np.append(starts, len(order)).astype(np.int64))
+            del columns
+            logging.info(f"Сегмент истории {name} запечатан: {len(order)} точек, {len(ids)} инструментов.")
+        for field in DTYPES:
+            path = os.path.join(directory, f'{field}.bin')
+            if os.path.exists(path):
+                os.remove(path)
+
+    def seal_before(self, day):
+        """
+        запечатывает все незапечатанные сегменты раньше указанного дня
+        :param day: номер дня от 1970-01-01 (UTC)
+        """
+        for name in self.days():
+            if name < _day_name(day) and not os.path.exists(os.path.join(self.root, name, _SEALED_MARKER)):
+                self.seal(name)
+
+    def _sealed_segment(self, name):
+        # Индекс сегмента читается целиком, поля открываются через mmap при первом обращении
+        segment = self._sealed.get(name)
+        if segment is None:
+            directory = os.path.join(self.root, name)
+            segment = self._sealed[name] = (
+                np.load(os.path.join(directory, 'ids.npy')),
+                np.load(os.path.join(directory, _SEALED_MARKER)),
+                {},
+            )
+        return segment
+
+    def _sealed_field(self, name, field):
+        columns = self._sealed_segment(name)[2]
+        if field not in columns:
+            columns[field] = np.load(os.path.join(self.root, name, f'{field}.npy'), mmap_mode='r')
+        return columns[field]
+
+    # --- чтение ---
+
+    def segments(self, exchange, market_type, symbol, start=None, end=None, fields=('ts', 'last_price')):
+        """
+        ряд инструмента по сегментам дней
+        В запечатанных сегментах массивы - срезы memory-mapped файлов без копирования,
+        в текущем дне - выборка из дописываемых файлов.
+        :param start: начало периода, секунды UTC (включительно)
+        :param end: конец периода, секунды UTC (не включительно)
+        :param fields: поля из DTYPES
+        :return: итератор словарей {поле: массив} по возрастанию времени
+        """
+        instrument = self.instrument_id(exchange, market_type, symbol)
+        if instrument is None:
+            return
+        first = _day_name(int(start // 86400)) if start is not None else ''
+        last = _day_name(int(end // 86400)) if end is not None else '9999'
+        for name in self.days():
+            if not first <= name <= last:
+                continue
+            directory = os.path.join(self.root, name)
+            if os.path.exists(os.path.join(directory, _SEALED_MARKER)):
+                ids, bounds, _ = self._sealed_segment(name)
+                k = np.searchsorted(ids, instrument)
+                if k == len(ids) or ids[k] != instrument:
+                    continue
+                lo, hi = bounds[k], bounds[k + 1]
+                # Внутри инструмента время отсортировано: период - тоже срез
+                if start is not None or end is not None:
+                    ts = self._sealed_field(name, 'ts')[lo:hi]
+                    if end is not None:
+                        hi = lo + np.searchsorted(ts, int(end * 1000))
+                    if start is not None:
+                        lo += np.searchsorted(ts, int(start * 1000))
+                if lo < hi:
+                    yield {field: self._sealed_field(name, field)[lo:hi] for field in fields}
+            else:
+                columns = self._raw_columns(directory, set(fields) | {'ts', 'instrument'})
+                mask = columns['instrument'] == instrument
+                if start is not None:
+                    mask &= columns['ts'] >= int(start * 1000)
+                if end is not None:
+                    mask &= columns['ts'] < int(end * 1000)
+                if mask.any():
+                    yield {field: columns[field][mask] for field in fields}
+
+    def series(self, exchange, market_type, symbol, start=None, end=None, fields=('ts', 'last_price')):
+        """
+        ряд инструмента за период одним набором массивов
+        Если ряд лежит в одном запечатанном сегменте, массивы возвращаются без копирования.
+        :return: словарь {поле: массив}
+        """
+        parts = list(self.segments(exchange, market_type, symbol, start, end, fields))
+        if len(parts) == 1:
+            return parts[0]
+        return {field: np.concatenate([part[field] for part in parts]) if parts
+                else np.empty(0, dtype=DTYPES[field]) for field in fields}
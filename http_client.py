@@ -0,0 +1,157 @@
+import time
+import random
+import logging
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Таймауты (подключение, чтение) в секундах для каждого хоста биржи
+HOST_TIMEOUTS = {
+    'api.binance.com': (3.05, 10),
+    'fapi.binance.com': (3.05, 10),
+    'eapi.binance.com': (3.05, 10),
+    'api.bybit.com': (3.05, 10),
+    'www.okx.com': (3.05, 10),
+}
+DEFAULT_TIMEOUT = (3.05, 15)
+
+# Повторы запросов: количество, база и потолок экспоненциальной задержки
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.25
+BACKOFF_CAP = 4.0
+# 418 (бан IP у Binance) не повторяется: повторы только продлевают бан
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Размер пула: число хостов и соединений на один хост
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 16
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_retries = 0
+
+
+def get_session():
+    """
+    возвращает общую сессию с пулом keep-alive соединений
+    Сессия создается один раз на процесс и используется всеми потоками.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({
+                    'Accept-Encoding': 'gzip, deflate',
+                    'Connection': 'keep-alive',
+                })
+                _session = session
+    return _session
+
+
+def close():
+    """
+    закрывает общую сессию и все соединения пула
+    """
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def _backoff(attempt):
+    # Экспоненциальная задержка с полным джиттером
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def get(url, params=None, timeout=None, retries=MAX_RETRIES, **kwargs):
+    """
+    GET-запрос через общий пул соединений с повторами
+    Повторяет запрос при сетевых ошибках и статусах из RETRY_STATUSES,
+    после исчерпания попыток возвращает последний ответ или пробрасывает исключение.
+    :param url: адрес
+    :param params: параметры запроса
+    :param timeout: таймаут, по умолчанию берется из HOST_TIMEOUTS
+    :param retries: количество повторов
+    :return: requests.Response
+    """
+    global _retries
+    if timeout is None:
+        timeout = HOST_TIMEOUTS.get(urlsplit(url).hostname, DEFAULT_TIMEOUT)
+    session = get_session()
+
+    for attempt in range(retries + 1):
+        try:
+            response = session.get(url, params=params, timeout=timeout, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == retries:
+                raise
+            delay = _backoff(attempt)
+            logging.warning(f"Ошибка соединения с {url}: {e}. Повтор через {delay:.2f} с.")
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            # Retry-After учитывается только для 429 (превышен лимит запросов)
+            retry_after = response.headers.get('Retry-After') if response.status_code == 429 else None
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else _backoff(attempt)
+            logging.warning(f"Статус {response.status_code} от {url}. Повтор через {delay:.2f} с.")
+            response.close()
+
+        with _stats_lock:
+            _retries += 1
+        time.sleep(delay)
+
+
+def pool_stats():
+    """
+    статистика пула соединений по хостам
+    handshakes - количество новых соединений (TCP+TLS), requests - количество запросов,
+    reuse_ratio - доля запросов, выполненных по уже открытому соединению
+    :return: словарь {host: {...}, 'total': {...}}
+    """
+    stats = {}
+    session = _session
+    if session is not None:
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools[key]
+                host = stats.setdefault(pool.host, {'handshakes': 0, 'requests': 0})
+                host['handshakes'] += pool.num_connections
+                host['requests'] += pool.num_requests
+
+    total = {'handshakes': 0, 'requests': 0}
+    for host in stats.values():
+        total['handshakes'] += host['handshakes']
+        total['requests'] += host['requests']
+    for host in list(stats.values()) + [total]:
+        host['reuse_ratio'] = 1 - host['handshakes'] / host['requests'] if host['requests'] else 0.0
+    total['retries'] = _retries
+    stats['total'] = total
+    return stats
+
+
+def log_pool_stats():
+    """
+    выводит статистику пула соединений в лог
+    """
+    stats = pool_stats()
+    for host, s in stats.items():
+        if host == 'total':
+            continue
+        logging.info(f"Пул {host}: запросов {s['requests']}, соединений {s['handshakes']}, "
+                     f"переиспользование {s['reuse_ratio']:.0%}")
+    total = stats['total']
+    logging.info(f"Пул HTTP всего: запросов {total['requests']}, соединений {total['handshakes']}, "
+                 f"переиспользование {total['reuse_ratio']:.0%}, повторов {total['retries']}")
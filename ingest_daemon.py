@@ -0,0 +1,201 @@
+import math
+import time
+import signal
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+import ws_client
+import Main
+import binance_module
+from db_writer import DB_PATH, get_writer
+from pipeline import WritePipeline
+from retention import RetentionJob
+from stream_ingest import StreamIngest, default_streams
+
+
+class PollJob:
+    """
+    периодический опрос одной биржи и одного типа рынка
+    :param exchange: биржа
+    :param market_type: тип рынка
+    :param fetcher: функция получения тикеров
+    :param prepare: функция (data, exchange, market_type) -> строки для db_writer;
+                    None, если fetcher уже возвращает готовые строки
+    :param interval: период опроса в секундах
+    """
+
+    def __init__(self, exchange, market_type, fetcher, prepare, interval):
+        self.exchange = exchange
+        self.market_type = market_type
+        self.fetcher = fetcher
+        self.prepare = prepare
+        self.interval = interval
+        self.next_run = None
+        self.future = None
+        self.runs = 0
+        self.skipped = 0
+
+    @property
+    def name(self):
+        return f"{self.exchange}/{self.market_type}"
+
+    def run(self, pipeline):
+        started = time.perf_counter()
+        try:
+            rows = self.fetcher()
+            if self.prepare is not None:
+                rows = self.prepare(rows, self.exchange, self.market_type)
+        except Exception as e:
+            logging.error(f"Ошибка опроса {self.name}: {e}")
+            return
+        fetch_time = time.perf_counter() - started
+        # Запись идет в потоке конвейера; при заполненной очереди ждем здесь, и следующий такт пропускается
+        pipeline.put(self.name, rows, fetch_time)
+        self.runs += 1
+        logging.info(f"{self.name}: получено {len(rows)} строк за {fetch_time:.3f} с.")
+
+
+# Периоды опроса по умолчанию (секунды)
+DEFAULT_INTERVALS = {
+    'Binance/spot': 30,
+    'Binance/futures': 30,
+    'Bybit/spot': 30,
+    'Bybit/futures': 30,
+    'OKX/spot': 30,
+    'OKX/futures': 30,
+    'Binance/options': 120,
+    'Bybit/options': 120,
+    'OKEx/options': 120,
+    # Агрегация и удаление старой истории, см. retention.py
+    'retention': 3600,
+}
+
+
+def default_jobs(intervals=None, streamed=None):
+    """
+    задания опроса для всех бирж: спот и фьючерсы из Main, опционы из binance_module,
+    и обслуживание истории из retention
+    :param intervals: словарь {'биржа/рынок': секунды}, переопределяет DEFAULT_INTERVALS
+    :param streamed: ключи Main.ENDPOINTS, которые приходят потоком и не опрашиваются
+    """
+    intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+    jobs = [PollJob(t.exchange, t.market_type, t.fetcher, None, 0) for t in Main.fetch_tasks(exclude=streamed)]
+    jobs += [
+        PollJob('Binance', 'options', binance_module.get_binance_options_data, binance_module.prepare_rows, 0),
+        PollJob('Bybit', 'options', binance_module.get_bybit_options_data, binance_module.prepare_rows, 0),
+        PollJob('OKEx', 'options', binance_module.get_okex_options_data, binance_module.prepare_rows, 0),
+        RetentionJob(0),
+    ]
+    for job in jobs:
+        job.interval = intervals[job.name]
+    return jobs
+
+
+class Scheduler:
+    """
+    планировщик без дрейфа: моменты запуска считаются от начальной точки, а не от конца прошлого запуска
+    Если прошлый запуск задания еще идет или планировщик опоздал, такт пропускается, а не копится.
+    """
+
+    def __init__(self, jobs, pipeline, max_workers=None):
+        self.jobs = jobs
+        self.pipeline = pipeline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(jobs), thread_name_prefix='poll')
+        self._stop = threading.Event()
+
+    def _advance(self, job, now):
+        # Следующий такт - ближайший момент сетки anchor + k * interval строго после now
+        job.next_run += job.interval
+        if job.next_run <= now:
+            missed = math.floor((now - job.next_run) / job.interval) + 1
+            job.next_run += missed * job.interval
+            job.skipped += missed
+            logging.warning(f"{job.name}: пропущено тактов: {missed} (цикл дольше периода {job.interval} с).")
+
+    def run(self):
+        anchor = time.monotonic()
+        for job in self.jobs:
+            job.next_run = anchor
+
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for job in self.jobs:
+                if job.next_run > now:
+                    continue
+                if job.future is not None and not job.future.done():
+                    job.skipped += 1
+                    logging.warning(f"{job.name}: предыдущий опрос еще идет, такт пропущен.")
+                else:
+                    job.future = self.executor.submit(job.run, self.pipeline)
+                self._advance(job, now)
+
+            next_run = min(job.next_run for job in self.jobs)
+            self._stop.wait(max(next_run - time.monotonic(), 0))
+
+        # Дожидаемся текущих опросов, новых не начинаем
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def stop(self, *args):
+        logging.info("Получен сигнал остановки, завершаем опрос...")
+        self._stop.set()
+
+
+def parse_intervals(values):
+    intervals = {}
+    for value in values or []:
+        name, _, seconds = value.partition('=')
+        if name not in DEFAULT_INTERVALS or not seconds:
+            raise ValueError(f"Неверный период '{value}', ожидается биржа/рынок=секунды")
+        intervals[name] = float(seconds)
+    return intervals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Непрерывный сбор спотовых, фьючерсных и опционных данных')
+    parser.add_argument('--db', default=DB_PATH, help='путь к файлу базы')
+    parser.add_argument('--interval', action='append', metavar='БИРЖА/РЫНОК=СЕК',
+                        help=f"период опроса, например Binance/spot=10; варианты: {', '.join(DEFAULT_INTERVALS)}")
+    parser.add_argument('--stream', action='store_true',
+                        help='спот и фьючерсы через WebSocket (нужен websockets), опционы по-прежнему опросом')
+    args = parser.parse_args()
+    try:
+        intervals = parse_intervals(args.interval)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.stream and not ws_client.available():
+        parser.error("для --stream нужен пакет websockets")
+
+    # Одно соединение с базой и один пул HTTP на все время работы
+    writer = get_writer(args.db)
+    writer.conn  # Открываем соединение и создаем схему сразу при старте
+    pipeline = WritePipeline(writer)
+    stream = None
+    streamed = None
+    if args.stream:
+        # Потоковые эндпоинты больше не опрашиваются, их строки приходят микропачками из StreamIngest;
+        # эндпоинты без потока остаются в опросе
+        stream = StreamIngest(default_streams(), pipeline).start()
+        streamed = {s.endpoint for s in stream.streams}
+    jobs = default_jobs(intervals, streamed)
+    scheduler = Scheduler(jobs, pipeline)
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+
+    logging.info("Сбор данных запущен.")
+    try:
+        scheduler.run()
+    finally:
+        if stream is not None:
+            stream.stop()
+        pipeline.close()
+        writer.close()
+        http_client.log_pool_stats()
+        http_client.close()
+        logging.info("Сбор данных остановлен.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+import time
+import logging
+import threading
+
+import numpy as np
+
+from exchange_data import INTERVAL_MS, KLINE_FETCHERS, KLINE_FIELDS, KLINE_LIMIT
+
+# Свечей в кольцевом буфере одного ряда
+KLINE_CAPACITY = KLINE_LIMIT
+# Чаще этого (секунды) ряд с биржи не запрашивается: остальные вызовы отдаются из памяти
+KLINE_REFRESH = 2.0
+
+
+class KlineRing:
+    """
+    кольцевой буфер свечей фиксированного размера: массив (capacity, len(KLINE_FIELDS)),
+    при переполнении новые свечи вытесняют самые старые
+    """
+
+    def __init__(self, capacity=KLINE_CAPACITY):
+        self.data = np.empty((capacity, len(KLINE_FIELDS)))
+        self.start = 0
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return len(self.data)
+
+    def last_open_time(self):
+        """
+        время открытия последней свечи (мс UTC) или None для пустого буфера
+        """
+        if not self.size:
+            return None
+        return self.data[(self.start + self.size - 1) % self.capacity, 0]
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+    def extend(self, klines):
+        """
+        добавляет свечи по возрастанию времени открытия
+        Последняя свеча буфера (еще не закрытая) заменяется новой версией с тем же временем,
+        свечи старше последней пропускаются.
+        :param klines: массив (n, len(KLINE_FIELDS))
+        :return: количество новых свечей
+        """
+        last = self.last_open_time()
+        if last is not None:
+            klines = klines[klines[:, 0] >= last]
+            if len(klines) and klines[0, 0] == last:
+                self.data[(self.start + self.size - 1) % self.capacity] = klines[0]
+                klines = klines[1:]
+        klines = klines[-self.capacity:]
+        count = len(klines)
+        if count:
+            self.data[(self.start + self.size + np.arange(count)) % self.capacity] = klines
+            overflow = max(0, self.size + count - self.capacity)
+            self.start = (self.start + overflow) % self.capacity
+            self.size = min(self.size + count, self.capacity)
+        return count
+
+    def array(self):
+        """
+        копия свечей буфера по возрастанию времени
+        """
+        return self.data[(self.start + np.arange(self.size)) % self.capacity]
+
+
+class _Series:
+    def __init__(self, capacity):
+        self.ring = KlineRing(capacity)
+        self.lock = threading.Lock()
+        self.fetched = None
+
+
+class KlineCache:
+    """
+    кэш свечей по (биржа, тип рынка, символ, интервал) в кольцевых буферах
+    Первый запрос ряда загружает последние capacity свечей, следующие - только свечи начиная
+    с последней сохраненной (она обновляется, пока не закрыта). Если с последнего запроса прошло
+    больше capacity интервалов, ряд загружается заново.
+    :param capacity: свечей в ряду
+    :param refresh: минимальный период запросов ряда к бирже, секунды
+    """
+
+    def __init__(self, capacity=KLINE_CAPACITY, refresh=KLINE_REFRESH, fetchers=None):
+        self.capacity = capacity
+        self.refresh = refresh
+        self.fetchers = fetchers or KLINE_FETCHERS
+        self._series = {}
+        self._lock = threading.Lock()
+        self.full_loads = 0
+        self.incremental = 0
+        self.memory_hits = 0
+        self.errors = 0
+
+    def _get_series(self, key):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(self.capacity)
+            return series
+
+    def _update(self, series, exchange, market_type, symbol, interval):
+        fetch = self.fetchers[exchange]
+        last = series.ring.last_open_time()
+        if last is not None and time.time() * 1000 - last < self.capacity * INTERVAL_MS[interval]:
+            klines = fetch(symbol, interval, start=last, limit=self.capacity, market_type=market_type)
+            self.incremental += 1
+        else:
+            klines = fetch(symbol, interval, limit=self.capacity, market_type=market_type)
+            series.ring.clear()
+            self.full_loads += 1
+        series.ring.extend(klines)
+
+    def get(self, exchange, symbol, interval='1m', market_type='spot'):
+        """
+        свечи ряда по возрастанию времени, при необходимости догружает новые с биржи
+        При ошибке запроса возвращаются сохраненные свечи.
+        :param market_type: тип рынка ('spot', 'futures'), у фьючерсов свечи запрашиваются с их эндпоинтов
+        :return: массив (n, len(KLINE_FIELDS)), колонки KLINE_FIELDS
+        """
+        if exchange not in self.fetchers:
+            return np.empty((0, len(KLINE_FIELDS)))
+        series = self._get_series((exchange, market_type, symbol, interval))
+        with series.lock:
+            now = time.monotonic()
+            if series.fetched is not None and now - series.fetched < self.refresh:
+                self.memory_hits += 1
+            else:
+                try:
+                    self._update(series, exchange, market_type, symbol, interval)
+                    series.fetched = now
+                except Exception as e:
+                    self.errors += 1
+                    logging.warning(f"Не удалось обновить свечи {exchange} {market_type} {symbol} {interval}: {e}")
+            return series.ring.array()
+
+    def stats(self):
+        return {
+            'series': len(self._series),
+            'full_loads': self.full_loads,
+            'incremental': self.incremental,
+            'memory_hits': self.memory_hits,
+            'errors': self.errors,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_kline_cache():
+    """
+    общий кэш свечей процесса
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = KlineCache()
+        return _cache
@@ -0,0 +1,179 @@
+import time
+import logging
+import threading
+
+from exchange_data import ORDER_BOOK_LIMIT
+from kline_cache import get_kline_cache
+from order_book_engine import release_feed, top_levels
+
+# Период обновления общего кэша одним фоновым потоком на (вид данных, биржа, тип рынка, символ), секунды
+POLL_PERIOD = 2.0
+# Поток останавливается, если его данные никто не читал дольше этого срока, секунды
+IDLE_TIMEOUT = 60.0
+# Сколько первый читатель ждет первого ответа биржи, секунды
+FIRST_WAIT = 5.0
+# Уровней стакана на сторону для таблицы и графика глубины: столько же отдает снимок REST,
+# пока поток не синхронизирован, поэтому обновление не сортирует всю локальную копию
+ORDER_BOOK_DEPTH = ORDER_BOOK_LIMIT
+
+# Виды данных: функция (биржа, тип рынка, символ) -> значение для кэша
+FETCHERS = {
+    'klines': lambda exchange, market_type, symbol: get_kline_cache().get(exchange, symbol, '1m', market_type),
+    'order_book': lambda exchange, market_type, symbol: top_levels(exchange, symbol, ORDER_BOOK_DEPTH, market_type),
+}
+# Что освободить при остановке потока вида данных
+RELEASERS = {
+    'order_book': lambda exchange, market_type, symbol: release_feed(exchange, symbol, market_type),
+}
+
+
+class _Poller:
+    def __init__(self, key, previous=None):
+        self.key = key
+        self.previous = previous
+        self.closing = False
+        self.released = threading.Event()
+        # Пока преемник ждет освобождения ключа, читатели получают последнее значение предшественника
+        self.value = previous.value if previous else None
+        self.updated = previous.updated if previous else None
+        self.last_read = time.monotonic()
+        self.ready = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+
+class MarketPoller:
+    """
+    общий кэш рыночных данных для всех сессий дашборда
+    На каждый запрошенный (вид данных, биржа, тип рынка, символ) запускается один фоновый поток, который раз
+    в period обновляет значение в кэше; коллбэки только читают кэш, поэтому число запросов к биржам
+    не зависит от числа открытых вкладок. Поток, данные которого не читали дольше idle_timeout, завершается.
+    :param period: период обновления, секунды
+    :param idle_timeout: срок без чтений до остановки потока, секунды
+    :param fetchers: вид данных -> функция (биржа, тип рынка, символ) -> значение, по умолчанию FETCHERS
+    :param releasers: вид данных -> функция (биржа, тип рынка, символ), вызывается при остановке потока
+    """
+
+    def __init__(self, period=POLL_PERIOD, idle_timeout=IDLE_TIMEOUT, fetchers=None, releasers=None):
+        self.period = period
+        self.idle_timeout = idle_timeout
+        self.fetchers = fetchers or FETCHERS
+        self.releasers = RELEASERS if releasers is None else releasers
+        self._pollers = {}
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.reads = 0
+        self.errors = 0
+        self.expired = 0
+
+    def _expire(self, poller):
+        # Проверка под общей блокировкой: get не получит поток, который уже завершается, а запустит преемника.
+        # Из словаря поток удаляется только после освобождения ресурсов ключа (см. _run)
+        with self._lock:
+            if time.monotonic() - poller.last_read <= self.idle_timeout:
+                return False
+            poller.closing = True
+            self.expired += 1
+        return True
+
+    def _run(self, poller):
+        kind, exchange, market_type, symbol = poller.key
+        fetch = self.fetchers[kind]
+        if poller.previous is not None:
+            # Преемник начинает опрос только после того, как завершающийся поток освободил ресурсы ключа,
+            # иначе release_feed остановил бы поток стакана, который уже читает преемник
+            poller.previous.released.wait()
+            poller.previous = None
+        try:
+            while True:
+                try:
+                    poller.value = fetch(exchange, market_type, symbol)
+                    poller.updated = time.time()
+                    with self._lock:
+                        self.fetches += 1
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                    logging.warning(f"Не удалось обновить {kind} {exchange} {market_type} {symbol}: {e}")
+                poller.ready.set()
+                if poller.stopped.wait(self.period) or self._expire(poller):
+                    break
+        finally:
+            poller.ready.set()
+            release = self.releasers.get(kind)
+            if release is not None:
+                try:
+                    release(exchange, market_type, symbol)
+                except Exception as e:
+                    logging.warning(f"Ошибка остановки {kind} {exchange} {market_type} {symbol}: {e}")
+            with self._lock:
+                # Ключ мог уже перейти к преемнику: удаляется только свой поток
+                if self._pollers.get(poller.key) is poller:
+                    del self._pollers[poller.key]
+            poller.released.set()
+            logging.debug(f"Фоновый опрос {kind} {exchange} {market_type} {symbol} остановлен.")
+
+    def _get_poller(self, key):
+        with self._lock:
+            poller = self._pollers.get(key)
+            if poller is None or poller.closing:
+                poller = self._pollers[key] = _Poller(key, previous=poller)
+                poller.thread = threading.Thread(target=self._run, args=(poller,),
+                                                 name=f'poll-{"-".join(key)}', daemon=True)
+                poller.thread.start()
+            poller.last_read = time.monotonic()
+            self.reads += 1
+            return poller
+
+    def get(self, kind, exchange, market_type, symbol, wait=FIRST_WAIT):
+        """
+        последнее значение из кэша; первый запрос запускает фоновый поток и ждет его первого ответа
+        :param kind: вид данных (ключ fetchers)
+        :param market_type: тип рынка ('spot', 'futures'): спот и фьючерсы одного символа опрашиваются раздельно
+        :param wait: сколько ждать первого ответа, секунды
+        :return: значение или None, если данных еще нет или вид данных/биржа не заданы
+        """
+        if not exchange or kind not in self.fetchers:
+            return None
+        poller = self._get_poller((kind, exchange, market_type, symbol))
+        poller.ready.wait(wait)
+        return poller.value
+
+    def stop(self):
+        """
+        останавливает все фоновые потоки
+        """
+        with self._lock:
+            pollers = list(self._pollers.values())
+            for poller in pollers:
+                poller.closing = True
+        for poller in pollers:
+            poller.stopped.set()
+        for poller in pollers:
+            poller.thread.join(timeout=5)
+
+    def stats(self):
+        # Счетчики меняются под той же блокировкой: снимок согласован
+        with self._lock:
+            return {
+                'pollers': len(self._pollers),
+                'fetches': self.fetches,
+                'reads': self.reads,
+                'errors': self.errors,
+                'expired': self.expired,
+            }
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_poller():
+    """
+    общий фоновый опрос процесса
+    """
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = MarketPoller()
+        return _poller
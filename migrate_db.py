@@ -0,0 +1,175 @@
+import os
+import time
+import sqlite3
+import logging
+import argparse
+
+from db_writer import (DB_PATH, INSTRUMENT_COLUMNS, SNAPSHOT_COLUMNS, column_type, connect, is_legacy,
+                       fill_latest, schema_ddl)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# Под этим именем старая плоская таблица живет, пока идет перенос
+LEGACY_TABLE = 'market_data_legacy'
+BATCH_SIZE = 5000
+
+# Фильтры дашборда (check_data.update_table), по которым сравниваем время запросов
+FILTER_QUERIES = [
+    ('цена', "last_price >= ?", (100,)),
+    ('объем', "volume_24h >= ?", (1000,)),
+    ('цена и объем', "last_price >= ? AND volume_24h >= ?", (100, 1000)),
+    ('биржа, рынок и цена', "exchange = ? AND market_type = ? AND last_price >= ?", ('Binance', 'spot', 1)),
+]
+
+
+def file_size(path):
+    # Учитываем журнал WAL, если он есть
+    return sum(os.path.getsize(p) for p in (path, f'{path}-wal') if os.path.exists(p))
+
+
+def _numeric_expr(conn, column):
+    # Для TEXT-колонок сравнение с числом требует явного приведения
+    declared = {row[1]: row[2].upper() for row in conn.execute('PRAGMA table_info(market_data)')}
+    if declared.get(column) in ('REAL', 'INTEGER'):
+        return column
+    return f'CAST({column} AS REAL)'
+
+
+def time_filter_queries(conn, repeat=5):
+    """
+    замеряет время фильтрующих запросов дашборда
+    :return: список (название, лучшее время в секундах, количество строк)
+    """
+    timings = []
+    for name, where, params in FILTER_QUERIES:
+        for column in ('last_price', 'volume_24h'):
+            where = where.replace(column, _numeric_expr(conn, column))
+        query = f"SELECT * FROM market_data WHERE {where}"
+        best, count = None, 0
+        for _ in range(repeat):
+            started = time.perf_counter()
+            count = len(conn.execute(query, params).fetchall())
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append((name, best, count))
+    return timings
+
+
+def _select_expr(column, alias='m'):
+    # Выражение для переноса значения колонки с приведением к типу новой схемы
+    kind = column_type(column)
+    if kind == 'REAL':
+        return f"CAST(NULLIF(TRIM({alias}.{column}), '') AS REAL)"
+    if kind == 'INTEGER':
+        return f"CAST(ROUND(CAST(NULLIF(TRIM({alias}.{column}), '') AS REAL)) AS INTEGER)"
+    return f'{alias}.{column}'
+
+
+def _copy_range(conn, first_id, last_id):
+    # Переносит строки старой таблицы с id в (first_id, last_id] в instruments и snapshots
+    instrument_select = ', '.join(_select_expr(c) for c in INSTRUMENT_COLUMNS)
+    conn.execute(
+        f"INSERT OR IGNORE INTO instruments ({', '.join(INSTRUMENT_COLUMNS)}) "
+        f"SELECT {instrument_select} FROM {LEGACY_TABLE} m WHERE m.id > ? AND m.id <= ? ORDER BY m.id",
+        (first_id, last_id)
+    )
+    snapshot_select = ', '.join(_select_expr(c) for c in SNAPSHOT_COLUMNS)
+    cursor = conn.execute(
+        f"INSERT INTO snapshots (id, instrument_id, timestamp, {', '.join(SNAPSHOT_COLUMNS)}) "
+        f"SELECT m.id, i.id, m.timestamp, {snapshot_select} FROM {LEGACY_TABLE} m "
+        f"JOIN instruments i ON i.exchange = m.exchange AND i.market_type = m.market_type AND i.symbol = m.symbol "
+        f"WHERE m.id > ? AND m.id <= ?",
+        (first_id, last_id)
+    )
+    return cursor.rowcount
+
+
+def migrate(path=DB_PATH, batch_size=BATCH_SIZE, vacuum=True):
+    """
+    переводит плоскую таблицу market_data на нормализованную типизированную схему на месте, пачками
+    Старая таблица переименовывается, строки переносятся в instruments и snapshots короткими транзакциями,
+    market_data становится представлением. Прерванную миграцию можно запустить повторно,
+    она продолжится с последней перенесенной строки.
+    :param path: путь к файлу базы
+    :param batch_size: количество строк в пачке
+    :param vacuum: сжать файл базы после миграции
+    :return: True, если миграция выполнена
+    """
+    conn = connect(path)
+    legacy_exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (LEGACY_TABLE,)
+    ).fetchone()
+    if not is_legacy(conn) and not legacy_exists:
+        logging.info("market_data уже в нормализованной схеме, миграция не требуется.")
+        conn.close()
+        return False
+
+    # Переименование и создание новой схемы - одна транзакция, сборщики после нее пишут уже в snapshots
+    if not legacy_exists:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(f'ALTER TABLE market_data RENAME TO {LEGACY_TABLE}')
+        for ddl in schema_ddl():
+            conn.execute(ddl)
+        fill_latest(conn, LEGACY_TABLE)
+        # Новые снимки получают id после старых, чтобы не пересечься с переносимыми строками
+        conn.execute(f"INSERT INTO sqlite_sequence (name, seq) SELECT 'snapshots', COALESCE(MAX(id), 0) "
+                     f"FROM {LEGACY_TABLE}")
+        conn.execute('COMMIT')
+
+    last_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM snapshots WHERE id <= '
+                           f'(SELECT COALESCE(MAX(id), 0) FROM {LEGACY_TABLE})').fetchone()[0]
+    max_id = conn.execute(f'SELECT COALESCE(MAX(id), 0) FROM {LEGACY_TABLE}').fetchone()[0]
+    total = conn.execute(f'SELECT COUNT(*) FROM {LEGACY_TABLE} WHERE id > ?', (last_id,)).fetchone()[0]
+    logging.info(f"Миграция {total} строк пачками по {batch_size}...")
+
+    copied = 0
+    while last_id < max_id:
+        next_id = min(last_id + batch_size, max_id)
+        conn.execute('BEGIN')
+        copied += _copy_range(conn, last_id, next_id)
+        conn.execute('COMMIT')
+        last_id = next_id
+        logging.info(f"Перенесено {copied} из {total} строк (id до {last_id}).")
+
+    conn.execute(f'DROP TABLE {LEGACY_TABLE}')
+
+    if vacuum:
+        logging.info("Сжатие файла базы (VACUUM)...")
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        conn.execute('VACUUM')
+    conn.close()
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Миграция market_data.db на нормализованную типизированную схему')
+    parser.add_argument('--db', default=DB_PATH, help='путь к файлу базы')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='строк в одной транзакции')
+    parser.add_argument('--no-vacuum', action='store_true', help='не сжимать файл после миграции')
+    args = parser.parse_args()
+
+    size_before = file_size(args.db)
+    conn = sqlite3.connect(args.db)
+    timings_before = time_filter_queries(conn)
+    conn.close()
+
+    if not migrate(args.db, args.batch_size, vacuum=not args.no_vacuum):
+        return
+
+    size_after = file_size(args.db)
+    conn = sqlite3.connect(args.db)
+    timings_after = time_filter_queries(conn)
+    conn.close()
+
+    logging.info(f"Размер файла: {size_before / 1024:.0f} КБ -> {size_after / 1024:.0f} КБ")
+    for (name, before, count_before), (_, after, count_after) in zip(timings_before, timings_after):
+        logging.info(f"Фильтр '{name}': {before * 1000:.2f} мс ({count_before} строк) -> "
+                     f"{after * 1000:.2f} мс ({count_after} строк)")
+
+
+if __name__ == "__main__":
+    main()
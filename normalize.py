@@ -0,0 +1,112 @@
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from db_writer import EXACT_DECIMAL_COLUMNS, MARKET_DATA_COLUMNS
+
+# Поля тикеров каждой биржи: колонка market_data -> ключ в ответе API
+FIELDS = {
+    'Binance': {
+        'symbol': 'symbol',
+        'last_price': 'lastPrice',
+        'volume_24h': 'volume',
+        'high_price_24h': 'highPrice',
+        'low_price_24h': 'lowPrice',
+    },
+    'Bybit': {
+        'symbol': 'symbol',
+        'last_price': 'lastPrice',
+        'volume_24h': 'volume24h',
+        'high_price_24h': 'highPrice24h',
+        'low_price_24h': 'lowPrice24h',
+    },
+    'OKX': {
+        'symbol': 'instId',
+        'last_price': 'last',
+        'volume_24h': 'vol24h',
+        'high_price_24h': 'high24h',
+        'low_price_24h': 'low24h',
+    },
+}
+
+# Объем для расчета trades_24h, если он отличается от volume_24h
+TRADES_VOLUME = {
+    ('OKX', 'futures'): 'volCcy24h',
+}
+
+
+def _numeric(raw, key):
+    # Пустые и нечисловые значения считаем нулем, как `or 0` в прежнем построчном коде
+    return pd.to_numeric(raw[key], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+
+
+def _exact(values):
+    # Точная десятичная строка без научной нотации
+    return [format(Decimal(repr(float(v))), 'f') for v in values]
+
+
+def to_columns(data, exchange, market_type):
+    """
+    переводит список тикеров биржи в колоночную пачку за один проход
+    :param data: список словарей из ответа API
+    :param exchange: биржа ('Binance', 'Bybit', 'OKX')
+    :param market_type: тип рынка
+    :return: DataFrame с колонками db_writer.MARKET_DATA_COLUMNS
+    """
+    fields = FIELDS[exchange]
+    trades_key = TRADES_VOLUME.get((exchange, market_type))
+    keys = list(fields.values()) + ([trades_key] if trades_key else [])
+    raw = pd.DataFrame.from_records(data, columns=keys) if data else pd.DataFrame(columns=keys)
+
+    columns = {column: _numeric(raw, key) for column, key in fields.items() if column != 'symbol'}
+    last_price = columns['last_price']
+    volume = columns['volume_24h']
+    trades_volume = _numeric(raw, trades_key) if trades_key else volume
+
+    # trades_24h = объем / последняя цена, price_usdt = объем * последняя цена
+    with np.errstate(divide='ignore', invalid='ignore'):
+        trades = np.where(last_price > 0, np.rint(trades_volume / last_price), 0.0)
+    columns['price_usdt'] = volume * last_price
+
+    frame = pd.DataFrame({
+        'symbol': raw[fields['symbol']].to_numpy(dtype=object),
+        'exchange': exchange,
+        'market_type': market_type,
+        **columns,
+        'options': raw[fields['symbol']].to_numpy(dtype=object),
+        'trades_24h': trades,
+        'strike_price': None,
+        'option_type': None,
+        'expiry_date': None,
+        'exercise_price': None,
+    }, columns=list(MARKET_DATA_COLUMNS))
+
+    # Точные десятичные колонки берем строкой из ответа биржи, вычисляемые - форматируем
+    for column in EXACT_DECIMAL_COLUMNS:
+        if column in fields:
+            frame[column] = raw[fields[column]].fillna('0').astype(str).to_numpy(dtype=object)
+        elif frame[column].notna().any():
+            frame[column] = _exact(frame[column].to_numpy())
+
+    return frame[frame['symbol'].notna()]
+
+
+def to_rows(frame):
+    """
+    строки для db_writer из колоночной пачки
+    trades_24h приводится к int, если помещается в INTEGER SQLite
+    :param frame: результат to_columns
+    :return: список кортежей в порядке MARKET_DATA_COLUMNS
+    """
+    if frame.empty:
+        return []
+    trades = frame['trades_24h'].to_numpy()
+    if 'trades_24h' not in EXACT_DECIMAL_COLUMNS:
+        values = trades.astype(object)
+        fits = np.abs(trades) < 2.0 ** 63
+        values[fits] = trades[fits].astype(np.int64).tolist()
+        trades = values
+    columns = [trades if column == 'trades_24h' else frame[column].to_numpy(dtype=object)
+               for column in MARKET_DATA_COLUMNS]
+    return list(zip(*columns))
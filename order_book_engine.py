@@ -0,0 +1,347 @@
+import json
+import time
+import heapq
+import random
+import logging
+import threading
+
+import numpy as np
+
+import ws_client
+from exchange_data import ORDER_BOOK_FETCHERS, ORDER_BOOK_LIMIT, bybit_category
+
+# Задержка переподключения: экспоненциальная с потолком
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+
+
+class SequenceGap(Exception):
+    """
+    пропущено обновление стакана: локальная копия больше не совпадает с биржей
+    """
+
+
+class BookSide:
+    """
+    сторона стакана: словарь ключ уровня -> количество
+    Обновление и удаление уровня - O(1) в словаре; лучшие n уровней выбираются кучей (heapq.nsmallest)
+    за O(m log n) только при чтении, которое идет реже обновлений.
+    Ключ - цена для продаж и минус цена для покупок, лучший уровень всегда наименьший.
+    """
+
+    def __init__(self, descending=False):
+        self.sign = -1.0 if descending else 1.0
+        self.levels = {}
+
+    def clear(self):
+        self.levels.clear()
+
+    def update(self, price, quantity):
+        """
+        устанавливает количество на уровне цены, 0 удаляет уровень
+        """
+        key = self.sign * price
+        if quantity == 0:
+            self.levels.pop(key, None)
+        else:
+            self.levels[key] = quantity
+
+    def top(self, n=None):
+        """
+        лучшие n уровней (все, если n не задан)
+        :return: массив (n, 2): цена, количество
+        """
+        keys = sorted(self.levels) if n is None else heapq.nsmallest(n, self.levels)
+        if not keys:
+            return np.empty((0, 2))
+        return np.column_stack((np.multiply(keys, self.sign), [self.levels[key] for key in keys]))
+
+    def __len__(self):
+        return len(self.levels)
+
+
+class LocalOrderBook:
+    """
+    локальная копия стакана: снимок плюс инкрементальные обновления с проверкой номеров
+    Обновление с номерами first..sequence применяется, если продолжает последнее примененное
+    (first == sequence + 1 или prev == sequence), устаревшие пропускаются, при пропуске - SequenceGap.
+    """
+
+    def __init__(self):
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide()
+        self.sequence = None
+        # После снимка еще не применено ни одного обновления
+        self.from_snapshot = False
+        self.updated = None
+        self._lock = threading.Lock()
+
+    @property
+    def synced(self):
+        return self.sequence is not None
+
+    def reset(self):
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            self.sequence = None
+            self.from_snapshot = False
+
+    def load_snapshot(self, bids, asks, sequence):
+        with self._lock:
+            self.bids.clear()
+            self.asks.clear()
+            for price, quantity in bids:
+                self.bids.update(float(price), float(quantity))
+            for price, quantity in asks:
+                self.asks.update(float(price), float(quantity))
+            self.sequence = sequence
+            self.from_snapshot = True
+            self.updated = time.time()
+
+    def apply(self, bids, asks, sequence, first=None, prev=None):
+        """
+        применяет обновление уровней
+        :param sequence: номер обновления (у Binance - последний номер в пачке u)
+        :param first: первый номер в пачке (Binance U), если биржа нумерует пачки диапазоном
+        :param prev: номер предыдущего обновления (OKX prevSeqId, фьючерсы Binance pu)
+        :return: False, если обновление устарело и пропущено
+        """
+        with self._lock:
+            if self.sequence is None:
+                raise SequenceGap("обновление до загрузки снимка")
+            # Устаревшее или повторное обновление; у OKX seqId == prevSeqId == последнему - пустое обновление
+            if sequence < self.sequence or (sequence == self.sequence and prev != sequence):
+                return False
+            expected = self.sequence + 1
+            if first is not None and prev is not None:
+                # Фьючерсы Binance: номера идут не подряд, первая пачка после снимка накрывает его номер,
+                # следующие ссылаются на предыдущую через pu
+                if self.from_snapshot and not first <= expected:
+                    raise SequenceGap(f"пачка {first}..{sequence} не накрывает снимок {self.sequence}")
+                if not self.from_snapshot and prev != self.sequence:
+                    raise SequenceGap(f"pu {prev}, последний примененный {self.sequence}")
+            elif prev is not None and prev != self.sequence:
+                raise SequenceGap(f"prev {prev}, последний примененный {self.sequence}")
+            elif first is not None and not first <= expected <= sequence:
+                raise SequenceGap(f"пачка {first}..{sequence}, ожидался {expected}")
+            if first is None and prev is None and sequence != expected:
+                raise SequenceGap(f"номер {sequence}, ожидался {expected}")
+            for price, quantity in bids:
+                self.bids.update(float(price), float(quantity))
+            for price, quantity in asks:
+                self.asks.update(float(price), float(quantity))
+            self.sequence = sequence
+            self.from_snapshot = False
+            self.updated = time.time()
+            return True
+
+    def top(self, n=None):
+        """
+        лучшие n уровней каждой стороны
+        :return: (bids, asks) - массивы (n, 2) цена, количество от лучшей цены
+        """
+        with self._lock:
+            return self.bids.top(n), self.asks.top(n)
+
+
+# --- разбор сообщений бирж ---
+# Каждая функция возвращает событие {'snapshot', 'bids', 'asks', 'sequence', 'first', 'prev'} или None
+
+def _parse_binance(message):
+    # У фьючерсов есть pu - номер u предыдущей пачки
+    if message.get('e') != 'depthUpdate':
+        return None
+    return {'snapshot': False, 'bids': message['b'], 'asks': message['a'],
+            'sequence': message['u'], 'first': message['U'], 'prev': message.get('pu')}
+
+
+def _parse_bybit(message):
+    if not message.get('topic', '').startswith('orderbook.'):
+        return None
+    data = message['data']
+    # u == 1 - биржа перезапустила поток и прислала новый снимок
+    snapshot = message.get('type') == 'snapshot' or data['u'] == 1
+    return {'snapshot': snapshot, 'bids': data['b'], 'asks': data['a'],
+            'sequence': data['u'], 'first': None, 'prev': None}
+
+
+def _parse_okx(message):
+    if message.get('arg', {}).get('channel') != 'books' or 'data' not in message:
+        return None
+    data = message['data'][0]
+    return {'snapshot': message.get('action') == 'snapshot',
+            'bids': [row[:2] for row in data['bids']], 'asks': [row[:2] for row in data['asks']],
+            'sequence': data['seqId'], 'first': None, 'prev': data['prevSeqId']}
+
+
+class Venue:
+    """
+    описание потока стакана биржи
+    :param url: адрес WebSocket; {stream} - поток Binance, {category} - категория Bybit
+    :param subscribe: функция символ -> сообщение подписки (None, если поток выбирается адресом)
+    :param parse: разбор сообщения в событие
+    :param rest_snapshot: снимок загружается через REST (Binance), иначе приходит первым сообщением потока
+    """
+
+    def __init__(self, url, subscribe, parse, rest_snapshot=False):
+        self.url = url
+        self.subscribe = subscribe
+        self.parse = parse
+        self.rest_snapshot = rest_snapshot
+
+
+_BYBIT = Venue('wss://stream.bybit.com/v5/public/{category}',
+               lambda symbol: {'op': 'subscribe', 'args': [f'orderbook.50.{symbol}']}, _parse_bybit)
+_OKX = Venue('wss://ws.okx.com:8443/ws/v5/public',
+             lambda symbol: {'op': 'subscribe', 'args': [{'channel': 'books', 'instId': symbol}]}, _parse_okx)
+
+# Потоки стакана по (биржа, тип рынка); тип фьючерса OKX задан instId, категория Bybit - символом
+VENUES = {
+    ('Binance', 'spot'): Venue('wss://stream.binance.com:9443/ws/{stream}', None, _parse_binance,
+                               rest_snapshot=True),
+    ('Binance', 'futures'): Venue('wss://fstream.binance.com/ws/{stream}', None, _parse_binance,
+                                  rest_snapshot=True),
+    ('Bybit', 'spot'): _BYBIT,
+    ('Bybit', 'futures'): _BYBIT,
+    ('OKX', 'spot'): _OKX,
+    ('OKX', 'futures'): _OKX,
+    ('OKEx', 'spot'): _OKX,
+    ('OKEx', 'futures'): _OKX,
+}
+
+
+class OrderBookFeed:
+    """
+    поддерживает LocalOrderBook одного инструмента по потоку обновлений биржи
+    При пропуске номера или обрыве соединения стакан сбрасывается, поток переподключается
+    и синхронизируется заново (снимок REST у Binance, снимок из потока у Bybit и OKX).
+    :param exchange: биржа из VENUES
+    :param symbol: символ в формате биржи
+    :param market_type: тип рынка ('spot', 'futures')
+    :param transport: функция (url, subscribe) -> итератор сообщений, по умолчанию WebSocket
+    :param snapshot: функция символ -> (bids, asks, sequence), по умолчанию exchange_data.ORDER_BOOK_FETCHERS
+    """
+
+    def __init__(self, exchange, symbol, market_type='spot', transport=None, snapshot=None,
+                 snapshot_limit=ORDER_BOOK_LIMIT * 10):
+        self.exchange = exchange
+        self.symbol = symbol
+        self.market_type = market_type
+        self.venue = VENUES[(exchange, market_type)]
+        self.transport = transport or ws_client.websocket_transport
+        self.snapshot = snapshot or (lambda s: ORDER_BOOK_FETCHERS[exchange](s, snapshot_limit, market_type))
+        self.book = LocalOrderBook()
+        self.resyncs = 0
+        self.applied = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _url(self):
+        return self.venue.url.format(stream=f'{self.symbol.lower()}@depth@100ms',
+                                     category=bybit_category(self.market_type, self.symbol))
+
+    def _subscribe(self):
+        return self.venue.subscribe(self.symbol) if self.venue.subscribe else None
+
+    def consume(self, messages):
+        """
+        применяет сообщения потока к стакану до конца потока, остановки или SequenceGap
+        """
+        self.book.reset()
+        for raw in messages:
+            if self._stop.is_set():
+                return
+            event = self.venue.parse(json.loads(raw))
+            if event is None:
+                continue
+            if event['snapshot']:
+                self.book.load_snapshot(event['bids'], event['asks'], event['sequence'])
+                continue
+            if not self.book.synced:
+                if not self.venue.rest_snapshot:
+                    continue  # Ждем снимок из потока
+                # Снимок запрашивается после первого обновления, чтобы он не оказался старше потока
+                bids, asks, sequence = self.snapshot(self.symbol)
+                self.book.load_snapshot(bids, asks, sequence)
+            if self.book.apply(event['bids'], event['asks'], event['sequence'], event['first'], event['prev']):
+                self.applied += 1
+
+    def run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            applied = self.applied
+            try:
+                self.consume(self.transport(self._url(), self._subscribe()))
+                if not self._stop.is_set():
+                    raise ConnectionError("поток закрыт биржей")
+            except Exception as e:
+                if isinstance(e, SequenceGap):
+                    self.resyncs += 1
+                    logging.warning(f"Стакан {self.exchange} {self.symbol}: {e}, синхронизация заново.")
+                if self.applied > applied:
+                    attempt = 0
+                # Пропуск после успешных обновлений - сразу новая синхронизация, иначе ждем с нарастающей задержкой
+                if not isinstance(e, SequenceGap) or attempt:
+                    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                    logging.warning(f"Поток стакана {self.exchange} {self.symbol}: {e}. "
+                                    f"Переподключение через {delay:.1f} с.")
+                    self._stop.wait(delay)
+                attempt += 1
+                self.book.reset()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, daemon=True,
+                                        name=f'order-book-{self.exchange}-{self.market_type}-{self.symbol}')
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+
+def get_feed(exchange, symbol, market_type='spot'):
+    """
+    общий поток стакана процесса для (биржа, тип рынка, символ), запускается при первом обращении
+    :return: OrderBookFeed или None, если websockets не установлен или биржа не поддерживается
+    """
+    if not ws_client.available() or (exchange, market_type) not in VENUES:
+        return None
+    key = (exchange, market_type, symbol)
+    with _feeds_lock:
+        feed = _feeds.get(key)
+        if feed is None:
+            feed = _feeds[key] = OrderBookFeed(exchange, symbol, market_type).start()
+        return feed
+
+
+def release_feed(exchange, symbol, market_type='spot'):
+    """
+    останавливает общий поток стакана (биржа, тип рынка, символ), если он запущен
+    """
+    with _feeds_lock:
+        feed = _feeds.pop((exchange, market_type, symbol), None)
+    if feed is not None:
+        feed.stop()
+
+
+def top_levels(exchange, symbol, n=None, market_type='spot'):
+    """
+    лучшие уровни стакана из локальной копии; пока поток не синхронизирован
+    или недоступен - снимок через REST
+    :return: (bids, asks) - массивы (n, 2) цена, количество
+    """
+    feed = get_feed(exchange, symbol, market_type)
+    if feed is not None and feed.book.synced:
+        return feed.book.top(n)
+    fetch = ORDER_BOOK_FETCHERS.get(exchange)
+    if fetch is None:
+        return np.empty((0, 2)), np.empty((0, 2))
+    bids, asks, _ = fetch(symbol, market_type=market_type)
+    return bids[:n], asks[:n]
@@ -0,0 +1,89 @@
+import numpy as np
+
+# Уровней на сторону в таблице стакана (после группировки)
+TABLE_LEVELS = 25
+# Шаги группировки цены для выбора в дашборде, 0 - без группировки
+TICK_SIZES = (0, 0.01, 0.1, 1, 10, 100)
+
+BID_COLOR = '#00cc96'
+ASK_COLOR = '#ef553b'
+
+
+def group(book, tick, side):
+    """
+    группировка уровней по шагу цены: покупки округляются вниз, продажи вверх
+    :param book: массив (n, 2) цена, количество
+    :param tick: шаг цены, 0 - без группировки
+    :param side: 'bid' или 'ask'
+    :return: массив (m, 2), отсортированный от лучшей цены: покупки по убыванию, продажи по возрастанию
+    """
+    if not len(book):
+        return book
+    prices, quantities = book[:, 0], book[:, 1]
+    if tick:
+        # Поправка 1e-9 от ошибок представления: 0.3 / 0.1 = 2.9999999999999996
+        steps = prices / tick
+        steps = np.floor(steps + 1e-9) if side == 'bid' else np.ceil(steps - 1e-9)
+        prices = np.round(steps * tick, 10)
+    unique, inverse = np.unique(prices, return_inverse=True)
+    grouped = np.column_stack((unique, np.bincount(inverse, weights=quantities, minlength=len(unique))))
+    return grouped[::-1] if side == 'bid' else grouped
+
+
+def depth(bids, asks, tick=0):
+    """
+    сгруппированные стороны стакана с накопленным объемом от лучшей цены
+    :return: (bids, asks) - массивы (n, 3): цена, количество, накопленное количество
+    """
+    bids = group(bids, tick, 'bid')
+    asks = group(asks, tick, 'ask')
+    return (np.column_stack((bids, np.cumsum(bids[:, 1]))) if len(bids) else np.empty((0, 3)),
+            np.column_stack((asks, np.cumsum(asks[:, 1]))) if len(asks) else np.empty((0, 3)))
+
+
+def table_rows(bids, asks, limit=TABLE_LEVELS):
+    """
+    строки таблицы стакана: продажи сверху (лучшая цена внизу блока), затем покупки
+    :param bids: результат depth
+    :param asks: результат depth
+    """
+    asks = asks[:limit][::-1]
+    bids = bids[:limit]
+    rows = [{'price': p, 'quantity': q, 'total': t, 'side': 'Asks'} for p, q, t in asks.tolist()]
+    rows += [{'price': p, 'quantity': q, 'total': t, 'side': 'Bids'} for p, q, t in bids.tolist()]
+    return rows
+
+
+def depth_figure():
+    """
+    пустой график глубины рынка (словарь figure для dcc.Graph): накопленный объем покупок и продаж по цене
+    Данные следов обновляет depth_patch, остальная часть графика в браузере не пересылается.
+    """
+    trace = {'type': 'scatter', 'mode': 'lines', 'fill': 'tozeroy', 'x': [], 'y': []}
+    return {
+        'data': [
+            {**trace, 'name': 'Bids', 'line': {'shape': 'vh', 'color': BID_COLOR}},
+            {**trace, 'name': 'Asks', 'line': {'shape': 'hv', 'color': ASK_COLOR}},
+        ],
+        'layout': {
+            'xaxis': {'title': 'Цена', 'showgrid': True, 'gridcolor': '#444444'},
+            'yaxis': {'title': 'Объем', 'showgrid': True, 'gridcolor': '#444444'},
+            'plot_bgcolor': '#1e1e1e',
+            'paper_bgcolor': '#1e1e1e',
+            'font': {'color': '#FFFFFF'},
+            'margin': {'l': 50, 'r': 20, 't': 20, 'b': 40},
+            'showlegend': False,
+        },
+    }
+
+
+def depth_patch(patch, bids, asks):
+    """
+    заполняет dash.Patch графика depth_figure новыми ценами и накопленными объемами
+    Покупки идут по возрастанию цены, чтобы линия шла слева направо к спреду.
+    """
+    patch['data'][0]['x'] = bids[::-1, 0].tolist()
+    patch['data'][0]['y'] = bids[::-1, 2].tolist()
+    patch['data'][1]['x'] = asks[:, 0].tolist()
+    patch['data'][1]['y'] = asks[:, 2].tolist()
+    return patch
@@ -0,0 +1,142 @@
+import time
+import queue
+import logging
+import threading
+
+# Емкость очереди в пачках: когда писатель отстает, put блокирует сборщиков
+MAX_QUEUE = 32
+# Сколько пачек из очереди писатель объединяет в один коммит
+GROUP_BATCHES = 16
+# Период вывода статистики конвейера в лог (секунды)
+STATS_INTERVAL = 60
+
+_STOP = object()
+
+
+class StageStats:
+    """
+    счетчик задержек одной стадии конвейера: количество, среднее и максимум
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def snapshot(self):
+        return {'count': self.count, 'avg': self.total / self.count if self.count else 0.0, 'max': self.max}
+
+
+class WritePipeline:
+    """
+    конвейер записи: сборщики кладут нормализованные пачки в ограниченную очередь,
+    единственный поток-писатель забирает их группами и записывает одним коммитом write_batches
+    Пока идет запись, сборщики уже получают следующие данные; если очередь заполнена,
+    put ждет свободного места, и сборщики замедляются до скорости записи.
+    :param writer: db_writer.BulkWriter
+    :param max_queue: емкость очереди в пачках
+    :param group_batches: максимум пачек в одном коммите
+    """
+
+    def __init__(self, writer, max_queue=MAX_QUEUE, group_batches=GROUP_BATCHES, stats_interval=STATS_INTERVAL):
+        self.writer = writer
+        self.group_batches = group_batches
+        self.stats_interval = stats_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stats_lock = threading.Lock()
+        self.stages = {name: StageStats() for name in ('fetch', 'backpressure', 'queue', 'write')}
+        self.max_depth = 0
+        self.groups = 0
+        self.errors = 0
+        self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+        self._thread.start()
+
+    def _record(self, stage, seconds):
+        with self._stats_lock:
+            self.stages[stage].add(seconds)
+
+    def put(self, name, rows, fetch_time=None):
+        """
+        кладет пачку в очередь записи, при заполненной очереди ждет
+        :param name: источник пачки для журнала (например 'Binance/spot')
+        :param rows: строки для db_writer
+        :param fetch_time: длительность получения и подготовки пачки, секунды
+        """
+        if fetch_time is not None:
+            self._record('fetch', fetch_time)
+        started = time.perf_counter()
+        self._queue.put((started, name, rows))
+        waited = time.perf_counter() - started
+        self._record('backpressure', waited)
+        if waited > 1:
+            logging.warning(f"{name}: очередь записи заполнена, сборщик ждал {waited:.2f} с.")
+        with self._stats_lock:
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def _take_group(self):
+        # Ждем первую пачку, остальные забираем из очереди без ожидания
+        group = [self._queue.get()]
+        while len(group) < self.group_batches and group[-1] is not _STOP:
+            try:
+                group.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return group
+
+    def _run(self):
+        last_stats = time.monotonic()
+        while True:
+            group = self._take_group()
+            stop = group[-1] is _STOP
+            items = group[:-1] if stop else group
+            if items:
+                now = time.perf_counter()
+                for enqueued, _, _ in items:
+                    self._record('queue', now - enqueued)
+                try:
+                    self.writer.write_batches([rows for _, _, rows in items])
+                except Exception as e:
+                    self.errors += 1
+                    logging.error(f"Ошибка записи пачек {', '.join(name for _, name, _ in items)}: {e}")
+                self._record('write', time.perf_counter() - now)
+                self.groups += 1
+            if stop:
+                return
+            if time.monotonic() - last_stats >= self.stats_interval:
+                last_stats = time.monotonic()
+                self.log_stats()
+
+    def stats(self):
+        """
+        глубина очереди и задержки стадий: fetch - получение данных, backpressure - ожидание места в очереди,
+        queue - время пачки в очереди, write - коммит группы
+        """
+        with self._stats_lock:
+            return {
+                'depth': self._queue.qsize(),
+                'max_depth': self.max_depth,
+                'capacity': self._queue.maxsize,
+                'groups': self.groups,
+                'errors': self.errors,
+                **{name: stage.snapshot() for name, stage in self.stages.items()},
+            }
+
+    def log_stats(self):
+        stats = self.stats()
+        stages = ', '.join(f"{name} {stats[name]['avg'] * 1000:.0f}/{stats[name]['max'] * 1000:.0f} мс"
+                           for name in self.stages)
+        logging.info(f"Конвейер записи: очередь {stats['depth']}/{stats['capacity']} (макс. {stats['max_depth']}), "
+                     f"коммитов {stats['groups']}, ошибок {stats['errors']}; среднее/макс.: {stages}.")
+
+    def close(self):
+        """
+        дожидается записи всех пачек из очереди и останавливает поток-писатель
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        self.log_stats()
@@ -0,0 +1,266 @@
+import time
+import logging
+import argparse
+
+from db_writer import DB_PATH, connect, is_legacy
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[logging.StreamHandler()]
+)
+
+# Агрегаты истории: имя -> формат начала интервала для strftime
+RESOLUTIONS = {
+    '1m': '%Y-%m-%d %H:%M:00',
+    '1h': '%Y-%m-%d %H:00:00',
+    '1d': '%Y-%m-%d 00:00:00',
+}
+# Сколько хранить (секунды): сырые снимки и агрегаты; None - хранить всегда
+RAW_RETENTION = 7 * 24 * 3600
+ROLLUP_RETENTION = {
+    '1m': 30 * 24 * 3600,
+    '1h': 365 * 24 * 3600,
+    '1d': None,
+}
+# Строк в одной транзакции: писатели ждут не дольше одной пачки
+BATCH_SIZE = 5000
+
+RETENTION_DDL = [
+    '''
+    CREATE TABLE IF NOT EXISTS rollups (
+        resolution TEXT NOT NULL,  -- '1m', '1h' или '1d'
+        instrument_id INTEGER NOT NULL REFERENCES instruments (id),
+        bucket DATETIME NOT NULL,  -- начало интервала
+        open REAL,
+        high REAL,
+        low REAL,
+        close REAL,
+        volume REAL,  -- volume_24h на конец интервала
+        samples INTEGER NOT NULL,
+        PRIMARY KEY (resolution, instrument_id, bucket)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS rollups_resolution_bucket ON rollups (resolution, bucket)',
+    '''
+    CREATE TABLE IF NOT EXISTS retention_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''',
+]
+
+# Снимки с id в диапазоне -> агрегаты одного разрешения. Пачки идут по возрастанию id,
+# поэтому в уже существующем интервале open сохраняется, close и volume берутся из новой пачки
+_ROLLUP_SNAPSHOTS = '''
+    INSERT INTO rollups (resolution, instrument_id, bucket, open, high, low, close, volume, samples)
+    SELECT :resolution, g.instrument_id, g.bucket, o.last_price, g.high, g.low, c.last_price, c.volume_24h,
+           g.samples
+    FROM (
+        SELECT instrument_id, strftime(:fmt, timestamp) AS bucket, MIN(id) AS first_id, MAX(id) AS last_id,
+               MAX(last_price) AS high, MIN(last_price) AS low, COUNT(*) AS samples
+        FROM snapshots
+        WHERE id > :start AND id <= :end
+        GROUP BY instrument_id, bucket
+    ) g
+    JOIN snapshots o ON o.id = g.first_id
+    JOIN snapshots c ON c.id = g.last_id
+    WHERE true
+    ON CONFLICT (resolution, instrument_id, bucket) DO UPDATE SET
+        high = MAX(COALESCE(high, excluded.high), COALESCE(excluded.high, high)),
+        low = MIN(COALESCE(low, excluded.low), COALESCE(excluded.low, low)),
+        close = excluded.close,
+        volume = excluded.volume,
+        samples = samples + excluded.samples
+'''
+
+
+def create_retention_schema(conn):
+    """
+    создает таблицу агрегатов rollups и таблицу состояния retention_state, если их еще нет
+    """
+    for ddl in RETENTION_DDL:
+        conn.execute(ddl)
+
+
+def _get_state(conn, name):
+    row = conn.execute('SELECT value FROM retention_state WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else 0
+
+
+def _set_state(conn, name, value):
+    conn.execute('INSERT INTO retention_state (name, value) VALUES (?, ?) '
+                 'ON CONFLICT (name) DO UPDATE SET value = excluded.value', (name, value))
+
+
+def rollup(conn, batch_size=BATCH_SIZE):
+    """
+    досчитывает агрегаты по снимкам, добавленным с прошлого запуска
+    Каждая пачка снимков (по id) сразу добавляется во все разрешения одной короткой транзакцией
+    вместе с отметкой о прогрессе, поэтому прерванный проход продолжается без двойного счета.
+    :param conn: соединение sqlite3 с isolation_level=None
+    :param batch_size: снимков в одной транзакции
+    :return: количество обработанных снимков
+    """
+    last_id = _get_state(conn, 'rollup_snapshot_id')
+    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM snapshots').fetchone()[0]
+    processed = 0
+    while last_id < max_id:
+        next_id = min(last_id + batch_size, max_id)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            count = conn.execute('SELECT COUNT(*) FROM snapshots WHERE id > ? AND id <= ?',
+                                 (last_id, next_id)).fetchone()[0]
+            if count:
+                for resolution, fmt in RESOLUTIONS.items():
+                    conn.execute(_ROLLUP_SNAPSHOTS, {'resolution': resolution, 'fmt': fmt,
+                                                     'start': last_id, 'end': next_id})
+            _set_state(conn, 'rollup_snapshot_id', next_id)
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        processed += count
+        last_id = next_id
+    return processed
+
+
+def _delete_batches(conn, table, where, params, batch_size):
+    # Удаляем пачками по rowid, каждая пачка - отдельная транзакция (условие должно идти по индексу)
+    deleted = 0
+    while True:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(f'DELETE FROM {table} WHERE rowid IN '
+                                  f'(SELECT rowid FROM {table} WHERE {where} LIMIT ?)',
+                                  (*params, batch_size))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+
+def _delete_id_range(conn, table, last_id, where, params, batch_size):
+    # Удаляем строки с id <= last_id ограниченными диапазонами первичного ключа, каждый - отдельная транзакция:
+    # блокировка записи держится на время одного диапазона, а не поиска строк по всей таблице
+    deleted = 0
+    first_id = conn.execute(f'SELECT MIN(id) FROM {table}').fetchone()[0]
+    while first_id is not None and first_id <= last_id:
+        end_id = min(first_id + batch_size - 1, last_id)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(f'DELETE FROM {table} WHERE id BETWEEN ? AND ? AND {where}',
+                                  (first_id, end_id, *params))
+            conn.execute('COMMIT')
+        except Exception:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        deleted += cursor.rowcount
+        first_id = conn.execute(f'SELECT MIN(id) FROM {table} WHERE id > ?', (end_id,)).fetchone()[0]
+    return deleted
+
+
+def prune(conn, raw_retention=RAW_RETENTION, rollup_retention=None, batch_size=BATCH_SIZE):
+    """
+    удаляет сырые снимки старше raw_retention, уже вошедшие в агрегаты, и устаревшие агрегаты
+    :param raw_retention: срок хранения снимков в секундах, None - не удалять
+    :param rollup_retention: словарь {агрегат: секунды или None}, по умолчанию ROLLUP_RETENTION
+    :return: словарь {'raw' или агрегат: количество удаленных строк}
+    """
+    rollup_retention = {**ROLLUP_RETENTION, **(rollup_retention or {})}
+    deleted = {}
+    if raw_retention is not None:
+        # Граница по времени и последний удаляемый id считаются один раз вне транзакции (чтение в WAL
+        # не блокирует писателей), удаляются только уже агрегированные снимки
+        cutoff = conn.execute("SELECT datetime('now', ?)", (f'-{int(raw_retention)} seconds',)).fetchone()[0]
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM snapshots WHERE id <= ? AND timestamp < ?',
+                               (_get_state(conn, 'rollup_snapshot_id'), cutoff)).fetchone()[0]
+        deleted['raw'] = _delete_id_range(conn, 'snapshots', last_id, 'timestamp < ?', (cutoff,), batch_size)
+    for resolution, seconds in rollup_retention.items():
+        if seconds is None:
+            continue
+        deleted[resolution] = _delete_batches(
+            conn, 'rollups', "resolution = ? AND bucket < datetime('now', ?)",
+            (resolution, f'-{int(seconds)} seconds'), batch_size,
+        )
+    return deleted
+
+
+def run_retention(path=DB_PATH, raw_retention=RAW_RETENTION, rollup_retention=None, batch_size=BATCH_SIZE):
+    """
+    один проход обслуживания истории: агрегация новых снимков, затем удаление устаревших строк
+    :param path: путь к файлу базы
+    :return: (количество агрегированных снимков, словарь удаленных строк) или None для старой схемы
+    """
+    conn = connect(path)
+    try:
+        if is_legacy(conn):
+            logging.error("market_data - старая плоская таблица, агрегация доступна после миграции: "
+                          "python migrate_db.py")
+            return None
+        create_retention_schema(conn)
+        started = time.perf_counter()
+        processed = rollup(conn, batch_size)
+        deleted = prune(conn, raw_retention, rollup_retention, batch_size)
+    finally:
+        conn.close()
+    logging.info(f"Агрегировано {processed} снимков, удалено строк: "
+                 f"{', '.join(f'{name} {count}' for name, count in deleted.items()) or 'нет'} "
+                 f"за {time.perf_counter() - started:.3f} с.")
+    return processed, deleted
+
+
+class RetentionJob:
+    """
+    периодическое обслуживание истории для ingest_daemon.Scheduler
+    Работает через собственное соединение, пачками, и не держит блокировку записи дольше одной пачки.
+    :param interval: период запуска в секундах
+    """
+    name = 'retention'
+
+    def __init__(self, interval, raw_retention=RAW_RETENTION, rollup_retention=None, batch_size=BATCH_SIZE):
+        self.interval = interval
+        self.raw_retention = raw_retention
+        self.rollup_retention = rollup_retention
+        self.batch_size = batch_size
+        self.next_run = None
+        self.future = None
+        self.runs = 0
+        self.skipped = 0
+
+    def run(self, pipeline):
+        try:
+            run_retention(pipeline.writer.path, self.raw_retention, self.rollup_retention, self.batch_size)
+        except Exception as e:
+            logging.error(f"Ошибка обслуживания истории: {e}")
+            return
+        self.runs += 1
+
+
+def _seconds(value):
+    return None if value.lower() == 'none' else float(value) * 24 * 3600
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Агрегация снимков в 1m/1h/1d и удаление устаревшей истории')
+    parser.add_argument('--db', default=DB_PATH, help='путь к файлу базы')
+    parser.add_argument('--raw-days', type=_seconds, default=RAW_RETENTION,
+                        help='сколько дней хранить сырые снимки (none - не удалять)')
+    for resolution, seconds in ROLLUP_RETENTION.items():
+        parser.add_argument(f'--{resolution}-days', dest=f'days_{resolution}', type=_seconds, default=seconds,
+                            help=f'сколько дней хранить агрегаты {resolution} (none - не удалять)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='строк в одной транзакции')
+    args = parser.parse_args()
+
+    rollup_retention = {resolution: getattr(args, f'days_{resolution}') for resolution in ROLLUP_RETENTION}
+    run_retention(args.db, args.raw_days, rollup_retention, args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import json
+import time
+import random
+import logging
+import threading
+from functools import partial
+
+import Main
+import ws_client
+
+# Период сброса накопленных изменений в конвейер записи (секунды)
+FLUSH_INTERVAL = 1.0
+# Задержка переподключения: экспоненциальная с потолком
+BACKOFF_BASE = 0.5
+BACKOFF_CAP = 30.0
+# Каналов в одном сообщении подписки: Bybit принимает до 10, у OKX ограничен размер сообщения
+BYBIT_SUBSCRIBE_BATCH = 10
+OKX_SUBSCRIBE_BATCH = 100
+
+# Поля потока !ticker@arr Binance -> ключи ответа REST /ticker/24hr, которые ждет normalize
+_BINANCE_KEYS = {'s': 'symbol', 'c': 'lastPrice', 'v': 'volume', 'q': 'quoteVolume', 'h': 'highPrice',
+                 'l': 'lowPrice', 'o': 'openPrice', 'n': 'count'}
+
+
+def _parse_binance(message):
+    if not isinstance(message, list):
+        return []
+    return [{key: ticker[field] for field, key in _BINANCE_KEYS.items() if field in ticker} for ticker in message]
+
+
+def _parse_bybit(message):
+    # Спот присылает тикер целиком, linear и inverse - снимок и затем только изменившиеся поля
+    # (дельты сливаются в карте)
+    if not message.get('topic', '').startswith('tickers.'):
+        return []
+    return [message['data']]
+
+
+def _parse_okx(message):
+    if message.get('arg', {}).get('channel') != 'tickers' or 'data' not in message:
+        return []
+    return message['data']
+
+
+def _bybit_subscribe(symbols):
+    args = [f'tickers.{symbol}' for symbol in symbols]
+    return [{'op': 'subscribe', 'args': args[i:i + BYBIT_SUBSCRIBE_BATCH]}
+            for i in range(0, len(args), BYBIT_SUBSCRIBE_BATCH)]
+
+
+def _okx_subscribe(symbols):
+    args = [{'channel': 'tickers', 'instId': symbol} for symbol in symbols]
+    return [{'op': 'subscribe', 'args': args[i:i + OKX_SUBSCRIBE_BATCH]}
+            for i in range(0, len(args), OKX_SUBSCRIBE_BATCH)]
+
+
+class TickerStream:
+    """
+    поток тикеров одной биржи и типа рынка: обновления сливаются в карту последних значений по символу
+    При каждом подключении карта синхронизируется через REST-сборщик из Main, по его списку символов
+    оформляется подписка (у Binance поток всех символов выбирается адресом).
+    :param exchange: биржа (ключ normalize.FIELDS)
+    :param market_type: тип рынка, под которым сохраняются строки
+    :param url: адрес WebSocket
+    :param subscribe: функция символы -> сообщения подписки, None - подписка не нужна
+    :param parse: разбор сообщения в список тикеров с ключами REST
+    :param resync: функция без аргументов -> список тикеров REST
+    :param transport: функция (url, subscribe) -> итератор сообщений, по умолчанию WebSocket
+    :param endpoint: ключ Main.ENDPOINTS, который поток заменяет в опросе
+    """
+
+    def __init__(self, exchange, market_type, url, subscribe, parse, resync, transport=None, endpoint=None):
+        self.exchange = exchange
+        self.market_type = market_type
+        self.endpoint = endpoint
+        self.url = url
+        self.subscribe = subscribe
+        self.parse = parse
+        self.resync = resync
+        self.transport = transport or ws_client.websocket_transport
+        self.symbol_key = 'instId' if exchange == 'OKX' else 'symbol'
+        self.latest = {}
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.messages = 0
+        self.reconnects = 0
+
+    @property
+    def name(self):
+        return f"{self.exchange}/{self.market_type}"
+
+    def merge(self, tickers):
+        with self._lock:
+            for ticker in tickers:
+                symbol = ticker.get(self.symbol_key)
+                if symbol is None:
+                    continue
+                current = self.latest.get(symbol)
+                if current is None:
+                    self.latest[symbol] = dict(ticker)
+                else:
+                    current.update(ticker)
+                self._dirty.add(symbol)
+
+    def take_changed(self):
+        """
+        копии тикеров, изменившихся с прошлого вызова
+        """
+        with self._lock:
+            changed = [dict(self.latest[symbol]) for symbol in self._dirty]
+            self._dirty.clear()
+        return changed
+
+    def consume(self, messages):
+        for raw in messages:
+            if self._stop.is_set():
+                return
+            message = json.loads(raw)
+            self.messages += 1
+            self.merge(self.parse(message))
+
+    def run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            received = self.messages
+            try:
+                self.merge(self.resync())
+                subscribe = self.subscribe(list(self.latest)) if self.subscribe else None
+                self.consume(self.transport(self.url, subscribe))
+                if not self._stop.is_set():
+                    raise ConnectionError("поток закрыт биржей")
+            except Exception as e:
+                if self.messages > received:
+                    attempt = 0
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                attempt += 1
+                self.reconnects += 1
+                logging.warning(f"Поток тикеров {self.endpoint or self.name}: {e}. "
+                                f"Переподключение через {delay:.1f} с.")
+                self._stop.wait(delay)
+
+    def stop(self):
+        self._stop.set()
+
+
+def default_streams(transport=None):
+    """
+    потоки тикеров спота и фьючерсов Binance, Bybit и OKX с пересинхронизацией через REST-сборщики Main
+    По одному потоку на каждый эндпоинт Main.ENDPOINTS: у Bybit фьючерсы - категории linear и inverse,
+    у OKX - бессрочные SWAP и срочные FUTURES. Новые срочные контракты подписываются при переподключении.
+    """
+    bybit_url = 'wss://stream.bybit.com/v5/public/{category}'
+    okx_url = 'wss://ws.okx.com:8443/ws/v5/public'
+    return [
+        TickerStream('Binance', 'spot', 'wss://stream.binance.com:9443/ws/!ticker@arr', None, _parse_binance,
+                     Main.get_binance_spot_data, transport, endpoint='binance:spot'),
+        TickerStream('Binance', 'futures', 'wss://fstream.binance.com/ws/!ticker@arr', None, _parse_binance,
+                     Main.get_binance_futures_data, transport, endpoint='binance:futures'),
+    ] + [
+        TickerStream('Bybit', 'spot' if category == 'spot' else 'futures', bybit_url.format(category=category),
+                     _bybit_subscribe, _parse_bybit, partial(Main.get_bybit_tickers, category), transport,
+                     endpoint=f'bybit:{category}')
+        for category in ('spot', 'linear', 'inverse')
+    ] + [
+        TickerStream('OKX', 'spot' if inst_type == 'SPOT' else 'futures', okx_url, _okx_subscribe, _parse_okx,
+                     partial(Main.get_okx_tickers, inst_type), transport, endpoint=f'okx:{inst_type}')
+        for inst_type in ('SPOT', 'SWAP', 'FUTURES')
+    ]
+
+
+class StreamIngest:
+    """
+    потоковый сбор тикеров: поток на каждый TickerStream и поток сброса, который раз в flush_interval
+    отправляет изменившиеся тикеры в конвейер записи (pipeline.WritePipeline) микропачками
+    :param streams: список TickerStream
+    :param pipeline: конвейер записи
+    """
+
+    def __init__(self, streams, pipeline, flush_interval=FLUSH_INTERVAL):
+        self.streams = streams
+        self.pipeline = pipeline
+        self.flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._threads = []
+        self.flushed = 0
+
+    def flush(self):
+        """
+        отправляет изменения всех потоков в конвейер
+        :return: количество строк
+        """
+        count = 0
+        for stream in self.streams:
+            changed = stream.take_changed()
+            if not changed:
+                continue
+            started = time.perf_counter()
+            rows = Main.prepare_rows(changed, stream.exchange, stream.market_type)
+            self.pipeline.put(stream.name, rows, time.perf_counter() - started)
+            count += len(rows)
+        self.flushed += count
+        return count
+
+    def _run_flush(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logging.error(f"Ошибка сброса потоковых тикеров: {e}")
+
+    def start(self):
+        for stream in self.streams:
+            thread = threading.Thread(target=stream.run, name=f'ticker-{stream.endpoint or stream.name}',
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self._flusher = threading.Thread(target=self._run_flush, name='ticker-flush', daemon=True)
+        self._flusher.start()
+        return self
+
+    def stop(self):
+        """
+        останавливает потоки и сбрасывает последние изменения
+        """
+        for stream in self.streams:
+            stream.stop()
+        self._stop.set()
+        self._flusher.join()
+        self.flush()
+        logging.info(f"Потоковый сбор остановлен: записано {self.flushed} строк, "
+                     f"переподключений {sum(s.reconnects for s in self.streams)}.")
@@ -0,0 +1,17 @@
+import os
+import sys
+import subprocess
+
+import pytest
+
+pytest.importorskip('dash_bootstrap_components')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_leaves_heavy_modules_unloaded():
+    # Отдельный процесс: в текущем модули уже могли загрузить другие тесты
+    code = ("import sys, check_data; "
+            "print(' '.join(m for m in ('pandas', 'clickhouse_connect') if m in sys.modules))")
+    result = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == []
@@ -0,0 +1,162 @@
+import time
+from datetime import datetime, timezone
+
+import pytest
+
+import clickhouse_sink
+from clickhouse_sink import CLICKHOUSE_COLUMNS, ClickHouseSink
+from db_writer import MARKET_DATA_COLUMNS
+
+TS = datetime(2024, 10, 1, tzinfo=timezone.utc)
+
+
+class FakeClient:
+    """
+    клиент ClickHouse в памяти: первые fail вставок падают, остальные сохраняются
+    """
+
+    def __init__(self, fail=0, on_insert=None):
+        self.fail = fail
+        self.on_insert = on_insert
+        self.commands = []
+        self.attempts = 0
+        self.inserts = []
+
+    def command(self, sql):
+        self.commands.append(sql)
+
+    def insert(self, table, columns, column_names, column_oriented):
+        self.attempts += 1
+        if self.on_insert is not None:
+            self.on_insert()
+        if self.fail:
+            self.fail -= 1
+            raise ConnectionError('ClickHouse недоступен')
+        assert column_oriented and tuple(column_names) == CLICKHOUSE_COLUMNS
+        self.inserts.append(columns)
+
+    def symbols(self):
+        return [symbol for columns in self.inserts for symbol in columns[CLICKHOUSE_COLUMNS.index('symbol')]]
+
+
+def rows(*symbols):
+    return [(symbol, 'Binance', 'spot', '100.5', '10', symbol, '1005', '101', '99', 3, None, None, None, None)
+            for symbol in symbols]
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def delays(monkeypatch):
+    # Задержки повторов записываются, но не выдерживаются
+    requested = []
+
+    def uniform(low, high):
+        requested.append(high)
+        return 0.0
+
+    monkeypatch.setattr(clickhouse_sink.random, 'uniform', uniform)
+    return requested
+
+
+def make_sink(client, **options):
+    options = {'batch_rows': 1000, 'flush_interval': 3600, 'max_buffer_rows': 1000, 'retries': 3, **options}
+    return ClickHouseSink(client, MARKET_DATA_COLUMNS, **options)
+
+
+def test_creates_table_and_inserts_columns():
+    client = FakeClient()
+    sink = make_sink(client)
+    sink.add(rows('BTCUSDT', 'ETHUSDT'), ts=TS)
+    assert sink.flush() == 2
+    sink.close()
+
+    assert 'CREATE TABLE IF NOT EXISTS market_snapshots' in client.commands[0]
+    columns = dict(zip(CLICKHOUSE_COLUMNS, client.inserts[0]))
+    assert columns['ts'] == [TS, TS]
+    assert columns['symbol'] == ['BTCUSDT', 'ETHUSDT']
+    assert columns['last_price'] == [100.5, 100.5]
+    assert columns['strike_price'] == [None, None]
+
+
+def test_flush_by_size():
+    client = FakeClient()
+    sink = make_sink(client, batch_rows=3)
+    sink.add(rows('A', 'B'))
+    time.sleep(0.2)
+    assert client.inserts == []
+    sink.add(rows('C'))
+    assert wait_for(lambda: client.symbols() == ['A', 'B', 'C'])
+    sink.close()
+    assert sink.inserted == 3
+
+
+def test_flush_by_time():
+    client = FakeClient()
+    sink = make_sink(client, flush_interval=0.2)
+    sink.add(rows('A'))
+    assert wait_for(lambda: client.symbols() == ['A'])
+    sink.close()
+
+
+def test_retry_with_backoff(delays):
+    client = FakeClient(fail=2)
+    sink = make_sink(client)
+    sink.add(rows('A', 'B'))
+    assert sink.flush() == 2
+    sink.close()
+
+    assert client.attempts == 3
+    assert client.symbols() == ['A', 'B']
+    # Экспоненциальный рост потолка задержки
+    assert delays == [clickhouse_sink.BACKOFF_BASE, clickhouse_sink.BACKOFF_BASE * 2]
+
+
+def test_rows_put_back_after_failed_flush(delays):
+    client = FakeClient(fail=2)
+    sink = make_sink(client, retries=1)
+    sink.add(rows('A', 'B'))
+    assert sink.flush() == 0
+    assert sink.inserted == 0 and sink.dropped == 0
+
+    # Возвращенные строки уходят следующей вставкой раньше новых
+    sink.add(rows('C'))
+    assert sink.flush() == 3
+    sink.close()
+    assert client.symbols() == ['A', 'B', 'C']
+
+
+def test_overflow_drops_oldest_rows():
+    client = FakeClient()
+    sink = make_sink(client, max_buffer_rows=5)
+    sink.add(rows('A', 'B', 'C', 'D'))
+    sink.add(rows('E', 'F', 'G'))
+    assert sink.dropped == 2
+    sink.close()
+    assert client.symbols() == ['C', 'D', 'E', 'F', 'G']
+
+
+def test_put_back_overflow_is_accounted(delays):
+    sink = None
+
+    def add_during_insert():
+        # Пока вставка идет, сборщики дописывают новые строки
+        if client.attempts == 1:
+            sink.add(rows('X', 'Y', 'Z'))
+
+    client = FakeClient(fail=1, on_insert=add_during_insert)
+    sink = make_sink(client, max_buffer_rows=5, retries=0)
+    sink.add(rows('A', 'B', 'C', 'D'))
+    assert sink.flush() == 0
+    # Места хватает на 2 из 4 возвращаемых строк: теряются самые старые
+    assert sink.dropped == 2
+    sink.close()
+    assert client.symbols() == ['C', 'D', 'X', 'Y', 'Z']
+    assert sink.inserted == 5
@@ -0,0 +1,107 @@
+import time
+import sqlite3
+import threading
+
+import pytest
+
+from db_queries import INDEXED_FILTERS, QueryCache, build_query, check_plans, explain, source_table
+from db_writer import BulkWriter, LATEST_TABLE, adapt_row, connect, create_schema
+
+# Схема исходной плоской таблицы market_data (до миграции)
+LEGACY_SCHEMA = '''
+    CREATE TABLE market_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, symbol TEXT, exchange TEXT, market_type TEXT, last_price TEXT,
+        volume_24h TEXT, options TEXT, price_usdt TEXT, high_price_24h TEXT, low_price_24h TEXT,
+        trades_24h TEXT, strike_price TEXT, option_type TEXT, expiry_date TEXT, exercise_price TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+
+def _rows():
+    rows = []
+    for exchange in ('Binance', 'Bybit', 'OKX'):
+        for market_type in ('spot', 'futures', 'options'):
+            for i in range(50):
+                symbol = f'SYM{i}USDT'
+                rows.append(adapt_row((symbol, exchange, market_type, 100.0 + i, 1000.0, symbol, 1e5, 110.0,
+                                       90.0, 10, None, None, None, None)))
+    return rows
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = str(tmp_path / 'market_data.db')
+    writer = BulkWriter(path, change_filter=False, history=False)
+    writer.write(_rows())
+    writer.close()
+    conn = sqlite3.connect(path)
+    # Планировщик со статистикой, как на рабочей базе
+    conn.execute('ANALYZE')
+    yield conn
+    conn.close()
+
+
+def test_schema_has_latest_and_history_sources(db):
+    assert source_table(db, history=False) == LATEST_TABLE
+    assert source_table(db, history=True) == 'market_data'
+
+
+def test_dashboard_queries_use_indexes(db):
+    assert check_plans(db) == []
+
+
+@pytest.mark.parametrize('filters', INDEXED_FILTERS)
+def test_history_query_searches_snapshots_by_instrument(db, filters):
+    plan = explain(db, *build_query(**filters))
+    assert any(step.startswith('SEARCH s USING INDEX snapshots_instrument_ts') for step in plan), plan
+
+
+def test_legacy_table_gets_index_from_writer(tmp_path):
+    conn = connect(str(tmp_path / 'legacy.db'))
+    conn.execute(LEGACY_SCHEMA)
+    create_schema(conn)
+    plan = explain(conn, *build_query(table='market_data', typed=False, exchange='Binance', market_type='spot'))
+    conn.close()
+    assert plan == ['SEARCH market_data USING INDEX market_data_exchange_type_symbol_ts (exchange=? AND market_type=?)']
+
+
+def test_cache_invalidated_by_write(tmp_path):
+    path = str(tmp_path / 'market_data.db')
+    writer = BulkWriter(path, change_filter=False, history=False)
+    writer.write(_rows())
+    cache = QueryCache(path)
+    first, total = cache.query_page(exchange='Binance')
+    assert cache.query_page(exchange='Binance')[0] is first
+    writer.write(_rows()[:1])
+    cache.query_page(exchange='Binance')
+    writer.close()
+    stats = cache.stats()
+    cache.close()
+    assert (stats['hits'], stats['misses'], stats['invalidations']) == (1, 2, 1)
+
+
+def test_cache_misses_read_concurrently(tmp_path):
+    path = str(tmp_path / 'market_data.db')
+    writer = BulkWriter(path, change_filter=False, history=False)
+    writer.write(_rows())
+    writer.close()
+    cache = QueryCache(path)
+    connections = []
+
+    def slow_read(conn):
+        connections.append(conn)
+        time.sleep(0.5)
+        return conn.execute('SELECT COUNT(*) FROM market_data').fetchone()[0]
+
+    threads = [threading.Thread(target=cache._cached, args=(key, slow_read)) for key in ('a', 'b', 'c')]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    cache.close()
+    # Три промаха по 0.5 с идут параллельно, каждый через соединение своего потока
+    assert elapsed < 1.0
+    assert len(set(map(id, connections))) == 3
@@ -0,0 +1,75 @@
+import pytest
+
+import exchange_data
+from exchange_data import bybit_category, venue_symbol
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+@pytest.fixture
+def sent_requests(monkeypatch):
+    # Запросы к биржам записываются, ответ - пустой, но корректный для каждой биржи
+    sent = []
+
+    def get(url, params=None, **kwargs):
+        sent.append((url, params))
+        if 'bybit' in url:
+            return FakeResponse({'retCode': 0, 'result': {'list': [], 'b': [], 'a': [], 'u': 1}})
+        if 'okx' in url:
+            return FakeResponse({'code': '0', 'data': [{'bids': [], 'asks': [], 'seqId': 1}]})
+        return FakeResponse([] if 'klines' in url else {'bids': [], 'asks': [], 'lastUpdateId': 1})
+
+    monkeypatch.setattr(exchange_data.http_client, 'get', get)
+    return sent
+
+
+@pytest.mark.parametrize('exchange, symbol, market_type, expected', [
+    ('OKX', 'BTCUSDT', 'spot', 'BTC-USDT'),
+    ('OKX', 'BTCUSDT', 'futures', 'BTC-USDT-SWAP'),
+    ('OKX', 'BTC-USD-241227', 'futures', 'BTC-USD-241227'),
+    ('Binance', 'BTC-USDT', 'spot', 'BTCUSDT'),
+    ('Binance', 'BTCUSDT_241227', 'futures', 'BTCUSDT_241227'),
+    ('Bybit', 'BTC-27DEC24', 'futures', 'BTC-27DEC24'),
+])
+def test_venue_symbol(exchange, symbol, market_type, expected):
+    assert venue_symbol(exchange, symbol, market_type) == expected
+
+
+@pytest.mark.parametrize('market_type, symbol, expected', [
+    ('spot', 'BTCUSDT', 'spot'),
+    ('futures', 'BTCUSDT', 'linear'),
+    ('futures', 'BTCPERP', 'linear'),
+    ('futures', 'BTCUSD', 'inverse'),
+    ('futures', 'BTCUSDH25', 'inverse'),
+])
+def test_bybit_category(market_type, symbol, expected):
+    assert bybit_category(market_type, symbol) == expected
+
+
+def test_futures_klines_use_futures_endpoints(sent_requests):
+    exchange_data.get_klines_binance('BTCUSDT', market_type='futures')
+    exchange_data.get_klines_binance('BTCUSDT')
+    exchange_data.get_klines_bybit('BTCUSD', market_type='futures')
+    exchange_data.get_klines_bybit('BTCUSDT', market_type='futures')
+
+    assert [url for url, _ in sent_requests[:2]] == [exchange_data.BINANCE_FUTURES_KLINES_URL,
+                                                     exchange_data.BINANCE_KLINES_URL]
+    assert [params['category'] for _, params in sent_requests[2:]] == ['inverse', 'linear']
+
+
+def test_futures_order_book_uses_futures_endpoints(sent_requests):
+    exchange_data.get_order_book_binance('BTCUSDT', 300, market_type='futures')
+    exchange_data.get_order_book_bybit('BTCUSDT', 1000, market_type='futures')
+    exchange_data.get_order_book_bybit('BTCUSDT', 1000)
+
+    (url, params), (_, linear), (_, spot) = sent_requests
+    # У фьючерсов Binance limit только из фиксированного набора
+    assert url == exchange_data.BINANCE_FUTURES_DEPTH_URL and params['limit'] == 500
+    assert (linear['category'], linear['limit']) == ('linear', 500)
+    assert (spot['category'], spot['limit']) == ('spot', 200)
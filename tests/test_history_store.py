@@ -0,0 +1,46 @@
+import os
+import time
+import threading
+
+import numpy as np
+
+import history_store
+from history_store import HistoryStore, _FileLock
+
+COLUMNS = ('symbol', 'exchange', 'market_type') + history_store.VALUE_FIELDS
+
+
+def test_lock_is_not_broken_while_held(tmp_path, monkeypatch):
+    # Долгая операция под блокировкой дольше LOCK_STALE: второй процесс ждет, а не снимает блокировку
+    monkeypatch.setattr(history_store, 'LOCK_STALE', 0.3)
+    path = str(tmp_path / '.lock')
+    acquired = []
+
+    def other():
+        with _FileLock(path):
+            acquired.append(time.monotonic())
+
+    with _FileLock(path):
+        thread = threading.Thread(target=other)
+        thread.start()
+        time.sleep(1.0)
+        released = time.monotonic()
+    thread.join()
+    assert acquired and acquired[0] >= released
+    assert not os.path.exists(path)
+
+
+def test_append_seals_previous_day(tmp_path):
+    store = HistoryStore(str(tmp_path), COLUMNS)
+    day = 86400 * 20000
+    rows = [('BTCUSDT', 'Binance', 'spot', 1.0, 2.0, 3.0, 4.0, 5.0, 6.0),
+            ('ETHUSDT', 'Binance', 'spot', 7.0, 8.0, 9.0, 10.0, 11.0, 12.0)]
+    store.append(rows, ts=day + 10)
+    store.append(rows[::-1], ts=day + 20)
+    store.append(rows, ts=day + 86400 + 5)
+
+    first, second = store.days()
+    assert os.path.exists(os.path.join(str(tmp_path), first, 'bounds.npy'))
+    series = store.series('Binance', 'spot', 'BTCUSDT', end=day + 86400)
+    assert series['ts'].tolist() == [(day + 10) * 1000, (day + 20) * 1000]
+    assert np.array_equal(series['last_price'], [1.0, 1.0])
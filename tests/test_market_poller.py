@@ -0,0 +1,107 @@
+import time
+import threading
+
+from market_poller import MarketPoller
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+class FakeFeed:
+    """
+    ресурс ключа, как поток стакана: fetch открывает его, release закрывает;
+    release ждет разрешения, чтобы растянуть окно между остановкой потока и его удалением
+    """
+
+    def __init__(self):
+        self.events = []
+        self.releasing = threading.Event()
+        self.allow_release = threading.Event()
+
+    def fetch(self, exchange, market_type, symbol):
+        self.events.append('fetch')
+        return len(self.events)
+
+    def release(self, exchange, market_type, symbol):
+        self.events.append('release')
+        self.releasing.set()
+        self.allow_release.wait(3)
+
+
+def make_poller(feed, idle_timeout=0.05):
+    return MarketPoller(period=0.01, idle_timeout=idle_timeout,
+                        fetchers={'book': feed.fetch}, releasers={'book': feed.release})
+
+
+def test_shared_value_for_all_readers():
+    feed = FakeFeed()
+    feed.allow_release.set()
+    poller = make_poller(feed, idle_timeout=60)
+    assert poller.get('book', 'Binance', 'spot', 'BTCUSDT') is not None
+    assert poller.get('book', 'Binance', 'spot', 'BTCUSDT') is not None
+    assert poller.stats()['pollers'] == 1
+    poller.stop()
+    assert poller.stats()['pollers'] == 0
+    assert feed.events[-1] == 'release'
+
+
+def test_successor_waits_for_release_of_expired_poller():
+    feed = FakeFeed()
+    poller = make_poller(feed)
+    poller.get('book', 'Binance', 'spot', 'BTCUSDT')
+    # Читателей нет: поток истекает и застревает в release
+    assert feed.releasing.wait(3)
+
+    # Новый читатель приходит, пока старый поток освобождает ресурсы ключа, и получает значение предшественника
+    poller.idle_timeout = 60
+    previous = poller._pollers[('book', 'Binance', 'spot', 'BTCUSDT')]
+    assert poller.get('book', 'Binance', 'spot', 'BTCUSDT', wait=0.1) == previous.value
+    successor = poller._pollers[('book', 'Binance', 'spot', 'BTCUSDT')]
+    assert successor is not previous
+    fetches = feed.events.count('fetch')
+    time.sleep(0.1)
+    assert feed.events.count('fetch') == fetches
+
+    # Преемник начинает опрос только после освобождения, и старый поток не удаляет его из словаря
+    feed.allow_release.set()
+    assert previous.released.wait(3)
+    assert wait_for(lambda: feed.events.count('fetch') > fetches)
+    assert feed.events[-1] == 'fetch'
+    assert poller._pollers[('book', 'Binance', 'spot', 'BTCUSDT')] is successor
+    poller.stop()
+    assert poller.stats()['pollers'] == 0
+
+
+def test_spot_and_futures_are_polled_separately():
+    calls = []
+
+    def fetch(exchange, market_type, symbol):
+        calls.append((exchange, market_type, symbol))
+        return market_type
+
+    poller = MarketPoller(period=60, idle_timeout=60, fetchers={'klines': fetch}, releasers={})
+    assert poller.get('klines', 'Binance', 'spot', 'BTCUSDT') == 'spot'
+    assert poller.get('klines', 'Binance', 'futures', 'BTCUSDT') == 'futures'
+    poller.stop()
+    assert sorted(calls) == [('Binance', 'futures', 'BTCUSDT'), ('Binance', 'spot', 'BTCUSDT')]
+
+
+def test_stats_count_fetches_and_errors():
+    def fetch(exchange, market_type, symbol):
+        if symbol == 'BAD':
+            raise ValueError('нет символа')
+        return symbol
+
+    poller = MarketPoller(period=0.01, idle_timeout=60, fetchers={'book': fetch}, releasers={})
+    poller.get('book', 'Binance', 'spot', 'BTCUSDT')
+    poller.get('book', 'Binance', 'spot', 'BAD')
+    assert wait_for(lambda: poller.stats()['fetches'] >= 5 and poller.stats()['errors'] >= 5)
+    poller.stop()
+    stats = poller.stats()
+    assert stats['reads'] == 2 and stats['pollers'] == 0
@@ -0,0 +1,13 @@
+from normalize import to_columns
+
+BYBIT_TICKER = {'symbol': 'BTCUSDT', 'lastPrice': '60679.68', 'volume24h': '17992.772589',
+                'turnover24h': '1091795683.01329152', 'highPrice24h': '61000', 'lowPrice24h': '60000'}
+
+
+def test_bybit_volume_is_base_volume():
+    # volume_24h у Bybit - объем в базовой валюте (volume24h), как в исходной базе, а не оборот turnover24h
+    frame = to_columns([BYBIT_TICKER], 'Bybit', 'futures')
+    row = frame.iloc[0]
+    assert float(row['volume_24h']) == 17992.772589
+    assert abs(float(row['price_usdt']) - 17992.772589 * 60679.68) < 1e-3
+    assert row['trades_24h'] == round(17992.772589 / 60679.68)
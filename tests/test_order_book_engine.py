@@ -0,0 +1,238 @@
+import json
+
+import numpy as np
+import pytest
+
+from order_book_engine import BookSide, LocalOrderBook, OrderBookFeed, SequenceGap
+
+SNAPSHOT = ([['100', '1'], ['99', '2']], [['101', '1'], ['102', '2']])
+DIFFS = [
+    ([['100', '3']], [['101', '0']]),
+    ([['99.5', '1']], [['101.5', '4']]),
+]
+AFTER_DIFFS = ([[100, 3], [99.5, 1], [99, 2]], [[101.5, 4], [102, 2]])
+
+
+class BinanceFrames:
+    """
+    кадры depthUpdate Binance; снимок отдается через REST (lastUpdateId)
+    """
+    exchange = 'Binance'
+    symbol = 'BTCUSDT'
+
+    def __init__(self):
+        self.snapshots = []
+        self.snapshot_calls = 0
+
+    def connect(self, sequence, bids, asks):
+        self.snapshots.append((bids, asks, sequence))
+        return []
+
+    def diff(self, prev, sequence, bids, asks):
+        return json.dumps({'e': 'depthUpdate', 'E': 1727740800000, 's': self.symbol,
+                           'U': prev + 1, 'u': sequence, 'b': bids, 'a': asks})
+
+    def snapshot(self, symbol):
+        assert symbol == self.symbol
+        self.snapshot_calls += 1
+        return self.snapshots.pop(0)
+
+
+class BinanceFuturesFrames(BinanceFrames):
+    """
+    кадры depthUpdate фьючерсов Binance: номера идут не подряд, pu - номер u предыдущей пачки
+    """
+    market_type = 'futures'
+
+    def diff(self, prev, sequence, bids, asks):
+        return json.dumps({'e': 'depthUpdate', 'E': 1727740800000, 'T': 1727740799990, 's': self.symbol,
+                           'U': prev + 1, 'u': sequence, 'pu': prev, 'b': bids, 'a': asks})
+
+
+class BybitFrames:
+    """
+    кадры orderbook.50 Bybit v5: ответ на подписку, snapshot, затем delta с u по порядку
+    """
+    exchange = 'Bybit'
+    symbol = 'BTCUSDT'
+
+    def _frame(self, kind, sequence, bids, asks):
+        return json.dumps({'topic': f'orderbook.50.{self.symbol}', 'type': kind, 'ts': 1727740800000,
+                           'data': {'s': self.symbol, 'b': bids, 'a': asks, 'u': sequence, 'seq': sequence * 10},
+                           'cts': 1727740799990})
+
+    def connect(self, sequence, bids, asks):
+        return [json.dumps({'success': True, 'ret_msg': '', 'conn_id': 'c1', 'op': 'subscribe'}),
+                self._frame('snapshot', sequence, bids, asks)]
+
+    def diff(self, prev, sequence, bids, asks):
+        return self._frame('delta', sequence, bids, asks)
+
+
+class OkxFrames:
+    """
+    кадры books OKX v5: уровни из четырех полей, seqId/prevSeqId
+    """
+    exchange = 'OKX'
+    symbol = 'BTC-USDT'
+
+    def _frame(self, action, prev, sequence, bids, asks):
+        return json.dumps({'arg': {'channel': 'books', 'instId': self.symbol}, 'action': action,
+                           'data': [{'bids': [row + ['0', '1'] for row in bids],
+                                     'asks': [row + ['0', '1'] for row in asks],
+                                     'ts': '1727740800000', 'checksum': 0, 'prevSeqId': prev, 'seqId': sequence}]})
+
+    def connect(self, sequence, bids, asks):
+        return [json.dumps({'event': 'subscribe', 'arg': {'channel': 'books', 'instId': self.symbol},
+                            'connId': 'c1'}),
+                self._frame('snapshot', -1, sequence, bids, asks)]
+
+    def diff(self, prev, sequence, bids, asks):
+        return self._frame('update', prev, sequence, bids, asks)
+
+
+@pytest.fixture(params=[BinanceFrames, BinanceFuturesFrames, BybitFrames, OkxFrames],
+                ids=lambda venue: f'{venue.exchange}-{getattr(venue, "market_type", "spot")}')
+def venue(request):
+    return request.param()
+
+
+def make_feed(venue, connections):
+    # Транспорт отдает записанные кадры по одному списку на подключение; после последнего поток останавливается
+    connections = list(connections)
+
+    def transport(url, subscribe):
+        frames = connections.pop(0)
+        yield from frames
+        if not connections:
+            feed._stop.set()
+
+    feed = OrderBookFeed(venue.exchange, venue.symbol, getattr(venue, 'market_type', 'spot'),
+                         transport=transport, snapshot=getattr(venue, 'snapshot', None))
+    return feed
+
+
+def levels(side):
+    return [[float(price), float(quantity)] for price, quantity in side]
+
+
+def assert_book(feed, expected):
+    bids, asks = feed.book.top()
+    assert bids.tolist() == levels(expected[0])
+    assert asks.tolist() == levels(expected[1])
+
+
+def test_book_side_orders_levels():
+    bids, asks = BookSide(descending=True), BookSide()
+    for price, quantity in [(100, 1), (102, 2), (101, 3), (99, 4)]:
+        bids.update(price, quantity)
+        asks.update(price, quantity)
+    bids.update(101, 0)
+    asks.update(102, 5)
+    asks.update(98, 0)  # Удаление отсутствующего уровня ничего не меняет
+
+    assert bids.top().tolist() == [[102, 2], [100, 1], [99, 4]]
+    assert asks.top(2).tolist() == [[99, 4], [100, 1]]
+    assert len(asks) == 4
+    assert BookSide().top().shape == (0, 2)
+
+
+@pytest.mark.parametrize('descending', [True, False])
+def test_bounded_top_matches_full_sort(descending):
+    # top(n) выбирает n лучших через кучу: результат тот же, что у первых n строк полной сортировки
+    rng = np.random.default_rng(7)
+    side = BookSide(descending=descending)
+    for price, quantity in zip(rng.integers(1, 5000, 3000) / 100, rng.integers(0, 50, 3000)):
+        side.update(price, quantity)
+
+    full = side.top()
+    for n in (1, 25, 100, len(side), len(side) + 10):
+        np.testing.assert_array_equal(side.top(n), full[:n])
+
+
+def test_snapshot_and_in_order_diffs(venue):
+    frames = venue.connect(100, *SNAPSHOT) + [venue.diff(100, 101, *DIFFS[0]), venue.diff(101, 102, *DIFFS[1])]
+    feed = make_feed(venue, [frames])
+    feed.run()
+
+    assert feed.applied == 2 and feed.resyncs == 0
+    assert feed.book.sequence == 102
+    assert_book(feed, AFTER_DIFFS)
+
+
+def test_stale_update_is_skipped(venue):
+    frames = venue.connect(100, *SNAPSHOT) + [venue.diff(100, 101, *DIFFS[0]), venue.diff(101, 102, *DIFFS[1]),
+                                              venue.diff(100, 101, *DIFFS[0])]
+    feed = make_feed(venue, [frames])
+    feed.run()
+
+    assert feed.applied == 2 and feed.resyncs == 0
+    assert_book(feed, AFTER_DIFFS)
+
+
+def test_gap_triggers_resync(venue):
+    first = venue.connect(100, *SNAPSHOT) + [venue.diff(100, 101, *DIFFS[0]), venue.diff(103, 104, *DIFFS[1])]
+    second = venue.connect(200, [['98', '1']], [['103', '1']]) + [
+        venue.diff(200, 201, [['98', '0'], ['97', '5']], [])]
+    feed = make_feed(venue, [first, second])
+    feed.run()
+
+    assert feed.resyncs == 1
+    assert feed.applied == 2
+    assert feed.book.sequence == 201
+    assert_book(feed, ([[97, 5]], [[103, 1]]))
+    if isinstance(venue, BinanceFrames):  # и фьючерсы
+        assert venue.snapshot_calls == 2
+
+
+def test_binance_snapshot_follows_buffered_stream():
+    # Обновления старше снимка отбрасываются, первое примененное перекрывает lastUpdateId + 1
+    venue = BinanceFrames()
+    venue.connect(100, *SNAPSHOT)
+    frames = [venue.diff(95, 98, [['100', '7']], []), venue.diff(98, 101, *DIFFS[0]),
+              venue.diff(101, 102, *DIFFS[1])]
+    feed = make_feed(venue, [frames])
+    feed.run()
+
+    assert feed.applied == 2
+    assert_book(feed, AFTER_DIFFS)
+
+
+def test_binance_futures_follow_pu_chain():
+    # Номера фьючерсов идут с пропусками: непрерывность проверяется по pu, а не по U == u + 1
+    book = LocalOrderBook()
+    book.load_snapshot(*SNAPSHOT, 100)
+    assert not book.apply([['100', '9']], [], 90, first=80, prev=75)  # старше снимка
+    assert book.apply(*DIFFS[0], 110, first=95, prev=90)
+    assert book.apply(*DIFFS[1], 130, first=115, prev=110)
+    with pytest.raises(SequenceGap):
+        book.apply([], [], 140, first=135, prev=120)
+    assert book.top()[0].tolist() == levels(AFTER_DIFFS[0])
+
+
+def test_venue_urls_by_market_type():
+    instruments = [('Binance', 'spot', 'BTCUSDT'), ('Binance', 'futures', 'BTCUSDT'), ('Bybit', 'spot', 'BTCUSDT'),
+                   ('Bybit', 'futures', 'BTCUSDT'), ('Bybit', 'futures', 'BTCUSD')]
+    assert [OrderBookFeed(exchange, symbol, market_type)._url() for exchange, market_type, symbol in instruments] == [
+        'wss://stream.binance.com:9443/ws/btcusdt@depth@100ms',
+        'wss://fstream.binance.com/ws/btcusdt@depth@100ms',
+        'wss://stream.bybit.com/v5/public/spot',
+        'wss://stream.bybit.com/v5/public/linear',
+        'wss://stream.bybit.com/v5/public/inverse',
+    ]
+
+
+def test_okx_empty_update_keeps_sequence():
+    # OKX присылает seqId == prevSeqId, когда стакан не менялся
+    book = LocalOrderBook()
+    book.load_snapshot(*SNAPSHOT, 100)
+    assert book.apply([], [], 100, prev=100)
+    assert book.apply(*DIFFS[0], 105, prev=100)
+    with pytest.raises(SequenceGap):
+        book.apply(*DIFFS[1], 110, prev=106)
+    np.testing.assert_array_equal(book.top(1)[0], [[100, 3]])
+
+
+def test_update_before_snapshot_is_gap():
+    with pytest.raises(SequenceGap):
+        LocalOrderBook().apply(*DIFFS[0], 1)
@@ -0,0 +1,30 @@
+from db_writer import BulkWriter, adapt_row, connect
+from retention import create_retention_schema, prune, rollup
+
+
+def _write(path, count):
+    writer = BulkWriter(path, change_filter=False, history=False)
+    writer.write([adapt_row((f'SYM{i}USDT', 'Binance', 'spot', 100.0 + i, 10.0, f'SYM{i}USDT', 1000.0,
+                             110.0, 90.0, 1, None, None, None, None)) for i in range(count)])
+    writer.close()
+
+
+def test_prune_deletes_only_old_rolled_up_snapshots(tmp_path):
+    path = str(tmp_path / 'market_data.db')
+    _write(path, 30)
+    conn = connect(path)
+    create_retention_schema(conn)
+    # Первые 20 снимков старые, последние 10 свежие
+    conn.execute("UPDATE snapshots SET timestamp = datetime('now', '-10 days') WHERE id <= 20")
+    assert rollup(conn, batch_size=7) == 30
+    # Снимки после агрегации не удаляются, даже если они старые
+    _write(path, 5)
+    conn.execute("UPDATE snapshots SET timestamp = datetime('now', '-10 days') WHERE id > 30")
+
+    deleted = prune(conn, raw_retention=24 * 3600, rollup_retention={'1m': None, '1h': None}, batch_size=7)
+
+    assert deleted == {'raw': 20}
+    remaining = [row[0] for row in conn.execute('SELECT id FROM snapshots ORDER BY id')]
+    assert remaining == list(range(21, 36))
+    assert not conn.in_transaction
+    conn.close()
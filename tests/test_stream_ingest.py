@@ -0,0 +1,194 @@
+import json
+import time
+import threading
+
+import pytest
+
+pytest.importorskip('websockets.sync.server')
+from websockets.sync.server import serve
+
+import Main
+import stream_ingest
+from stream_ingest import default_streams
+
+SYMBOLS = {
+    'binance:spot': 'BTCUSDT',
+    'binance:futures': 'BTCUSDT',
+    'bybit:spot': 'BTCUSDT',
+    'bybit:linear': 'BTCUSDT',
+    'bybit:inverse': 'BTCUSD',
+    'okx:SPOT': 'BTC-USDT',
+    'okx:SWAP': 'BTC-USDT-SWAP',
+    'okx:FUTURES': 'BTC-USD-241227',
+}
+
+
+class BinanceTickers:
+    """
+    кадры !ticker@arr Binance: массив тикеров с короткими ключами, подписка выбирается адресом
+    """
+    price_key = 'lastPrice'
+
+    def rest(self, symbol, price):
+        return {'symbol': symbol, 'lastPrice': str(price), 'volume': '10', 'quoteVolume': str(price * 10),
+                'highPrice': str(price + 5), 'lowPrice': str(price - 5), 'openPrice': str(price), 'count': 100}
+
+    def connect(self, symbol, price):
+        return [self.update(symbol, price)]
+
+    def update(self, symbol, price):
+        return json.dumps([{'e': '24hrTicker', 'E': 1727740800000, 's': symbol, 'c': str(price), 'v': '10',
+                            'q': str(price * 10), 'h': str(price + 5), 'l': str(price - 5), 'o': str(price),
+                            'n': 100}])
+
+
+class BybitTickers:
+    """
+    кадры tickers Bybit v5: ответ на подписку, snapshot, затем delta только с изменившимися полями
+    """
+    price_key = 'lastPrice'
+
+    def rest(self, symbol, price):
+        return {'symbol': symbol, 'lastPrice': str(price), 'volume24h': '10', 'turnover24h': str(price * 10),
+                'highPrice24h': str(price + 5), 'lowPrice24h': str(price - 5)}
+
+    def connect(self, symbol, price):
+        return [json.dumps({'success': True, 'ret_msg': '', 'conn_id': 'c1', 'op': 'subscribe'}),
+                json.dumps({'topic': f'tickers.{symbol}', 'type': 'snapshot', 'ts': 1727740800000,
+                            'data': self.rest(symbol, price)})]
+
+    def update(self, symbol, price):
+        return json.dumps({'topic': f'tickers.{symbol}', 'type': 'delta', 'ts': 1727740801000,
+                           'data': {'symbol': symbol, 'lastPrice': str(price)}})
+
+
+class OkxTickers:
+    """
+    кадры tickers OKX v5: событие подписки, затем тикеры целиком
+    """
+    price_key = 'last'
+
+    def rest(self, symbol, price):
+        return {'instId': symbol, 'last': str(price), 'vol24h': '10', 'volCcy24h': str(price * 10),
+                'high24h': str(price + 5), 'low24h': str(price - 5), 'ts': '1727740800000'}
+
+    def connect(self, symbol, price):
+        return [json.dumps({'event': 'subscribe', 'arg': {'channel': 'tickers', 'instId': symbol}, 'connId': 'c1'}),
+                self.update(symbol, price)]
+
+    def update(self, symbol, price):
+        return json.dumps({'arg': {'channel': 'tickers', 'instId': symbol}, 'data': [self.rest(symbol, price)]})
+
+
+VENUES = {'Binance': BinanceTickers(), 'Bybit': BybitTickers(), 'OKX': OkxTickers()}
+
+
+class ReplayServer:
+    """
+    локальный WebSocket-сервер: на каждое подключение отдает следующий список кадров
+    Подключение закрывается после своих кадров, последнее держится открытым до close().
+    """
+
+    def __init__(self, connections, subscribes):
+        self.connections = connections
+        self.subscribes = subscribes
+        self.subscriptions = []
+        self._count = 0
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._server = serve(self._handle, '127.0.0.1', 0)
+        self.url = f'ws://127.0.0.1:{self._server.socket.getsockname()[1]}'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def _handle(self, ws):
+        with self._lock:
+            index = self._count
+            self._count += 1
+        # Биржи с подпиской начинают присылать данные после сообщения подписки
+        received = [json.loads(ws.recv(timeout=5))] if self.subscribes else []
+        self.subscriptions.append(received)
+        for frame in self.connections[index] if index < len(self.connections) else []:
+            ws.send(frame)
+        if index >= len(self.connections) - 1:
+            self._done.wait(10)
+
+    def close(self):
+        self._done.set()
+        self._server.shutdown()
+        self._thread.join(timeout=5)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(stream_ingest.random, 'uniform', lambda low, high: 0.0)
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def subscribed(messages):
+    # Символы из сообщений подписки Bybit (tickers.X) и OKX ({'instId': X})
+    symbols = []
+    for message in messages:
+        for arg in message['args']:
+            symbols.append(arg['instId'] if isinstance(arg, dict) else arg.split('.', 1)[1])
+    return symbols
+
+
+def test_streams_cover_all_ticker_endpoints():
+    streams = default_streams()
+    assert sorted(s.endpoint for s in streams) == sorted(Main.ENDPOINTS)
+    # Все эндпоинты в потоке: спот и фьючерсы не опрашиваются
+    assert Main.fetch_tasks(exclude={s.endpoint for s in streams}) == []
+
+
+def test_unstreamed_endpoints_stay_polled():
+    streamed = set(Main.ENDPOINTS) - {'bybit:inverse', 'okx:FUTURES'}
+    tasks = Main.fetch_tasks(exclude=streamed)
+    assert sorted((t.exchange, t.market_type) for t in tasks) == [('Bybit', 'futures'), ('OKX', 'futures')]
+
+
+@pytest.mark.parametrize('endpoint', list(SYMBOLS))
+def test_replay_with_reconnect_and_resync(endpoint):
+    stream = {s.endpoint: s for s in default_streams()}[endpoint]
+    venue = VENUES[stream.exchange]
+    symbol = SYMBOLS[endpoint]
+    # Второй ответ REST приносит новый инструмент: он должен попасть в карту и в подписку нового подключения
+    resyncs = [[venue.rest(symbol, 100)], [venue.rest(symbol, 103), venue.rest('NEW', 5)]]
+    calls = []
+
+    def resync():
+        calls.append(1)
+        return resyncs[min(len(calls), len(resyncs)) - 1]
+
+    server = ReplayServer([venue.connect(symbol, 101) + [venue.update(symbol, 102)],
+                           [venue.update(symbol, 104)]], subscribes=stream.subscribe is not None)
+    stream.url = server.url
+    stream.resync = resync
+    thread = threading.Thread(target=stream.run, daemon=True)
+    thread.start()
+    try:
+        assert wait_for(lambda: stream.latest.get(symbol, {}).get(venue.price_key) == '104')
+    finally:
+        stream.stop()
+        server.close()
+        thread.join(timeout=5)
+
+    assert not thread.is_alive()
+    assert len(calls) == 2 and stream.reconnects == 1
+    assert 'NEW' in stream.latest
+    if stream.subscribe is not None:
+        assert subscribed(server.subscriptions[0]) == [symbol]
+        assert subscribed(server.subscriptions[1]) == [symbol, 'NEW']
+
+    rows = {row[0]: row for row in Main.prepare_rows(stream.take_changed(), stream.exchange, stream.market_type)}
+    assert set(rows) == {symbol, 'NEW'}
+    # Дельта меняет только цену, объем остается из снимка
+    assert rows[symbol][1:5] == (stream.exchange, stream.market_type, 104.0, 10.0)
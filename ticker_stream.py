@@ -0,0 +1,101 @@
+import re
+import json
+import codecs
+import logging
+
+import http_client
+from normalize import to_columns, to_rows
+
+# Сколько тикеров нормализуется за один шаг: память ограничена пачкой, а не всем ответом
+STREAM_CHUNK = 2000
+READ_SIZE = 64 * 1024
+
+_WHITESPACE = re.compile(r'[\s,]*')
+
+
+class StreamDecodeError(ValueError):
+    pass
+
+
+def iter_json_array(chunks, key=None):
+    """
+    по одному элементу отдает объекты из JSON-массива, не загружая весь ответ в память
+    :param chunks: итератор байтовых кусков тела ответа
+    :param key: имя поля с массивом (например 'list' у Bybit, 'data' у OKX);
+                None - массив на верхнем уровне ответа (Binance)
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    start = re.compile(r'\[' if key is None else r'"%s"\s*:\s*\[' % re.escape(key))
+    buffer = ''
+    pos = None
+    chunks = iter(chunks)
+    eof = False
+
+    def read_more():
+        nonlocal buffer, eof
+        try:
+            buffer += utf8.decode(next(chunks))
+        except StopIteration:
+            buffer += utf8.decode(b'', final=True)
+            eof = True
+
+    # Ищем начало массива
+    while pos is None:
+        match = start.search(buffer)
+        if match:
+            pos = match.end()
+        elif eof:
+            raise StreamDecodeError(f"В ответе не найден массив {key or ''}")
+        else:
+            # Хвост оставляем: ключ может оказаться на границе кусков
+            buffer = buffer[-64:]
+            read_more()
+
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise StreamDecodeError("Ответ оборвался посреди массива")
+            # Объект еще не дочитан: отбрасываем разобранное начало буфера и читаем дальше
+            buffer = buffer[pos:]
+            pos = 0
+            read_more()
+            continue
+        yield item
+        pos = end
+
+
+def stream_tickers(url, exchange, market_type, key=None, params=None, chunk_items=STREAM_CHUNK):
+    """
+    запрашивает тикеры и нормализует их по мере чтения ответа
+    :param url: адрес эндпоинта тикеров
+    :param exchange: биржа
+    :param market_type: тип рынка, под которым сохраняются строки
+    :param key: поле с массивом тикеров, см. iter_json_array
+    :param params: параметры запроса
+    :param chunk_items: размер пачки нормализации
+    :return: список строк для db_writer
+    """
+    logging.info(f"Запрос данных с {exchange} ({url})...")
+    response = http_client.get(url, params=params, stream=True)
+    try:
+        response.raise_for_status()
+        rows, chunk, count = [], [], 0
+        for item in iter_json_array(response.iter_content(READ_SIZE), key):
+            chunk.append(item)
+            if len(chunk) >= chunk_items:
+                rows.extend(to_rows(to_columns(chunk, exchange, market_type)))
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            rows.extend(to_rows(to_columns(chunk, exchange, market_type)))
+            count += len(chunk)
+    finally:
+        response.close()
+    logging.info(f"Получено {count} инструментов с {exchange} по адресу {url}.")
+    return rows
@@ -0,0 +1,30 @@
+import json
+
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:  # Необязательная зависимость: без нее потоковые режимы недоступны, работает опрос REST
+    ws_connect = None
+
+OPEN_TIMEOUT = 10
+CLOSE_TIMEOUT = 2
+
+
+def available():
+    """
+    установлен ли websockets
+    """
+    return ws_connect is not None
+
+
+def websocket_transport(url, subscribe=None):
+    """
+    сообщения WebSocket по одному (текст); после подключения отправляет подписку
+    :param subscribe: сообщение подписки или список сообщений (биржи ограничивают число каналов в одном)
+    """
+    if isinstance(subscribe, dict):
+        subscribe = [subscribe]
+    with ws_connect(url, open_timeout=OPEN_TIMEOUT, close_timeout=CLOSE_TIMEOUT) as ws:
+        for message in subscribe or []:
+            ws.send(json.dumps(message))
+        for message in ws:
+            yield message